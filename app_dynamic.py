@@ -18,12 +18,19 @@ sys.path.append('utils')
 from utils.voice import voice_component
 import streamlit.components.v1 as components
 from dynamic_translator import get_translator, translate_text_cached
-from rag_engine import RAGEngine
-from gemini_llm import GeminiLLM
+from retrieval_client import get_retriever  # RETRIEVAL_URL -> shared retrieval server
+from llm_router import LLMRouter
+from fast_path import FastPathPolicy
 
 from weather_agent import WeatherAgent
-from utils.db import init_db
-init_db()   # creates table if needed
+from weather_prefetch import AlertStore
+from tts_service import TTSService, mime_type
+from answer_store import AnswerStore, normalize_question
+from single_flight import SingleFlight
+from query_log import QueryLogger
+from locations import INDIAN_STATES, STATE_DISTRICTS, CROPS
+# Same module name as farmer_import.py, so both share one pool and farmer cache
+from db import init_db, save_farmer
 
 # Page configuration
 st.set_page_config(
@@ -246,13 +253,50 @@ if 'show_answer' not in st.session_state:
 @st.cache_resource
 def init_components():
     translator = get_translator()
-    rag = RAGEngine()
-    llm = GeminiLLM()
+    rag = get_retriever()
+    llm = LLMRouter(offline_engine=rag, fast_path=FastPathPolicy(translate=translate_text_cached))
     weather = WeatherAgent()
     return translator, rag, llm, weather
 
 translator, rag_engine, llm, weather_agent = init_components()
 
+@st.cache_resource
+def init_farmer_db():
+    # Created on first registration, so the app starts without DATABASE_URL
+    init_db()
+    return True
+
+@st.cache_resource
+def init_alert_store():
+    return AlertStore()
+
+alert_store = init_alert_store()
+
+@st.cache_resource
+def init_answer_store():
+    return AnswerStore()
+
+answer_store = init_answer_store()
+
+@st.cache_resource
+def init_single_flight():
+    # Shared by every session, so identical concurrent questions run once
+    return SingleFlight()
+
+qa_flight = init_single_flight()
+
+@st.cache_resource
+def init_query_log():
+    return QueryLogger()
+
+query_log = init_query_log()
+
+@st.cache_resource
+def init_tts():
+    return TTSService()
+
+tts_service = init_tts()
+
 # ============================================
 # HELPER FUNCTIONS
 # ============================================
@@ -262,6 +306,44 @@ def _(text):
         return text
     return translate_text_cached(text, st.session_state.language)
 
+def answer_question(question, lang):
+    """
+    Retrieval + generation for one question (coalesced through qa_flight).
+    Returns (answer, trace) where trace holds the fields for the query log.
+    """
+    start_time = time.perf_counter()
+    # Popular questions are pre-generated per language by answer_pregen.py;
+    # expired ones and ones from an older index generation are not served
+    precomputed = answer_store.get(question, lang)
+    if precomputed and answer_store.is_stale(precomputed, rag_engine.generation):
+        precomputed = None
+    lookup_ms = 1000 * (time.perf_counter() - start_time)
+    if precomputed:
+        return precomputed['answer'], {'source': 'precomputed', 'provider': precomputed['provider'],
+                                       'lookup_ms': lookup_ms, 'total_ms': lookup_ms}
+
+    search_start = time.perf_counter()
+    results = rag_engine.search(question, top_k=3)
+    search_ms = 1000 * (time.perf_counter() - search_start)
+
+    llm_start = time.perf_counter()
+    # Provider and token usage come back with the answer; llm.last_provider
+    # and llm.last_usage are shared by every session
+    response, usage = llm.generate_with_usage(question, results, target_lang=lang)
+    llm_ms = 1000 * (time.perf_counter() - llm_start)
+
+    provider = usage['provider']
+    source = 'kcc' if provider == 'kcc' else ('llm' if provider else 'offline')
+    return response, {
+        'source': source, 'provider': provider,
+        'prompt_tokens': usage.get('prompt_tokens', usage.get('prompt_tokens_estimate')),
+        'output_tokens': usage.get('output_tokens'),
+        'retrieved_ids': [r['id'] for r in results],
+        'scores': [round(r['similarity_score'], 4) for r in results],
+        'lookup_ms': lookup_ms, 'search_ms': search_ms, 'llm_ms': llm_ms,
+        'total_ms': 1000 * (time.perf_counter() - start_time)
+    }
+
 # Language data
 LANGUAGES = {
 'en': {'name': 'English', 'flag': '🇮🇳'},
@@ -278,32 +360,6 @@ LANGUAGES = {
 'as': {'name': 'অসমীয়া', 'flag': '🇮🇳'}
 }
 
-INDIAN_STATES = [
-    "Andhra Pradesh", "Telangana", "Tamil Nadu", "Karnataka", "Kerala",
-    "Maharashtra", "Gujarat", "Uttar Pradesh", "Madhya Pradesh", "Bihar",
-    "West Bengal", "Punjab", "Haryana", "Rajasthan", "Delhi", "Odisha",
-    "Assam", "Jharkhand", "Chhattisgarh", "Himachal Pradesh"
-]
-
-STATE_DISTRICTS = {
-    "Andhra Pradesh": ["Visakhapatnam", "Vijayawada", "Guntur", "Nellore", "Kurnool"],
-    "Telangana": ["Hyderabad", "Warangal", "Nizamabad", "Karimnagar", "Khammam"],
-    "Tamil Nadu": ["Chennai", "Coimbatore", "Madurai", "Tiruchirappalli", "Salem"],
-    "Karnataka": ["Bengaluru", "Mysuru", "Hubballi", "Mangaluru", "Belagavi"],
-    "Kerala": ["Thiruvananthapuram", "Kochi", "Kozhikode", "Thrissur", "Kollam"],
-    "Maharashtra": ["Mumbai", "Pune", "Nagpur", "Nashik", "Aurangabad"],
-    "Gujarat": ["Ahmedabad", "Surat", "Vadodara", "Rajkot", "Bhavnagar"],
-    "Uttar Pradesh": ["Lucknow", "Kanpur", "Agra", "Varanasi", "Meerut"],
-    "Madhya Pradesh": ["Bhopal", "Indore", "Jabalpur", "Gwalior", "Ujjain"],
-    "Bihar": ["Patna", "Gaya", "Bhagalpur", "Muzaffarpur", "Darbhanga"],
-    "West Bengal": ["Kolkata", "Howrah", "Darjeeling", "Siliguri", "Durgapur"],
-    "Punjab": ["Ludhiana", "Amritsar", "Jalandhar", "Patiala", "Bathinda"],
-    "Haryana": ["Gurugram", "Faridabad", "Panipat", "Ambala", "Karnal"],
-    "Rajasthan": ["Jaipur", "Jodhpur", "Udaipur", "Kota", "Bikaner"],
-    "Delhi": ["New Delhi", "North Delhi", "South Delhi", "East Delhi", "West Delhi"],
-    "Odisha": ["Bhubaneswar", "Cuttack", "Rourkela", "Puri", "Sambalpur"],
-    "Assam": ["Guwahati", "Dibrugarh", "Silchar", "Jorhat", "Tezpur"]
-}
 # ============================================
 # PAGE 1: LANGUAGE SELECTION (with card styling)
 # ============================================
@@ -499,7 +555,7 @@ elif st.session_state.page == 2:
             )
             
             st.markdown(f"### 🌾 {_('Main Crop')}")
-            crops = ["Wheat", "Rice", "Cotton", "Sugarcane", "Mustard", "Potato", "Maize", "Moong"]
+            crops = CROPS
             translated_crops = [_(c) for c in crops]
             selected_crop = st.selectbox(
                 label=_("Crop"),
@@ -541,10 +597,14 @@ elif st.session_state.page == 2:
             st.session_state.selected_district = st.session_state.selected_district
             st.session_state.selected_crop = crop
 
-            # Save to PostgreSQL
-            from utils.db import save_farmer
-            save_farmer(name, mobile, email, st.session_state.selected_state,
-                        st.session_state.selected_district, crop)
+            # Save to PostgreSQL; without a database the farmer still gets the dashboard
+            try:
+                init_farmer_db()
+                save_farmer(name, mobile, email, st.session_state.selected_state,
+                            st.session_state.selected_district, crop)
+            except Exception as e:
+                # Shown on the dashboard; a warning here is lost in the rerun
+                st.session_state.registration_warning = f"{_('Registration could not be saved')}: {e}"
             st.session_state.page = 3
             st.rerun()
 # ============================================
@@ -562,6 +622,26 @@ else:
         🌾 {_(st.session_state.crop)}</p>
     </div>
     """, unsafe_allow_html=True)
+    if st.session_state.get('registration_warning'):
+        st.warning(st.session_state.pop('registration_warning'))
+
+    # Precomputed weather and alerts from the prefetch job (weather_prefetch.py)
+    if not st.session_state.get('weather_data'):
+        precomputed = alert_store.get(st.session_state.get('selected_district', ''),
+                                      st.session_state.get('selected_crop', ''))
+        if precomputed and alert_store.is_stale(precomputed):
+            # The prefetch job has stopped; fetch live rather than show old weather as current
+            with st.spinner(_("Fetching weather...")):
+                weather_data = weather_agent.get_weather(st.session_state.selected_district)
+                st.session_state.weather_data = weather_data
+                if weather_data and not weather_data.get("error", False):
+                    st.session_state.current_alerts = weather_agent.generate_alerts(
+                        weather_data, st.session_state.selected_crop)
+                else:
+                    st.session_state.current_alerts = []
+        elif precomputed:
+            st.session_state.weather_data = precomputed['weather']
+            st.session_state.current_alerts = precomputed['alerts']
 
     # Sidebar
     with st.sidebar:
@@ -714,11 +794,19 @@ else:
         if st.button(_("Ask KrishiSahay"), type="primary", use_container_width=True):
             if question:
                 with st.spinner(_("Processing your question...")):
-                    results = rag_engine.search(question, top_k=3)
-                    response = llm.generate_with_retrieval(question, results, target_lang=st.session_state.language)
+                    lang = st.session_state.language
+                    query_key = normalize_question(question)
+                    ask_start = time.perf_counter()
+                    (response, trace), coalesced = qa_flight.do_shared((query_key, lang), answer_question, question, lang)
+                    trace = dict(trace, total_ms=1000 * (time.perf_counter() - ask_start))
+                    query_log.log(question, query_key, lang=lang, coalesced=coalesced,
+                                  district=st.session_state.district or st.session_state.get('selected_district'),
+                                  crop=st.session_state.crop or None, **trace)
                     st.session_state.last_response = response
                     st.session_state.last_question = question
                     st.session_state.show_answer = True
+                    # Synthesise while the farmer reads, so Listen is instant
+                    tts_service.presynthesize(response, st.session_state.language)
         
         # Display answer and listen button
         if st.session_state.get('show_answer', False):
@@ -737,27 +825,20 @@ else:
             if st.button(_("🔊 Listen")):
                 if st.session_state.last_response:
                     with st.spinner(_("Generating audio...")):
-                        from gtts import gTTS
-                        import io
-                        import base64
-                        lang_map = {
-                            'en':'en', 'hi':'hi', 'te':'te', 'ta':'ta', 'kn':'kn',
-                            'ml':'ml', 'bn':'bn', 'mr':'mr', 'gu':'gu',
-                            'pa':'pa', 'or':'or', 'as':'as'
-                        }
-                        tts_lang = lang_map.get(st.session_state.language, 'hi')
-                        tts = gTTS(text=answer_text, lang=tts_lang, slow=False)
-                        fp = io.BytesIO()
-                        tts.write_to_fp(fp)
-                        fp.seek(0)
-                        audio_bytes = fp.read()
-                        b64 = base64.b64encode(audio_bytes).decode()
-                        audio_html = f"""
-                        <audio controls autoplay style="width:100%; margin-top:10px;">
-                            <source src="data:audio/mp3;base64,{b64}" type="audio/mp3">
-                        </audio>
-                        """
-                        st.markdown(audio_html, unsafe_allow_html=True)
+                        # One player: it holds the first sentence as soon as that is
+                        # synthesised, then the whole answer once every sentence is
+                        try:
+                            player = st.empty()
+                            audio_paths = []
+                            for audio_path in tts_service.stream(answer_text, st.session_state.language):
+                                if not audio_paths:
+                                    player.audio(audio_path, format=mime_type(audio_path))
+                                audio_paths.append(audio_path)
+                            if len(audio_paths) > 1:
+                                full_path = tts_service.join(answer_text, st.session_state.language, audio_paths)
+                                player.audio(full_path, format=mime_type(full_path))
+                        except Exception as e:
+                            st.error(f"{_('Audio unavailable')}: {e}")
                 else:
                     st.warning(_("No answer to play yet."))
 
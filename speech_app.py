@@ -1,21 +1,46 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
+import time
 from dotenv import load_dotenv
 import sys
 sys.path.append('utils')
 
-from rag_engine import RAGEngine
+from retrieval_client import get_retriever  # RETRIEVAL_URL -> shared retrieval server
 from dynamic_translator import translate_text_cached
-from gemini_llm import GeminiLLM  # Use Gemini instead of Groq
+from llm_router import LLMRouter  # Gemini/Watsonx chosen per request
+from fast_path import FastPathPolicy
+from answer_store import normalize_question
+from single_flight import SingleFlight
+from query_log import QueryLogger
 
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
 
-rag = RAGEngine()
-llm = GeminiLLM()  # This will use mock if no API key
+rag = get_retriever()
+llm = LLMRouter(offline_engine=rag, fast_path=FastPathPolicy(translate=translate_text_cached))  # Falls back to offline answers if no provider is configured
+qa_flight = SingleFlight()  # identical concurrent questions share one search + LLM call
+query_log = QueryLogger()
+
+
+def answer_english_query(english_query):
+    """Returns (answer, trace) where trace holds the fields for the query log"""
+    search_start = time.perf_counter()
+    results = rag.search(english_query, top_k=3)
+    search_ms = 1000 * (time.perf_counter() - search_start)
+    llm_start = time.perf_counter()
+    # Provider comes back with the answer; llm.last_provider is shared by every request
+    answer, provider = llm.generate_with_provider(english_query, results)
+    return answer, {
+        'source': 'kcc' if provider == 'kcc' else ('llm' if provider else 'offline'),
+        'provider': provider,
+        'retrieved_ids': [r['id'] for r in results],
+        'scores': [round(r['similarity_score'], 4) for r in results],
+        'search_ms': search_ms, 'llm_ms': 1000 * (time.perf_counter() - llm_start)
+    }
+
 @app.route('/')
 def index():
     return app.send_static_file('index.html')
@@ -30,8 +55,11 @@ def process():
     else:
         english_query = query_text
 
-    results = rag.search(english_query, top_k=3)
-    answer_english = llm.generate_with_retrieval(english_query, results)
+    query_key = normalize_question(english_query)
+    start_time = time.perf_counter()
+    (answer_english, trace), coalesced = qa_flight.do_shared((query_key, 'en'), answer_english_query, english_query)
+    query_log.log(query_text, query_key, lang=source_lang, coalesced=coalesced,
+                  **dict(trace, total_ms=1000 * (time.perf_counter() - start_time)))
 
     if source_lang != 'en':
         final_answer = translate_text_cached(answer_english, source_lang)
@@ -43,5 +71,10 @@ def process():
         'lang': source_lang
     })
 
+@app.route('/stats')
+def stats():
+    return jsonify({'single_flight': qa_flight.get_stats(), 'llm': llm.get_stats(),
+                    'query_log': query_log.get_stats()})
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
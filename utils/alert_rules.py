@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Rule-table Alert Engine for KrishiSahay
+Weather alert rules are declared as data and evaluated with NumPy over
+arrays of locations × forecast steps, so every district and crop can be
+checked in one pass.
+
+A rule fires when `metric <op> threshold` holds:
+    horizon "current"   on the current reading
+    horizon "forecast"  on any of the first `steps` forecast entries
+and, if the rule lists crops / stages, only for those crops / growth stages.
+"""
+
+import operator
+
+import numpy as np
+
+# Canonical crop keys and the names farmers (and the UI) use for them
+CROP_ALIASES = {
+    "wheat": ["wheat", "गेहूं", "गेहूँ"],
+    "rice": ["rice", "paddy", "धान", "चावल"],
+    "cotton": ["cotton", "कपास"],
+    "sugarcane": ["sugarcane", "गन्ना"],
+    "mustard": ["mustard", "सरसों"],
+    "potato": ["potato", "आलू"],
+    "maize": ["maize", "corn", "मक्का"],
+    "moong": ["moong", "green gram", "मूंग"],
+}
+
+# Defaults used when the weather payload lacks a metric
+METRIC_DEFAULTS = {"temp": 25.0, "humidity": 50.0, "rain": 0.0}
+
+ALERT_RULES = [
+    {"type": "rain", "metric": "rain", "op": ">", "threshold": 0, "horizon": "current",
+     "severity": "info", "icon": "🌧️", "title": "बारिश की सूचना",
+     "message": "अभी बारिश हो रही है ({rain} mm/h)।",
+     "advice": "अगर छिड़काव नहीं किया है, तो बारिश रुकने तक प्रतीक्षा करें।"},
+    {"type": "forecast_rain", "metric": "rain", "op": ">", "threshold": 0, "horizon": "forecast", "steps": 8,
+     "severity": "warning", "icon": "⚠️", "title": "बारिश की संभावना",
+     "message": "अगले कुछ घंटों में बारिश हो सकती है।",
+     "advice": "कीटनाशक या उर्वरक का छिड़काव टालें।"},
+    {"type": "heat", "metric": "temp", "op": ">", "threshold": 35, "horizon": "current",
+     "severity": "warning", "icon": "🔥", "title": "भीषण गर्मी",
+     "message": "तापमान बहुत अधिक है ({temp}°C)।",
+     "advice": "फसलों में पानी की कमी हो सकती है। सिंचाई करें।"},
+    {"type": "cold", "metric": "temp", "op": "<", "threshold": 10, "horizon": "current",
+     "severity": "warning", "icon": "❄️", "title": "कड़ाके की ठंड",
+     "message": "तापमान कम है ({temp}°C)। पाले का खतरा।",
+     "advice": "रात में हल्का पानी का छिड़काव करें या फसलों को ढकें।"},
+    {"type": "high_humidity", "metric": "humidity", "op": ">", "threshold": 85, "horizon": "current",
+     "severity": "info", "icon": "💧", "title": "उच्च नमी",
+     "message": "नमी बहुत अधिक है ({humidity}%)।",
+     "advice": "फफूंद रोगों का खतरा बढ़ सकता है। फसलों की नियमित जांच करें।"},
+    {"type": "crop_heat_stress", "metric": "temp", "op": ">", "threshold": 32, "horizon": "current",
+     "crops": ["wheat"], "stages": None,
+     "severity": "warning", "icon": "🌾", "title": "गेहूं के लिए सावधानी",
+     "message": "अधिक तापमान गेहूं के दाने भरने को प्रभावित कर सकता है।",
+     "advice": "हल्की सिंचाई करें।"},
+    {"type": "crop_pest_risk", "metric": "humidity", "op": ">", "threshold": 70, "horizon": "current",
+     "crops": ["mustard"], "stages": None,
+     "severity": "info", "icon": "🌿", "title": "सरसों में कीट का खतरा",
+     "message": "अधिक नमी से कीटों का खतरा बढ़ सकता है।",
+     "advice": "माहू कीट की नियमित जांच करें।"},
+]
+
+OPS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+
+def normalize_crop(crop):
+    """
+    Map a crop name in English or Hindi to its canonical key (None if unknown)
+    """
+    if not crop:
+        return None
+    name = crop.strip().lower()
+    for key, aliases in CROP_ALIASES.items():
+        if name in aliases:
+            return key
+    # Free-text names such as "wheat (HD-2967)"
+    for key, aliases in CROP_ALIASES.items():
+        if any(alias in name for alias in aliases):
+            return key
+    return None
+
+
+def weather_to_arrays(weather_list, max_steps=8):
+    """
+    Stack weather payloads into current (L,) and forecast (L, T) arrays per metric;
+    missing forecast steps are NaN so they never trigger a rule
+    """
+    n = len(weather_list)
+    current = {m: np.full(n, d, dtype=np.float32) for m, d in METRIC_DEFAULTS.items()}
+    forecast = {m: np.full((n, max_steps), np.nan, dtype=np.float32) for m in METRIC_DEFAULTS}
+    for i, weather in enumerate(weather_list):
+        cur = weather.get("current", {})
+        for m in METRIC_DEFAULTS:
+            if cur.get(m) is not None:
+                current[m][i] = cur[m]
+        for t, step in enumerate(weather.get("forecast", [])[:max_steps]):
+            for m in METRIC_DEFAULTS:
+                if step.get(m) is not None:
+                    forecast[m][i, t] = step[m]
+    return current, forecast
+
+
+class AlertEngine:
+    def __init__(self, rules=None):
+        self.rules = rules or ALERT_RULES
+
+    def evaluate(self, current, forecast, crops, stages=None):
+        """
+        Vectorised evaluation.
+        current: metric -> (L,) array, forecast: metric -> (L, T) array,
+        crops: list of C crop names, stages: optional list of C growth stages.
+        Returns a boolean array (L, C, R): rule r fires for location l and crop c.
+        """
+        crop_keys = [normalize_crop(c) for c in crops]
+        stages = stages or [None] * len(crops)
+        n_locations = len(next(iter(current.values())))
+
+        weather_mask = np.zeros((n_locations, len(self.rules)), dtype=bool)
+        crop_mask = np.zeros((len(crops), len(self.rules)), dtype=bool)
+        for r, rule in enumerate(self.rules):
+            compare = OPS[rule["op"]]
+            if rule["horizon"] == "forecast":
+                values = forecast[rule["metric"]][:, :rule.get("steps", forecast[rule["metric"]].shape[1])]
+                with np.errstate(invalid="ignore"):
+                    weather_mask[:, r] = compare(values, rule["threshold"]).any(axis=1)
+            else:
+                weather_mask[:, r] = compare(current[rule["metric"]], rule["threshold"])
+
+            for c, (key, stage) in enumerate(zip(crop_keys, stages)):
+                crop_ok = not rule.get("crops") or key in rule["crops"]
+                stage_ok = not rule.get("stages") or stage in rule["stages"]
+                crop_mask[c, r] = crop_ok and stage_ok
+
+        return weather_mask[:, None, :] & crop_mask[None, :, :]
+
+    def build_alert(self, rule, weather):
+        current = weather.get("current", {})
+        values = {m: current.get(m, d) for m, d in METRIC_DEFAULTS.items()}
+        return {
+            "type": rule["type"],
+            "severity": rule["severity"],
+            "icon": rule["icon"],
+            "title": rule["title"],
+            "message": rule["message"].format(**values),
+            "advice": rule["advice"]
+        }
+
+    def alerts_for(self, weather_list, crops, stages=None):
+        """
+        Evaluate every location × crop in one pass.
+        Returns {(location_index, crop): [alert, ...]}
+        """
+        current, forecast = weather_to_arrays(weather_list)
+        fired = self.evaluate(current, forecast, crops, stages)
+        results = {}
+        for l, weather in enumerate(weather_list):
+            for c, crop in enumerate(crops):
+                results[(l, crop)] = [self.build_alert(self.rules[r], weather)
+                                      for r in np.flatnonzero(fired[l, c])]
+        return results
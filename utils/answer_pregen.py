@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Answer Pre-generation Job for KrishiSahay
+Generates answers to the most frequent questions in every app language
+ahead of time and stores them in the AnswerStore, which the app consults
+before retrieval and the LLM.
+
+The app looks answers up by the farmer's own text and UI language, so a
+question is only generated in the language it is asked in: a corpus
+question in its metadata language, a logged question in the language it
+was logged with. Questions come from a file ("lang<TAB>question" per
+line, as written by "query_log.py export"; bare lines count as English
+if ASCII, else Hindi) or, by default, the most repeated questions in the
+KCC corpus. Retrieval runs in batches through RAGEngine.search_batch;
+generation uses bounded concurrency and a request rate limit.
+
+Usage:
+    python utils/answer_pregen.py --top 50                     # all languages
+    python utils/answer_pregen.py --questions top.tsv --langs hi,en
+    python utils/answer_pregen.py --top 5 --fake-llm           # no network (CI)
+"""
+
+import argparse
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from answer_store import AnswerStore, normalize_question
+from rate_limiter import RateLimiter
+
+# The app's UI languages
+LANGUAGES = ['en', 'hi', 'te', 'ta', 'kn', 'ml', 'bn', 'mr', 'gu', 'pa', 'or', 'as']
+
+
+def _guess_language(question):
+    # The KCC corpus is Hindi and English
+    return 'en' if question.isascii() else 'hi'
+
+
+def top_questions(rag, n, questions_file=None):
+    """
+    Top-n (question, lang) pairs by frequency (normalised), from
+    questions_file or the corpus
+    """
+    if questions_file:
+        pairs = []
+        with open(questions_file, encoding="utf-8") as f:
+            for line in f:
+                lang, sep, question = line.strip().partition("\t")
+                if not sep:
+                    question, lang = lang, _guess_language(lang)
+                if question:
+                    pairs.append((question, lang))
+    else:
+        pairs = [(meta['question'], meta.get('language') or _guess_language(meta['question']))
+                 for meta in rag.metadata]
+
+    counts = Counter((normalize_question(q), lang) for q, lang in pairs)
+    first_seen = {}
+    for q, lang in pairs:
+        first_seen.setdefault((normalize_question(q), lang), q)
+    return [(first_seen[key], key[1]) for key, _ in counts.most_common(n)]
+
+
+class AnswerPregenJob:
+    def __init__(self, rag, llm, store=None, max_workers=None, rate_per_sec=None, top_k=3):
+        self.rag = rag
+        self.llm = llm
+        self.store = store or AnswerStore()
+        self.max_workers = int(max_workers or os.getenv("PREGEN_WORKERS", "4"))
+        self.limiter = RateLimiter(float(rate_per_sec or os.getenv("PREGEN_RATE", "1")))
+        self.top_k = top_k
+
+    def _generate(self, question, results, lang):
+        self.limiter.acquire()
+        return self.llm.generate_with_provider(question, results, target_lang=lang)
+
+    def run(self, pairs, languages=None, refresh=False, batch_size=64):
+        """
+        Pre-generate every (question, lang) pair whose lang is in languages;
+        returns run statistics
+        """
+        languages = languages or LANGUAGES
+        pairs = [(q, lang) for q, lang in pairs if lang in languages]
+        questions = list(dict.fromkeys(q for q, _ in pairs))
+        start_time = time.time()
+        stats = {'questions': len(questions), 'languages': len({lang for _, lang in pairs}),
+                 'generated': 0, 'skipped': 0, 'failed': 0}
+
+        # Answers are tagged with the generation they were retrieved from;
+        # the app stops serving them once another one is promoted
+        generation = getattr(self.rag, 'generation', None)
+        results_by_question = {}
+        for start in range(0, len(questions), batch_size):
+            batch = questions[start:start + batch_size]
+            for question, results in zip(batch, self.rag.search_batch(batch, top_k=self.top_k)):
+                results_by_question[question] = results
+
+        tasks = []
+        for question, lang in pairs:
+            record = None if refresh else self.store.get(question, lang)
+            if record and not self.store.is_stale(record, generation):
+                stats['skipped'] += 1
+            else:
+                tasks.append((question, lang))
+
+        print(f"🔄 Generating {len(tasks)} answers for {len(questions)} questions in {stats['languages']} languages "
+              f"({self.max_workers} workers, {self.limiter.rate}/s)...")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._generate, q, results_by_question[q], lang): (q, lang)
+                       for q, lang in tasks}
+            for future in as_completed(futures):
+                question, lang = futures[future]
+                try:
+                    answer, provider = future.result()
+                except Exception as e:
+                    stats['failed'] += 1
+                    print(f"❌ [{lang}] {question[:40]}: {e}")
+                    continue
+                if provider is None:
+                    # Every provider failed; don't pin the offline fallback
+                    stats['failed'] += 1
+                    continue
+                self.store.save(question, lang, answer, provider, generation)
+                stats['generated'] += 1
+
+        stats['seconds'] = time.time() - start_time
+        print(f"✅ Generated {stats['generated']} answers ({stats['skipped']} already stored, "
+              f"{stats['failed']} failed) in {stats['seconds']:.1f}s")
+        return stats
+
+
+def start_fake_llm():
+    """
+    Point Watsonx at a local FakeLLMServer so the job runs without network
+    """
+    from fake_llm_server import FakeLLMServer
+    server = FakeLLMServer().start()
+    os.environ.update({
+        "WATSONX_URL": server.chat_url,
+        "WATSONX_IAM_URL": server.iam_url,
+        "WATSONX_API_KEY": "fake-key",
+        "WATSONX_PROJECT_ID": "fake-project",
+        "LLM_PROVIDERS": "watsonx",
+    })
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate answers for the most frequent questions")
+    parser.add_argument("--top", type=int, default=50, help="number of questions")
+    parser.add_argument("--questions", help="file with one lang<TAB>question per line (query_log.py export)")
+    parser.add_argument("--langs", default=",".join(LANGUAGES), help="only questions asked in these languages")
+    parser.add_argument("--workers", type=int, default=None, help="concurrent generations")
+    parser.add_argument("--rate", type=float, default=None, help="LLM calls per second")
+    parser.add_argument("--refresh", action="store_true", help="regenerate answers already stored, even current ones")
+    parser.add_argument("--fake-llm", action="store_true", help="use a local fake LLM server")
+    args = parser.parse_args()
+
+    server = start_fake_llm() if args.fake_llm else None
+    from retrieval_client import get_retriever
+    from llm_router import LLMRouter
+
+    rag = get_retriever()
+    llm = LLMRouter(offline_engine=rag)
+    job = AnswerPregenJob(rag, llm, max_workers=args.workers, rate_per_sec=args.rate)
+    pairs = top_questions(rag, args.top, args.questions)
+    try:
+        job.run(pairs, [l.strip() for l in args.langs.split(",") if l.strip()], refresh=args.refresh)
+    finally:
+        if server is not None:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
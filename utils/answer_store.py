@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Precomputed Answer Store for KrishiSahay
+Answers to the most frequent questions, generated ahead of time per
+language by answer_pregen.py, keyed by the normalised question so the
+app can serve them without retrieval or an LLM call. Each answer records
+the index generation it was retrieved from; it goes stale after
+ANSWER_MAX_AGE or once another generation is promoted.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+# Punctuation in Latin and Indic scripts (danda, double danda)
+_PUNCTUATION = re.compile(r"[?!.,;:।॥\"'()\[\]{}\-–—]+")
+
+
+def normalize_question(text):
+    """
+    Lower-case, drop punctuation and collapse whitespace, so trivially
+    different spellings of one question share a key
+    """
+    text = _PUNCTUATION.sub(" ", (text or "").lower())
+    return " ".join(text.split())
+
+
+class AnswerStore:
+    def __init__(self, path=None, max_age=None):
+        self.path = path or os.getenv("ANSWER_STORE_PATH", "cache/answers.sqlite")
+        # Older answers are regenerated rather than served (seconds)
+        self.max_age = float(max_age or os.getenv("ANSWER_MAX_AGE", "604800"))
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                question_key TEXT NOT NULL,
+                lang TEXT NOT NULL,
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                provider TEXT,
+                generated_at TEXT NOT NULL,
+                generation TEXT,
+                PRIMARY KEY (question_key, lang)
+            )
+        """)
+        # Stores created before answers recorded their index generation
+        if "generation" not in {row[1] for row in conn.execute("PRAGMA table_info(answers)")}:
+            conn.execute("ALTER TABLE answers ADD COLUMN generation TEXT")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def save(self, question, lang, answer, provider=None, generation=None):
+        conn = self._conn()
+        conn.execute("""
+            INSERT OR REPLACE INTO answers (question_key, lang, question, answer, provider, generated_at, generation)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (normalize_question(question), lang, question, answer, provider,
+              datetime.now().strftime("%Y-%m-%d %H:%M:%S"), generation))
+        conn.commit()
+
+    def get(self, question, lang):
+        """
+        Return {'answer', 'provider', 'generated_at', 'generation'} or None
+        """
+        row = self._conn().execute(
+            "SELECT answer, provider, generated_at, generation FROM answers WHERE question_key = ? AND lang = ?",
+            (normalize_question(question), lang)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'answer': row[0], 'provider': row[1], 'generated_at': row[2], 'generation': row[3]}
+
+    def is_stale(self, record, generation=None):
+        """
+        True when a record from get() is older than max_age, or was
+        generated from another index generation than the live one
+        (generation None: the index has no generations)
+        """
+        generated_at = datetime.strptime(record['generated_at'], "%Y-%m-%d %H:%M:%S")
+        if (datetime.now() - generated_at).total_seconds() > self.max_age:
+            return True
+        return generation is not None and record['generation'] != generation
+
+    def has(self, question, lang):
+        return self._conn().execute(
+            "SELECT 1 FROM answers WHERE question_key = ? AND lang = ?",
+            (normalize_question(question), lang)
+        ).fetchone() is not None
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM answers").fetchone()[0]
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Prompt Context Builder for KrishiSahay
+Turns retrieved KCC results into a compact LLM context: near-duplicate
+answers are dropped, each answer is trimmed to its most relevant
+sentences and the whole context is kept within a token budget
+"""
+
+import os
+import re
+from typing import List, Dict, Any
+
+from lexical_index import tokenize
+
+SENTENCE_SPLIT = re.compile(r"(?<=[।.!?])\s+|\n+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate: ~4 chars per token for Latin text, ~2 for Indic scripts
+    """
+    if not text:
+        return 0
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return max(1, int((len(text) - non_ascii) / 4 + non_ascii / 2))
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ContextBuilder:
+    def __init__(self, token_budget=None, max_sentences=None, dedup_threshold=None):
+        self.token_budget = int(token_budget if token_budget is not None
+                                else os.getenv("PROMPT_TOKEN_BUDGET", "600"))
+        self.max_sentences = int(max_sentences if max_sentences is not None
+                                 else os.getenv("CONTEXT_MAX_SENTENCES", "3"))
+        self.dedup_threshold = float(dedup_threshold if dedup_threshold is not None
+                                     else os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+        self.header = "Relevant Q&A pairs from Kisan Call Centre:\n\n"
+
+    def trim_answer(self, answer: str, query_terms: set, question_terms: set, max_sentences: int) -> str:
+        """
+        Keep the sentences sharing most terms with the query (and the matched
+        KCC question), in their original order
+        """
+        sentences = [s.strip() for s in SENTENCE_SPLIT.split(answer) if s.strip()]
+        if len(sentences) <= max_sentences:
+            return " ".join(sentences)
+
+        scored = []
+        for pos, sentence in enumerate(sentences):
+            terms = set(tokenize(sentence))
+            score = 2 * len(terms & query_terms) + len(terms & question_terms)
+            # Earlier sentences win ties; KCC answers usually lead with the advice
+            scored.append((score, -pos, pos))
+        keep = sorted(pos for _, _, pos in sorted(scored, reverse=True)[:max_sentences])
+        return " ".join(sentences[pos] for pos in keep)
+
+    def build(self, query: str, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Return {'context', 'tokens', 'passages', 'dropped_duplicates'}
+        """
+        query_terms = set(tokenize(query))
+        kept_term_sets = []
+        passages = []
+        duplicates = 0
+        used_tokens = estimate_tokens(self.header)
+
+        for r in results:
+            meta = r['metadata']
+            answer_terms = set(tokenize(meta['answer']))
+            if any(_jaccard(answer_terms, seen) >= self.dedup_threshold for seen in kept_term_sets):
+                duplicates += 1
+                continue
+
+            question_terms = set(tokenize(meta['question']))
+            # Shrink the passage until it fits in what is left of the budget
+            passage = None
+            for n_sentences in range(self.max_sentences, 0, -1):
+                answer = self.trim_answer(meta['answer'], query_terms, question_terms, n_sentences)
+                candidate = (f"{len(passages) + 1}. प्रश्न: {meta['question']}\n"
+                             f"   उत्तर: {answer}\n   (फसल: {meta['crop']})\n\n")
+                if used_tokens + estimate_tokens(candidate) <= self.token_budget:
+                    passage = candidate
+                    break
+            if passage is None:
+                break
+
+            kept_term_sets.append(answer_terms)
+            passages.append(passage)
+            used_tokens += estimate_tokens(passage)
+
+        context = self.header + "".join(passages) if passages else ""
+        return {
+            'context': context,
+            'tokens': estimate_tokens(context),
+            'passages': len(passages),
+            'dropped_duplicates': duplicates
+        }
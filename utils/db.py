@@ -1,74 +1,480 @@
-import os
-import psycopg2
-from psycopg2 import pool
-from psycopg2.extras import RealDictCursor
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# Get connection URL from environment
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL not set in environment")
-
-# Create a connection pool (min 1, max 10 connections)
-connection_pool = psycopg2.pool.SimpleConnectionPool(
-    1, 10,
-    dsn=DATABASE_URL,
-    sslmode='require'  # already in URL, but can be explicit
-)
-
-def get_connection():
-    return connection_pool.getconn()
-
-def return_connection(conn):
-    connection_pool.putconn(conn)
-
-def init_db():
-    """Create farmers table if it doesn't exist."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS farmers (
-            id SERIAL PRIMARY KEY,
-            name VARCHAR(100) NOT NULL,
-            mobile VARCHAR(10) UNIQUE NOT NULL,
-            email VARCHAR(100),
-            state VARCHAR(50) NOT NULL,
-            district VARCHAR(50) NOT NULL,
-            crop VARCHAR(50) NOT NULL,
-            registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-    conn.commit()
-    cur.close()
-    return_connection(conn)
-
-def save_farmer(name, mobile, email, state, district, crop):
-    """Insert or update farmer record (upsert on mobile conflict)."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO farmers (name, mobile, email, state, district, crop)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        ON CONFLICT (mobile) DO UPDATE SET
-            name = EXCLUDED.name,
-            email = EXCLUDED.email,
-            state = EXCLUDED.state,
-            district = EXCLUDED.district,
-            crop = EXCLUDED.crop,
-            registered_at = CURRENT_TIMESTAMP;
-    """, (name, mobile, email, state, district, crop))
-    conn.commit()
-    cur.close()
-    return_connection(conn)
-
-def get_farmer_by_mobile(mobile):
-    """Retrieve farmer by mobile number (returns dict or None)."""
-    conn = get_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute("SELECT * FROM farmers WHERE mobile = %s;", (mobile,))
-    result = cur.fetchone()
-    cur.close()
-    return_connection(conn)
-    return result
\ No newline at end of file
+"""
+Farmer records data-access layer for KrishiSahay
+
+- The connection pool is created lazily on first use (importing this module
+  no longer needs DATABASE_URL) and is thread-safe.
+- `connection()` is a context manager: connections always go back to the
+  pool, and are rolled back on error.
+- Callers wait (up to DB_POOL_TIMEOUT seconds) for a free connection
+  instead of failing when the pool is exhausted; saturation is reported
+  by `pool_stats()`.
+- DATABASE_URL may be a PostgreSQL DSN or `sqlite:///path.db`, a local
+  stand-in for development and tests.
+- Farmer profiles are served from an in-process read-through cache keyed
+  by mobile (FARMER_CACHE_TTL seconds), invalidated on every write made
+  through this module.
+"""
+
+import csv
+import io
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+CACHE_TTL = float(os.getenv("FARMER_CACHE_TTL", "300"))
+CACHE_SIZE = int(os.getenv("FARMER_CACHE_SIZE", "10000"))
+
+POSTGRES_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS farmers (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        mobile VARCHAR(10) UNIQUE NOT NULL,
+        email VARCHAR(100),
+        state VARCHAR(50) NOT NULL,
+        district VARCHAR(50) NOT NULL,
+        crop VARCHAR(50) NOT NULL,
+        registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+SQLITE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS farmers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name VARCHAR(100) NOT NULL,
+        mobile VARCHAR(10) UNIQUE NOT NULL,
+        email VARCHAR(100),
+        state VARCHAR(50) NOT NULL,
+        district VARCHAR(50) NOT NULL,
+        crop VARCHAR(50) NOT NULL,
+        registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+# Segment queries (e.g. mustard growers in Agra for an alert push);
+# the composite index also serves state-only and state+district filters
+SEGMENT_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_farmers_segment ON farmers (state, district, crop)",
+    "CREATE INDEX IF NOT EXISTS idx_farmers_district_crop ON farmers (district, crop)",
+    "CREATE INDEX IF NOT EXISTS idx_farmers_crop ON farmers (crop)",
+]
+
+UPSERT_SET = """
+    ON CONFLICT (mobile) DO UPDATE SET
+        name = EXCLUDED.name,
+        email = EXCLUDED.email,
+        state = EXCLUDED.state,
+        district = EXCLUDED.district,
+        crop = EXCLUDED.crop,
+        registered_at = CURRENT_TIMESTAMP
+"""
+
+FARMER_COLUMNS = ("name", "mobile", "email", "state", "district", "crop")
+
+# Server-side prepared statements, created once per pooled connection
+PREPARED_STATEMENTS = {
+    "save_farmer": "PREPARE save_farmer (varchar, varchar, varchar, varchar, varchar, varchar) AS "
+                   "INSERT INTO farmers (name, mobile, email, state, district, crop) "
+                   "VALUES ($1, $2, $3, $4, $5, $6)" + UPSERT_SET,
+    "get_farmer_by_mobile": "PREPARE get_farmer_by_mobile (varchar) AS "
+                            "SELECT * FROM farmers WHERE mobile = $1",
+}
+
+
+class _PostgresBackend:
+    def __init__(self, dsn, minconn, maxconn):
+        import psycopg2
+        from psycopg2 import pool
+        from psycopg2.extras import RealDictCursor
+
+        class PreparedConnection(psycopg2.extensions.connection):
+            """Remembers which statements are prepared on this session"""
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.prepared = set()
+
+        self.dict_cursor = RealDictCursor
+        self.pool = pool.ThreadedConnectionPool(
+            minconn, maxconn,
+            dsn=dsn,
+            sslmode=os.getenv("DB_SSLMODE", "require"),
+            connection_factory=PreparedConnection
+        )
+
+    def getconn(self):
+        return self.pool.getconn()
+
+    def putconn(self, conn, broken=False):
+        self.pool.putconn(conn, close=broken)
+
+    def schema(self):
+        return POSTGRES_SCHEMA
+
+    def dict_cursor_for(self, conn):
+        return conn.cursor(cursor_factory=self.dict_cursor)
+
+    def execute_prepared(self, cur, name, params):
+        conn = cur.connection
+        if name not in conn.prepared:
+            cur.execute("SELECT 1 FROM pg_prepared_statements WHERE name = %s", (name,))
+            if cur.fetchone() is None:
+                cur.execute(PREPARED_STATEMENTS[name])
+            conn.prepared.add(name)
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+
+    def bulk_upsert(self, conn, rows):
+        """
+        COPY the batch into a session-local staging table, then one
+        INSERT ... SELECT ... ON CONFLICT into farmers
+        """
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS farmers_staging (
+                name VARCHAR(100), mobile VARCHAR(10), email VARCHAR(100),
+                state VARCHAR(50), district VARCHAR(50), crop VARCHAR(50)
+            ) ON COMMIT DELETE ROWS
+        """)
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        buf.seek(0)
+        cur.copy_expert(
+            f"COPY farmers_staging ({', '.join(FARMER_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buf
+        )
+        cur.execute(f"""
+            INSERT INTO farmers ({', '.join(FARMER_COLUMNS)})
+            SELECT {', '.join(FARMER_COLUMNS)} FROM farmers_staging
+        """ + UPSERT_SET)
+        cur.close()
+
+    def closeall(self):
+        self.pool.closeall()
+
+
+class _SQLiteBackend:
+    def __init__(self, path, minconn, maxconn):
+        # maxconn is enforced by Database; idle connections are kept here
+        self.path = path
+        self.pool = queue.LifoQueue()
+        for _ in range(minconn):
+            self.pool.put(self._connect())
+
+    def _connect(self):
+        # sqlite3 caches compiled statements per connection, so reused
+        # connections give us prepared statements for free
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def getconn(self):
+        try:
+            return self.pool.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def putconn(self, conn, broken=False):
+        if broken:
+            conn.close()
+            return
+        self.pool.put(conn)
+
+    def schema(self):
+        return SQLITE_SCHEMA
+
+    def dict_cursor_for(self, conn):
+        return conn.cursor()
+
+    def execute_prepared(self, cur, name, params):
+        sql = {
+            "save_farmer": "INSERT INTO farmers (name, mobile, email, state, district, crop) "
+                           "VALUES (?, ?, ?, ?, ?, ?)" + UPSERT_SET,
+            "get_farmer_by_mobile": "SELECT * FROM farmers WHERE mobile = ?",
+        }[name]
+        cur.execute(sql, params)
+
+    def bulk_upsert(self, conn, rows):
+        conn.executemany(
+            "INSERT INTO farmers (name, mobile, email, state, district, crop) "
+            "VALUES (?, ?, ?, ?, ?, ?)" + UPSERT_SET,
+            rows
+        )
+
+    def closeall(self):
+        while not self.pool.empty():
+            self.pool.get_nowait().close()
+
+
+class Database:
+    def __init__(self, url, minconn=POOL_MIN, maxconn=POOL_MAX, timeout=POOL_TIMEOUT):
+        if url.startswith("sqlite:///"):
+            self.backend = _SQLiteBackend(url[len("sqlite:///"):], minconn, maxconn)
+        else:
+            self.backend = _PostgresBackend(url, minconn, maxconn)
+        self.maxconn = maxconn
+        self.timeout = timeout
+        # Bounds checkouts so callers queue instead of hitting PoolError
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._stats = {
+            'checkouts': 0, 'in_use': 0, 'peak_in_use': 0, 'waits': 0,
+            'wait_time_total': 0.0, 'timeouts': 0, 'errors': 0
+        }
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a pooled connection; commit on success, roll back on error,
+        always return it to the pool
+        """
+        start_time = time.perf_counter()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['waits'] += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self._stats['timeouts'] += 1
+                raise TimeoutError(f"No database connection free within {self.timeout}s")
+        waited = time.perf_counter() - start_time
+
+        conn = None
+        broken = False
+        try:
+            conn = self.backend.getconn()
+            with self._lock:
+                self._stats['checkouts'] += 1
+                self._stats['in_use'] += 1
+                self._stats['peak_in_use'] = max(self._stats['peak_in_use'], self._stats['in_use'])
+                self._stats['wait_time_total'] += waited
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                with self._lock:
+                    self._stats['errors'] += 1
+                try:
+                    conn.rollback()
+                except Exception:
+                    broken = True
+                raise
+        finally:
+            if conn is not None:
+                self.backend.putconn(conn, broken=broken)
+                with self._lock:
+                    self._stats['in_use'] -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['max_connections'] = self.maxconn
+        stats['saturation'] = stats['in_use'] / self.maxconn
+        stats['avg_wait_ms'] = 1000 * stats['wait_time_total'] / max(stats['checkouts'], 1)
+        return stats
+
+    def close(self):
+        self.backend.closeall()
+
+
+class FarmerCache:
+    def __init__(self, ttl=CACHE_TTL, max_size=CACHE_SIZE):
+        """
+        Thread-safe TTL + LRU cache of farmer profiles keyed by mobile
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        # Bumped on every invalidation so an in-flight read that started
+        # before a write cannot put the old profile back
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, mobile):
+        with self._lock:
+            entry = self._entries.get(mobile)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self._entries.move_to_end(mobile)
+                self.hits += 1
+                return dict(entry[0])
+            self.misses += 1
+            return None
+
+    def version(self, mobile):
+        with self._lock:
+            return self._versions.get(mobile, 0)
+
+    def put(self, mobile, profile, version):
+        with self._lock:
+            if self._versions.get(mobile, 0) != version:
+                return
+            self._entries[mobile] = (profile, time.monotonic())
+            self._entries.move_to_end(mobile)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, mobiles):
+        with self._lock:
+            for mobile in mobiles:
+                self._entries.pop(mobile, None)
+                self._versions[mobile] = self._versions.get(mobile, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+farmer_cache = FarmerCache()
+
+_db = None
+_db_lock = threading.Lock()
+
+
+def get_db():
+    """Create the shared Database on first use (thread-safe)."""
+    global _db
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                url = os.getenv("DATABASE_URL")
+                if not url:
+                    raise ValueError("DATABASE_URL not set in environment")
+                _db = Database(url)
+    return _db
+
+
+def connection():
+    return get_db().connection()
+
+
+def pool_stats():
+    """Pool saturation metrics: in use, peak, waits, timeouts, average wait."""
+    return get_db().stats()
+
+
+def init_db():
+    """Create farmers table and segment indexes if they don't exist."""
+    db = get_db()
+    with db.connection() as conn:
+        cur = conn.cursor()
+        cur.execute(db.backend.schema())
+        for statement in SEGMENT_INDEXES:
+            cur.execute(statement)
+        cur.close()
+
+
+def save_farmer(name, mobile, email, state, district, crop):
+    """Insert or update farmer record (upsert on mobile conflict)."""
+    db = get_db()
+    with db.connection() as conn:
+        cur = conn.cursor()
+        db.backend.execute_prepared(cur, "save_farmer", (name, mobile, email, state, district, crop))
+        cur.close()
+    farmer_cache.invalidate([mobile])
+
+
+def get_farmer_by_mobile(mobile):
+    """Retrieve farmer by mobile number (returns dict or None), cached."""
+    profile = farmer_cache.get(mobile)
+    if profile is not None:
+        return profile
+    version = farmer_cache.version(mobile)
+    db = get_db()
+    with db.connection() as conn:
+        cur = db.backend.dict_cursor_for(conn)
+        db.backend.execute_prepared(cur, "get_farmer_by_mobile", (mobile,))
+        result = cur.fetchone()
+        cur.close()
+    if result is None:
+        return None
+    profile = dict(result)
+    farmer_cache.put(mobile, profile, version)
+    return dict(profile)
+
+
+def get_farmers_by_segment(state=None, district=None, crop=None, limit=None):
+    """
+    Farmers matching every given filter (served by the segment indexes),
+    e.g. get_farmers_by_segment("Uttar Pradesh", "Agra", "Mustard")
+    """
+    db = get_db()
+    filters = [(column, value) for column, value in
+               (("state", state), ("district", district), ("crop", crop)) if value]
+    placeholder = "?" if isinstance(db.backend, _SQLiteBackend) else "%s"
+    sql = "SELECT * FROM farmers"
+    if filters:
+        sql += " WHERE " + " AND ".join(f"{column} = {placeholder}" for column, _ in filters)
+    params = [value for _, value in filters]
+    if limit:
+        sql += f" LIMIT {placeholder}"
+        params.append(int(limit))
+    with db.connection() as conn:
+        cur = db.backend.dict_cursor_for(conn)
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+        cur.close()
+    return [dict(row) for row in rows]
+
+
+def bulk_upsert_farmers(rows, batch_size=5000):
+    """
+    Upsert (name, mobile, email, state, district, crop) tuples, one
+    transaction per batch. Later rows win when a mobile repeats.
+    Returns the number of rows written.
+    """
+    db = get_db()
+    written = 0
+    for start in range(0, len(rows), batch_size):
+        # ON CONFLICT cannot touch the same row twice in one statement
+        batch = list({row[1]: row for row in rows[start:start + batch_size]}.values())
+        with db.connection() as conn:
+            db.backend.bulk_upsert(conn, batch)
+        farmer_cache.invalidate(row[1] for row in batch)
+        written += len(batch)
+    return written
+
+
+# Registration burst against the configured database (SQLite stand-in by default)
+if __name__ == "__main__":
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'farmers.db')}")
+    print(f"🗄️ Using {os.environ['DATABASE_URL'].split('@')[-1]}")
+    init_db()
+
+    def register(i):
+        mobile = f"9{i:09d}"
+        save_farmer(f"Farmer {i}", mobile, None, "Uttar Pradesh", "Agra", "Mustard")
+        return get_farmer_by_mobile(mobile)["mobile"] == mobile
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        ok = sum(executor.map(register, range(500)))
+    print(f"✅ {ok}/500 registrations in {time.time() - start:.2f}s")
+
+    start = time.time()
+    for _ in range(20):
+        for i in range(500):
+            get_farmer_by_mobile(f"9{i:09d}")
+    print(f"✅ 10000 profile lookups in {time.time() - start:.2f}s, cache: {farmer_cache.stats()}")
+    print(f"✅ {len(get_farmers_by_segment('Uttar Pradesh', 'Agra', 'Mustard'))} mustard growers in Agra")
+    print(f"📊 Pool: {pool_stats()}")
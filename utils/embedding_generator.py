@@ -2,15 +2,36 @@
 """
 Embedding Generator for KrishiSahay
 Converts Q&A pairs into vector embeddings and creates FAISS index
+(or the built-in NumPy index when FAISS is not installed)
+
+Each build goes into a new index generation (index_generations.py) that
+is validated and then promoted, so running apps swap it in without a
+restart. INDEX_GENERATIONS=false writes into embeddings/ in place instead.
+
+Embeddings are computed in checkpointed chunks (EMBED_CHUNK_SIZE texts
+each) under embeddings/checkpoints/, so a build that dies part-way
+resumes from the last completed chunk when rerun on the same corpus.
+
+Near-duplicate records are collapsed into one canonical record with a
+duplicate_count before indexing (near_duplicates.py; DEDUP_ENABLED=false
+keeps every record).
 """
 
+import hashlib
 import json
 import pickle
+import shutil
 import numpy as np
 from sentence_transformers import SentenceTransformer
 import os
 import time
 
+from lexical_index import BM25Index
+from vector_index import build_flat_index
+from sharded_index import build_shards
+from near_duplicates import collapse_near_duplicates
+from index_generations import collect_garbage, new_generation, promote, validate_generation, write_manifest
+
 class EmbeddingGenerator:
     def __init__(self, model_name="all-MiniLM-L6-v2"):
         """
@@ -74,6 +95,73 @@ class EmbeddingGenerator:
         print(f"   Time taken: {end_time - start_time:.2f} seconds")
         
         return embeddings
+
+    def build_fingerprint(self, texts, chunk_size):
+        """
+        Identifies one corpus + model + chunking, so chunks are only reused
+        by a build that would produce exactly the same ones
+        """
+        digest = hashlib.sha256(f"{self.model_name}\0{chunk_size}\0{len(texts)}".encode("utf-8"))
+        for text in texts:
+            digest.update(text.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()[:16]
+
+    def generate_embeddings_checkpointed(self, texts, checkpoint_root='embeddings/checkpoints',
+                                         chunk_size=None, batch_size=32):
+        """
+        Generate embeddings chunk by chunk, saving each finished chunk as
+        chunk_<n>.npy with a progress.json manifest. Chunks already on disk
+        from an interrupted build of the same corpus are reused.
+        Returns (embeddings, checkpoint directory).
+        """
+        chunk_size = int(chunk_size or os.getenv("EMBED_CHUNK_SIZE", "10000"))
+        checkpoint_dir = os.path.join(checkpoint_root, self.build_fingerprint(texts, chunk_size))
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        progress_file = os.path.join(checkpoint_dir, "progress.json")
+        num_chunks = (len(texts) + chunk_size - 1) // chunk_size
+
+        progress = {'model_name': self.model_name, 'num_texts': len(texts), 'chunk_size': chunk_size,
+                    'num_chunks': num_chunks, 'completed': []}
+        if os.path.exists(progress_file):
+            with open(progress_file, encoding="utf-8") as f:
+                saved = json.load(f)
+            progress['completed'] = [c for c in saved.get('completed', [])
+                                     if os.path.exists(os.path.join(checkpoint_dir, f"chunk_{c:05d}.npy"))]
+            if progress['completed']:
+                print(f"♻️ Resuming embedding build: {len(progress['completed'])}/{num_chunks} chunks done")
+
+        start_time = time.time()
+        for chunk in range(num_chunks):
+            if chunk in progress['completed']:
+                continue
+            chunk_texts = texts[chunk * chunk_size:(chunk + 1) * chunk_size]
+            print(f"🔄 Chunk {chunk + 1}/{num_chunks} ({len(chunk_texts)} texts)")
+            embeddings = self.model.encode(chunk_texts, batch_size=batch_size,
+                                           show_progress_bar=True, convert_to_numpy=True)
+            # Write-then-rename: a killed build never leaves a partial chunk
+            chunk_file = os.path.join(checkpoint_dir, f"chunk_{chunk:05d}.npy")
+            with open(chunk_file + ".tmp", 'wb') as f:
+                np.save(f, np.asarray(embeddings, dtype=np.float32))
+            os.replace(chunk_file + ".tmp", chunk_file)
+
+            progress['completed'].append(chunk)
+            with open(progress_file + ".tmp", 'w', encoding="utf-8") as f:
+                json.dump(progress, f, indent=2)
+            os.replace(progress_file + ".tmp", progress_file)
+
+        # Assemble the chunks in order
+        embeddings = None
+        for chunk in range(num_chunks):
+            part = np.load(os.path.join(checkpoint_dir, f"chunk_{chunk:05d}.npy"), mmap_mode='r')
+            if embeddings is None:
+                embeddings = np.empty((len(texts), part.shape[1]), dtype=np.float32)
+            embeddings[chunk * chunk_size:chunk * chunk_size + len(part)] = part
+
+        print(f"✅ Generated {len(embeddings)} embeddings from {num_chunks} chunks")
+        print(f"   Embedding dimension: {embeddings.shape[1]}")
+        print(f"   Time taken: {time.time() - start_time:.2f} seconds")
+        return embeddings, checkpoint_dir
     
     def save_embeddings(self, embeddings, qa_data, output_file):
         """
@@ -92,7 +180,8 @@ class EmbeddingGenerator:
                     'answer': item['answer'],
                     'crop': item.get('crop', 'unknown'),
                     'category': item.get('category', 'unknown'),
-                    'language': item.get('language', 'hi')
+                    'language': item.get('language', 'hi'),
+                    'duplicate_count': item.get('duplicate_count', 1)
                 }
             })
         
@@ -105,17 +194,12 @@ class EmbeddingGenerator:
     
     def create_faiss_index(self, embeddings, metadata, output_file):
         """
-        Create FAISS index from embeddings
+        Create FAISS index from embeddings.
+        Without FAISS (or with VECTOR_BACKEND=numpy) a NumpyFlatIndex is built
+        instead, its vectors memory-mapped from a .npy file next to output_file
+        (VECTOR_DTYPE=float16 halves its size).
         """
-        try:
-            import faiss
-        except ImportError:
-            print("❌ FAISS not installed. Installing...")
-            import subprocess
-            subprocess.check_call(['pip', 'install', 'faiss-cpu'])
-            import faiss
-        
-        print(f"🔄 Creating FAISS index...")
+        print(f"🔄 Creating index...")
         
         # Convert embeddings to float32 (required by FAISS)
         embeddings = np.array(embeddings).astype('float32')
@@ -123,11 +207,10 @@ class EmbeddingGenerator:
         # Get dimension
         dimension = embeddings.shape[1]
         
-        # Create index
-        index = faiss.IndexFlatL2(dimension)  # L2 distance index
-        index.add(embeddings)
+        # Create index (L2 distance)
+        index, backend = build_flat_index(embeddings, os.path.splitext(output_file)[0] + ".vectors.npy")
         
-        print(f"✅ FAISS index created with {index.ntotal} vectors")
+        print(f"✅ Index created with {index.ntotal} vectors")
         print(f"   Index dimension: {dimension}")
         
         # Save index and metadata
@@ -135,16 +218,33 @@ class EmbeddingGenerator:
             'index': index,
             'metadata': metadata,
             'dimension': dimension,
-            'num_vectors': index.ntotal
+            'num_vectors': index.ntotal,
+            'backend': backend
         }
         
         with open(output_file, 'wb') as f:
             pickle.dump(index_data, f)
         
-        print(f"✅ FAISS index saved to {output_file}")
+        print(f"✅ Index saved to {output_file}")
         
         return index, metadata
 
+    def create_bm25_index(self, texts, output_file):
+        """
+        Create the BM25 lexical index used alongside FAISS for hybrid search
+        """
+        print(f"🔄 Creating BM25 index...")
+        start_time = time.time()
+        
+        bm25 = BM25Index().build(texts)
+        bm25.save(output_file)
+        
+        print(f"✅ BM25 index created with {len(bm25.vocab)} terms over {bm25.num_docs} documents")
+        print(f"   Time taken: {time.time() - start_time:.2f} seconds")
+        print(f"✅ BM25 index saved to {output_file}")
+        
+        return bm25
+
 def main():
     """
     Main function to run the embedding generation process
@@ -155,6 +255,7 @@ def main():
     
     # Create output directories if they don't exist
     os.makedirs('embeddings', exist_ok=True)
+    use_generations = os.getenv("INDEX_GENERATIONS", "true").lower() in ("1", "true", "yes")
     
     # Initialize generator
     generator = EmbeddingGenerator()
@@ -167,26 +268,70 @@ def main():
     # Prepare texts
     texts = generator.prepare_texts(qa_data)
     
-    # Generate embeddings
-    embeddings = generator.generate_embeddings(texts)
+    # Generate embeddings (resumes from checkpointed chunks)
+    embeddings, checkpoint_dir = generator.generate_embeddings_checkpointed(texts)
+    
+    # Collapse near-duplicate records so every search candidate is distinct
+    total_records = len(qa_data)
+    deduplicated = os.getenv("DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+    if deduplicated:
+        print("🔄 Collapsing near-duplicate records...")
+        keep, counts = collapse_near_duplicates(qa_data, embeddings)
+        qa_data = [dict(qa_data[i], duplicate_count=count) for i, count in zip(keep, counts)]
+        texts = [texts[i] for i in keep]
+        embeddings = embeddings[keep]
+        print(f"✅ Kept {len(qa_data)} of {total_records} records ({total_records - len(qa_data)} near-duplicates collapsed)")
+    
+    # The generation directory is only created once the long embedding run
+    # is done (a rerun resumes from the checkpoints, not from a directory)
+    if use_generations:
+        generation, output_dir = new_generation('embeddings')
+        print(f"📦 Building index generation {generation}")
+    else:
+        output_dir = 'embeddings'
     
     # Save embeddings with metadata
-    embeddings_file = 'embeddings/kcc_embeddings.pkl'
+    embeddings_file = os.path.join(output_dir, 'kcc_embeddings.pkl')
     embedded_records = generator.save_embeddings(embeddings, qa_data, embeddings_file)
     
     # Create FAISS index
     metadata = [rec['metadata'] for rec in embedded_records]
-    index_file = 'embeddings/faiss_index.pkl'
+    index_file = os.path.join(output_dir, 'faiss_index.pkl')
     index, metadata = generator.create_faiss_index(embeddings, metadata, index_file)
     
+    # Create BM25 index over the same texts (same row order as FAISS)
+    bm25_file = os.path.join(output_dir, 'bm25_index.pkl')
+    generator.create_bm25_index(texts, bm25_file)
+    
+    # Optionally partition into shards for scatter-gather serving
+    n_shards = int(os.getenv("INDEX_SHARDS", "0"))
+    if n_shards > 1:
+        build_shards(embeddings, metadata, n_shards, os.path.join(output_dir, 'shards'), os.getenv("SHARD_BY", "hash"))
+    
+    if use_generations:
+        write_manifest(output_dir, generator.model_name, embeddings.shape[1], len(qa_data),
+                       deduplicated=deduplicated)
+        ok, report = validate_generation(output_dir, generator.model)
+        if not ok:
+            # Checkpoints are kept, so a rerun rebuilds without re-embedding
+            print(f"❌ Generation {generation} failed validation, not promoted: {'; '.join(report['errors'])}")
+            return
+        print(f"✅ Generation {generation} validated (recall {report.get('recall', 0):.3f})")
+        promote('embeddings', generation)
+        collect_garbage('embeddings')
+    
+    # The index is built and live; the chunks are no longer needed
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    
     print("\n" + "=" * 60)
     print("✅ EMBEDDING GENERATION COMPLETE!")
     print("=" * 60)
     print(f"📊 Statistics:")
-    print(f"   - Total Q&A pairs: {len(qa_data)}")
+    print(f"   - Total Q&A pairs: {total_records} ({len(qa_data)} indexed)")
     print(f"   - Embedding dimension: {embeddings.shape[1]}")
-    print(f"   - Embeddings file: embeddings/kcc_embeddings.pkl")
-    print(f"   - FAISS index file: embeddings/faiss_index.pkl")
+    print(f"   - Embeddings file: {embeddings_file}")
+    print(f"   - FAISS index file: {index_file}")
+    print(f"   - BM25 index file: {bm25_file}")
     print("=" * 60)
     
     # Print sample of what was embedded
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Fake LLM Server for KrishiSahay
+Local stand-in for the Watsonx IAM and chat endpoints that can be switched
+into every failure mode the resilient client layer has to survive.
+
+Run directly to exercise ResilientCaller and WatsonxLLM offline:
+    python utils/fake_llm_server.py
+"""
+
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import Request, urlopen
+
+# ok | slow | hang | error500 | error429 | error400 | flaky | slow_first
+MODES = ("ok", "slow", "hang", "error500", "error429", "error400", "flaky", "slow_first")
+
+
+class FakeLLMServer:
+    def __init__(self, host="127.0.0.1", port=0, slow_seconds=1.5, hang_seconds=30):
+        self.mode = "ok"
+        self.slow_seconds = slow_seconds
+        self.hang_seconds = hang_seconds
+        self.requests_seen = 0
+        self.token_requests = 0
+        self.token_ttl = 3600
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def chat_url(self):
+        return f"{self.base_url}/ml/v1/text/chat?version=2023-05-29"
+
+    @property
+    def iam_url(self):
+        return f"{self.base_url}/identity/token"
+
+    def set_mode(self, mode):
+        assert mode in MODES, mode
+        with self._lock:
+            self.mode = mode
+            self.requests_seen = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length) if length else b""
+
+                if self.path.startswith("/identity/token"):
+                    with server._lock:
+                        server.token_requests += 1
+                        n = server.token_requests
+                    return self._send(200, {"access_token": f"fake-token-{n}",
+                                            "expires_in": server.token_ttl,
+                                            "expiration": int(time.time()) + server.token_ttl})
+
+                with server._lock:
+                    server.requests_seen += 1
+                    seen = server.requests_seen
+                    mode = server.mode
+
+                if mode == "slow" or (mode == "slow_first" and seen == 1):
+                    time.sleep(server.slow_seconds)
+                elif mode == "hang":
+                    time.sleep(server.hang_seconds)
+                elif mode == "error500" or (mode == "flaky" and seen % 2 == 1):
+                    return self._send(500, {"error": "internal error"})
+                elif mode == "error429":
+                    return self._send(429, {"error": "rate limited"})
+                elif mode == "error400":
+                    return self._send(400, {"error": "bad request"})
+
+                try:
+                    messages = json.loads(body or b"{}").get("messages", [])
+                except ValueError:
+                    messages = []
+                question = messages[-1]["content"] if messages else ""
+                self._send(200, {"choices": [{"message": {
+                    "role": "assistant",
+                    "content": f"[fake] answer to: {question[:80]}"
+                }}]})
+
+        return Handler
+
+
+def _post_json(url, payload, timeout):
+    request = Request(url, data=json.dumps(payload).encode("utf-8"),
+                      headers={"Content-Type": "application/json"})
+    with urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+# Exercise every failure mode
+if __name__ == "__main__":
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from llm_client import ResilientCaller, CircuitBreaker, LLMUnavailableError
+
+    print("=" * 60)
+    print("🧪 FAKE LLM SERVER - FAILURE MODE CHECKS")
+    print("=" * 60)
+
+    server = FakeLLMServer(slow_seconds=0.6, hang_seconds=5).start()
+    payload = {"messages": [{"role": "user", "content": "मूंग कब बोएं?"}]}
+
+    def make_caller(**overrides):
+        settings = dict(timeout=0.4, deadline=2.0, max_retries=2, backoff_base=0.05,
+                        backoff_max=0.1, hedge=False,
+                        breaker=CircuitBreaker(failure_threshold=3, reset_timeout=0.5))
+        settings.update(overrides)
+        return ResilientCaller("fake", **settings)
+
+    def expect_failure(caller):
+        try:
+            caller.call(_post_json, server.chat_url, payload, 5)
+        except LLMUnavailableError:
+            return True
+        return False
+
+    checks = []
+
+    server.set_mode("ok")
+    caller = make_caller()
+    checks.append(("ok", "[fake]" in caller.call(_post_json, server.chat_url, payload, 5)["choices"][0]["message"]["content"]))
+
+    server.set_mode("flaky")
+    caller = make_caller()
+    caller.call(_post_json, server.chat_url, payload, 5)
+    checks.append(("flaky -> retried", caller.stats["retries"] == 1))
+
+    server.set_mode("error429")
+    caller = make_caller()
+    checks.append(("429 -> retries exhausted", expect_failure(caller) and caller.stats["retries"] == 2))
+
+    server.set_mode("error400")
+    caller = make_caller()
+    checks.append(("400 -> not retried", expect_failure(caller) and caller.stats["retries"] == 0))
+
+    server.set_mode("hang")
+    caller = make_caller()
+    start = time.monotonic()
+    failed = expect_failure(caller)
+    checks.append(("hang -> deadline bounded", failed and time.monotonic() - start < 2.5))
+
+    server.set_mode("slow_first")
+    caller = make_caller(timeout=1.0, hedge=True, hedge_after=0.1)
+    start = time.monotonic()
+    caller.call(_post_json, server.chat_url, payload, 5)
+    checks.append(("slow first -> hedge wins", caller.stats["hedges"] == 1 and time.monotonic() - start < 0.5))
+
+    server.set_mode("error500")
+    caller = make_caller(max_retries=0)
+    for _ in range(3):
+        expect_failure(caller)
+    seen = server.requests_seen
+    checks.append(("breaker opens", expect_failure(caller) and server.requests_seen == seen
+                   and caller.stats["short_circuited"] == 1))
+
+    server.set_mode("ok")
+    time.sleep(0.6)
+    caller.call(_post_json, server.chat_url, payload, 5)
+    checks.append(("breaker recovers", caller.breaker.state == CircuitBreaker.CLOSED))
+
+    # End to end: WatsonxLLM falls back instead of hanging
+    os.environ.setdefault("WATSONX_API_KEY", "fake-key")
+    os.environ.setdefault("WATSONX_PROJECT_ID", "fake-project")
+    os.environ["WATSONX_URL"] = server.chat_url
+    os.environ["WATSONX_IAM_URL"] = server.iam_url
+    os.environ.update({"LLM_TIMEOUT": "0.4", "LLM_DEADLINE": "1.5", "LLM_BACKOFF_BASE": "0.05"})
+    try:
+        from watsonx_llm import WatsonxLLM
+        llm = WatsonxLLM()
+        checks.append(("watsonx ok", llm.generate_response("मूंग कब बोएं?").startswith("[fake]")))
+        for _ in range(3):
+            llm.generate_response("मूंग कब बोएं?")
+        checks.append(("watsonx token cached", server.token_requests == 1 and llm.token_expiry is not None))
+        server.set_mode("hang")
+        start = time.monotonic()
+        answer = llm.generate_response("मूंग कब बोएं?")
+        checks.append(("watsonx hang -> fallback", "[fake]" not in answer and time.monotonic() - start < 2.0))
+    except ImportError as e:
+        print(f"⚠️ Skipping WatsonxLLM checks: {e}")
+
+    server.stop()
+
+    print()
+    for name, passed in checks:
+        print(f"{'✅' if passed else '❌'} {name}")
+    print("=" * 60)
+    sys.exit(0 if all(passed for _, passed in checks) else 1)
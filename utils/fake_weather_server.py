@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Fake Weather Server for KrishiSahay
+Local stand-in for the OpenWeatherMap /weather and /forecast endpoints so
+the prefetch job and WeatherAgent can be exercised offline.
+
+Run directly to check the prefetch job end to end:
+    python utils/fake_weather_server.py
+"""
+
+import json
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class FakeWeatherServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, fail_locations=()):
+        self.latency = latency
+        self.fail_locations = set(fail_locations)
+        self.requests_seen = 0
+        self.requests_by_location = {}
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/data/2.5"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @staticmethod
+    def reading(location, step=0):
+        """Deterministic weather for a location and forecast step"""
+        h = zlib.crc32(f"{location}:{step}".encode("utf-8"))
+        temp = 5 + h % 38
+        humidity = 20 + (h >> 8) % 80
+        rain = (h >> 16) % 4 if humidity > 70 else 0
+        return {
+            "main": {"temp": temp, "humidity": humidity},
+            "weather": [{"description": "light rain" if rain else "clear sky"}],
+            "wind": {"speed": (h >> 20) % 15},
+            "rain": {"1h": rain, "3h": rain} if rain else {}
+        }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = parse_qs(url.query)
+                location = params.get("q", [""])[0].split(",")[0]
+                with server._lock:
+                    server.requests_seen += 1
+                    server.requests_by_location[location] = server.requests_by_location.get(location, 0) + 1
+                if server.latency:
+                    time.sleep(server.latency)
+                if location in server.fail_locations:
+                    return self._send(500, {"cod": 500, "message": "internal error"})
+
+                if url.path.endswith("/weather"):
+                    return self._send(200, dict(server.reading(location), name=location))
+                if url.path.endswith("/forecast"):
+                    count = int(params.get("cnt", ["8"])[0])
+                    now = datetime.now()
+                    items = []
+                    for step in range(1, count + 1):
+                        item = server.reading(location, step)
+                        item["dt_txt"] = (now + timedelta(hours=3 * step)).strftime("%Y-%m-%d %H:%M:%S")
+                        items.append(item)
+                    return self._send(200, {"cnt": count, "list": items})
+                self._send(404, {"cod": 404, "message": "not found"})
+
+        return Handler
+
+
+# Run the prefetch job against the fake server
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    print("=" * 60)
+    print("🧪 FAKE WEATHER SERVER - PREFETCH JOB CHECK")
+    print("=" * 60)
+
+    server = FakeWeatherServer(latency=0.02, fail_locations={"Puri"}).start()
+    tmp = tempfile.mkdtemp()
+    os.environ.update({
+        "WEATHER_API_KEY": "fake-key",
+        "WEATHER_API_URL": server.base_url,
+        "WEATHER_CACHE_PATH": os.path.join(tmp, "weather.sqlite"),
+        "ALERT_STORE_PATH": os.path.join(tmp, "alerts.sqlite"),
+    })
+
+    from locations import CROPS, all_districts
+    from weather_prefetch import WeatherPrefetchJob
+
+    districts = sorted({d for _, d in all_districts()})
+    job = WeatherPrefetchJob(max_workers=8, rate_per_sec=200)
+    stats = job.run()
+    first_run_requests = server.requests_seen
+    second_stats = job.run()
+
+    checks = [
+        ("every district fetched once (current + forecast)",
+         all(server.requests_by_location.get(d, 0) == 2 for d in districts if d != "Puri")),
+        ("cached districts not refetched on second run",
+         server.requests_seen - first_run_requests == server.requests_by_location["Puri"] // 2),
+        ("alerts stored for every other district × crop",
+         all(job.store.get(d, c) is not None for d in districts for c in CROPS if d != "Puri")),
+        ("failing district counted as failed, mock data not stored",
+         stats['failed'] == second_stats['failed'] == 1 and job.store.get("Puri", "Wheat") is None),
+    ]
+    server.stop()
+
+    print()
+    for name, passed in checks:
+        print(f"{'✅' if passed else '❌'} {name}")
+    print("=" * 60)
+    sys.exit(0 if all(passed for _, passed in checks) else 1)
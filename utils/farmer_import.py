@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Bulk Farmer Import for KrishiSahay
+Loads farmer registrations from state agriculture department spreadsheets
+(CSV, or Excel via pandas), validates mobile numbers and state/district
+names against STATE_DISTRICTS, and upserts them in batches with one
+transaction per batch.
+
+Usage:
+    python utils/farmer_import.py farmers.csv [--batch-size 5000] [--rejects rejects.csv] [--dry-run]
+
+Expected columns (case-insensitive): name, mobile, email, state, district, crop
+"""
+
+import argparse
+import csv
+import os
+import re
+import time
+
+from db import bulk_upsert_farmers, init_db, FARMER_COLUMNS
+from locations import STATE_DISTRICTS
+
+MOBILE_PATTERN = re.compile(r"^[6-9]\d{9}$")
+
+# Case-insensitive lookup to the canonical spelling used in the app
+_STATES = {state.lower(): state for state in STATE_DISTRICTS}
+_DISTRICTS = {state: {d.lower(): d for d in districts} for state, districts in STATE_DISTRICTS.items()}
+
+
+def normalize_mobile(value):
+    """Strip spaces, dashes, +91 and a leading 0; None if not a valid Indian mobile"""
+    digits = re.sub(r"\D", "", str(value or ""))
+    if len(digits) == 12 and digits.startswith("91"):
+        digits = digits[2:]
+    elif len(digits) == 11 and digits.startswith("0"):
+        digits = digits[1:]
+    return digits if MOBILE_PATTERN.match(digits) else None
+
+
+def validate_row(row):
+    """
+    Return ((name, mobile, email, state, district, crop), None) or (None, reason)
+    """
+    name = (row.get("name") or "").strip()
+    if not name:
+        return None, "missing name"
+    mobile = normalize_mobile(row.get("mobile"))
+    if mobile is None:
+        return None, f"invalid mobile '{row.get('mobile')}'"
+    state = _STATES.get((row.get("state") or "").strip().lower())
+    if state is None:
+        return None, f"unknown state '{row.get('state')}'"
+    district = _DISTRICTS[state].get((row.get("district") or "").strip().lower())
+    if district is None:
+        return None, f"unknown district '{row.get('district')}' for {state}"
+    crop = (row.get("crop") or "").strip()
+    if not crop:
+        return None, "missing crop"
+    email = (row.get("email") or "").strip() or None
+    return (name[:100], mobile, email, state, district, crop[:50]), None
+
+
+def read_rows(path):
+    """Yield dict rows with lower-cased headers from a CSV or Excel file"""
+    if path.lower().endswith((".xlsx", ".xls")):
+        import pandas as pd
+        frame = pd.read_excel(path, dtype=str).fillna("")
+        frame.columns = [str(c).strip().lower() for c in frame.columns]
+        yield from frame.to_dict("records")
+        return
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            yield {(k or "").strip().lower(): v for k, v in row.items()}
+
+
+def import_farmers(path, batch_size=5000, rejects_path=None, dry_run=False):
+    """
+    Validate and upsert every row of path; returns import statistics
+    """
+    start_time = time.time()
+    valid, rejects = [], []
+    for line_no, row in enumerate(read_rows(path), start=2):
+        record, reason = validate_row(row)
+        if record is None:
+            rejects.append((line_no, reason, row))
+        else:
+            valid.append(record)
+    validate_seconds = time.time() - start_time
+
+    written = 0
+    if not dry_run and valid:
+        init_db()
+        written = bulk_upsert_farmers(valid, batch_size=batch_size)
+
+    if rejects_path and rejects:
+        with open(rejects_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["line", "reason"] + list(FARMER_COLUMNS))
+            for line_no, reason, row in rejects:
+                writer.writerow([line_no, reason] + [row.get(c, "") for c in FARMER_COLUMNS])
+
+    seconds = time.time() - start_time
+    return {
+        'rows': len(valid) + len(rejects),
+        'valid': len(valid),
+        'rejected': len(rejects),
+        'written': written,
+        'seconds': seconds,
+        'validate_seconds': validate_seconds,
+        'rows_per_sec': (len(valid) + len(rejects)) / seconds if seconds else 0.0,
+        'reject_samples': rejects[:5]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import farmers from a CSV/Excel sheet")
+    parser.add_argument("path", help="CSV or Excel file")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("IMPORT_BATCH_SIZE", "5000")))
+    parser.add_argument("--rejects", help="write rejected rows with reasons to this CSV")
+    parser.add_argument("--dry-run", action="store_true", help="validate only, do not write")
+    args = parser.parse_args()
+
+    print(f"🔄 Importing farmers from {args.path} (batch size {args.batch_size})...")
+    stats = import_farmers(args.path, args.batch_size, args.rejects, args.dry_run)
+
+    print(f"✅ {stats['written']} farmers upserted, {stats['rejected']} rejected "
+          f"of {stats['rows']} rows in {stats['seconds']:.2f}s ({stats['rows_per_sec']:.0f} rows/s)")
+    for line_no, reason, _ in stats['reject_samples']:
+        print(f"   ❌ line {line_no}: {reason}")
+
+
+if __name__ == "__main__":
+    main()
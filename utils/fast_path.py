@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Direct KCC Answer Fast Path for KrishiSahay
+When the best retrieved Q&A pair is essentially the farmer's question
+(similarity above a calibrated threshold and clearly ahead of the
+runner-up), its stored Kisan Call Centre answer is returned directly and
+the LLM is skipped.
+
+Configuration:
+    FAST_PATH_ENABLED         turn the fast path on/off (default on)
+    FAST_PATH_MIN_SCORE       minimum score of the best hit (default 0.85,
+                              i.e. cosine ~0.91 for normalised embeddings)
+    FAST_PATH_MIN_MARGIN      minimum lead over the runner-up (default 0.05)
+    FAST_PATH_SCORE_FIELD     result field to compare: similarity_score or
+                              rerank_score (when the cross-encoder is on)
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+
+class FastPathPolicy:
+    def __init__(self, min_score=None, min_margin=None, score_field=None, translate=None, enabled=None):
+        """
+        translate: optional callable(text, dest_lang) used when the stored
+        answer is in another language; without it such matches go to the LLM
+        """
+        if enabled is None:
+            enabled = os.getenv("FAST_PATH_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.enabled = enabled
+        self.min_score = float(min_score if min_score is not None else os.getenv("FAST_PATH_MIN_SCORE", "0.85"))
+        self.min_margin = float(min_margin if min_margin is not None else os.getenv("FAST_PATH_MIN_MARGIN", "0.05"))
+        self.score_field = score_field or os.getenv("FAST_PATH_SCORE_FIELD", "similarity_score")
+        self.translate = translate
+
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.fired = 0
+        # Recent (best, margin, fired) samples and fast-path latencies, for tuning
+        self.samples = deque(maxlen=1000)
+        self.latencies_ms = deque(maxlen=1000)
+
+    def match(self, results):
+        """
+        Return the best result if it clears the threshold and margin, else None
+        """
+        if not self.enabled or not results:
+            return None
+        scores = sorted((r.get(self.score_field, 0.0) for r in results), reverse=True)
+        best = scores[0]
+        margin = best - scores[1] if len(scores) > 1 else best
+        fire = best >= self.min_score and margin >= self.min_margin
+        with self._lock:
+            self.checked += 1
+            self.samples.append((best, margin, fire))
+        if not fire:
+            return None
+        return max(results, key=lambda r: r.get(self.score_field, 0.0))
+
+    def answer(self, query, results, target_lang='en'):
+        """
+        The stored KCC answer (translated if needed) or None to use the LLM
+        """
+        start_time = time.perf_counter()
+        best = self.match(results)
+        if best is None:
+            return None
+
+        answer = best['metadata']['answer'].strip()
+        source_lang = best['metadata'].get('language', 'hi')
+        if target_lang != source_lang:
+            if self.translate is None:
+                return None
+            answer = self.translate(answer, target_lang)
+
+        latency_ms = 1000 * (time.perf_counter() - start_time)
+        with self._lock:
+            self.fired += 1
+            self.latencies_ms.append(latency_ms)
+        print(f"⚡ KCC fast path: {self.score_field}={best.get(self.score_field, 0.0):.3f} "
+              f"({latency_ms:.1f} ms) for '{query[:50]}'")
+        return answer
+
+    def get_stats(self):
+        with self._lock:
+            latencies = sorted(self.latencies_ms)
+            samples = list(self.samples)
+        return {
+            'enabled': self.enabled,
+            'min_score': self.min_score,
+            'min_margin': self.min_margin,
+            'checked': self.checked,
+            'fired': self.fired,
+            'fire_rate': self.fired / self.checked if self.checked else 0.0,
+            'p50_ms': latencies[len(latencies) // 2] if latencies else None,
+            'recent_best_scores': [round(best, 3) for best, _, _ in samples[-20:]]
+        }
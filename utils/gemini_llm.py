@@ -1,42 +1,42 @@
 from google import genai
+from google.genai import types
 import os
+import time
 from dotenv import load_dotenv
 
+from context_builder import estimate_tokens
+from llm_client import ResilientCaller
+from llm_provider import LLMProvider, lang_instruction
+
 load_dotenv()
 
-class GeminiLLM:
-    def __init__(self):
+class GeminiLLM(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, offline_engine=None):
+        super().__init__(offline_engine)
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             print("⚠️ No Gemini API key. Using mock responses.")
             self.use_mock = True
             return
 
-        self.client = genai.Client(api_key=api_key)
+        self.caller = ResilientCaller("Gemini")
+        # HTTP timeout matches the per-attempt deadline so abandoned calls free their thread
+        self.client = genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(timeout=int(self.caller.timeout * 1000))
+        )
         self.use_mock = False
         self.model = "models/gemini-2.0-flash"
         print(f"✅ Gemini model '{self.model}' ready.")
 
-    def generate_response(self, query, context=None, target_lang='en'):
-        """Generate a response in the target language."""
+    def generate_response_with_usage(self, query, context=None, target_lang='en'):
+        """Generate a response in the target language; returns (text, usage)."""
         if self.use_mock:
-            return self._mock_response(query, context)
+            return self._mock_response(query, context), {}
 
-        # Language instruction for the model
-        lang_instruction = {
-            'en': "Respond in English only.",
-            'hi': "केवल हिंदी में उत्तर दें।",
-            'te': "తెలుగులో మాత్రమే సమాధానం ఇవ్వండి.",
-            'ta': "தமிழில் மட்டும் பதில் அளிக்கவும்.",
-            'kn': "ಕನ್ನಡದಲ್ಲಿ ಮಾತ್ರ ಉತ್ತರಿಸಿ.",
-            'ml': "മലയാളത്തിൽ മാത്രം ഉത്തരം നൽകുക.",
-            'bn': "শুধুমাত্র বাংলায় উত্তর দিন।",
-            'mr': "फक्त मराठीत उत्तर द्या.",
-            'gu': "માત્ર ગુજરાતીમાં જવાબ આપો.",
-            'pa': "ਕੇਵਲ ਪੰਜਾਬੀ ਵਿੱਚ ਉੱਤਰ ਦਿਓ।",
-            'or': "କେବଳ ଓଡ଼ିଆରେ ଉତ୍ତର ଦିଅନ୍ତୁ।",
-            'as': "কেৱল অসমীয়াত উত্তৰ দিয়ক।"
-        }.get(target_lang, "Respond in English only.")
+        instruction = lang_instruction(target_lang)
 
         if context and context.strip():
             prompt = f"""You are KrishiSahay, an expert agricultural assistant for Indian farmers.
@@ -46,7 +46,7 @@ Below is relevant information from the Kisan Call Centre database. Use it if hel
 
 Farmer's Question: {query}
 
-{lang_instruction}
+{instruction}
 Be practical, specific, and helpful. If unsure, give your best guess based on common farming practices.
 """
         else:
@@ -54,29 +54,31 @@ Be practical, specific, and helpful. If unsure, give your best guess based on co
 
 Farmer's Question: {query}
 
-{lang_instruction}
+{instruction}
 Be practical, specific, and helpful. If unsure, give your best guess based on common farming practices.
 """
 
+        usage = {'prompt_tokens_estimate': estimate_tokens(prompt)}
         try:
-            response = self.client.models.generate_content(
+            start_time = time.perf_counter()
+            response = self.caller.call(
+                self.client.models.generate_content,
                 model=self.model,
                 contents=prompt
             )
-            return response.text
+            usage['latency_ms'] = (time.perf_counter() - start_time) * 1000
+            metadata = getattr(response, 'usage_metadata', None)
+            if metadata is not None:
+                usage['prompt_tokens'] = metadata.prompt_token_count
+                usage['output_tokens'] = metadata.candidates_token_count
+            print(f"📏 Prompt tokens: {usage.get('prompt_tokens', usage['prompt_tokens_estimate'])} "
+                  f"| LLM latency: {usage['latency_ms']:.0f} ms")
+            return response.text, usage
         except Exception as e:
             print(f"Gemini API error: {e}")
-            return self._mock_response(query, context)
-
-    def generate_with_retrieval(self, query, results, target_lang='en'):
-        """Use retrieved results as context and respond in target language."""
-        if not results:
-            return self.generate_response(query, target_lang=target_lang)
-        context = "Relevant Q&A pairs from Kisan Call Centre:\n\n"
-        for i, r in enumerate(results, 1):
-            meta = r['metadata']
-            context += f"{i}. प्रश्न: {meta['question']}\n   उत्तर: {meta['answer']}\n   (फसल: {meta['crop']})\n\n"
-        return self.generate_response(query, context, target_lang)
+            if self.raise_errors:
+                raise
+            return self._offline_response(query, context), usage
 
     def _mock_response(self, query, context=None):
         # (same as before)
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Index Generations for KrishiSahay
+Blue/green index builds. Each build goes into its own directory,
+embeddings/generations/<id>/, with a manifest.json (model, dimension,
+record count, file checksums). A generation is validated (checksums, smoke
+queries, recall of stored vectors) before promotion, and promotion is an
+atomic replace of the embeddings/CURRENT pointer file. Running RAGEngines
+notice the new pointer and swap the generation in (see RAGEngine.reload).
+Generations retired longer than the grace period (INDEX_GC_GRACE seconds)
+are deleted. A generation still being written carries a BUILDING marker
+until its manifest exists; gc leaves it alone unless the marker is older
+than INDEX_BUILD_TIMEOUT seconds (a crashed build).
+
+Usage:
+    python utils/index_generations.py list
+    python utils/index_generations.py validate 20261019-101500
+    python utils/index_generations.py promote 20261019-101500
+    python utils/index_generations.py rollback
+    python utils/index_generations.py gc --grace 3600
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+
+GENERATIONS_DIR = "generations"
+POINTER_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+BUILDING_MARKER = "BUILDING"
+
+# Queries every generation must answer before promotion
+SMOKE_QUERIES = [
+    "सरसों में कीट कैसे नियंत्रित करें?",
+    "गेहूं में खाद",
+    "PM Kisan scheme",
+]
+
+
+def generations_path(root):
+    return os.path.join(root, GENERATIONS_DIR)
+
+
+def generation_path(root, generation):
+    return os.path.join(root, GENERATIONS_DIR, generation)
+
+
+def new_generation(root):
+    """
+    Create an empty generation directory marked as building; returns
+    (generation id, path)
+    """
+    base = time.strftime("%Y%m%d-%H%M%S")
+    generation, suffix = base, 1
+    while os.path.exists(generation_path(root, generation)):
+        suffix += 1
+        generation = f"{base}-{suffix}"
+    path = generation_path(root, generation)
+    os.makedirs(path)
+    with open(os.path.join(path, BUILDING_MARKER), 'w') as f:
+        f.write(f"{os.getpid()} {time.time()}\n")
+    return generation, path
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_checksums(gen_dir):
+    """
+    SHA-256 of every file in a generation (shards included), except the manifest
+    """
+    checksums = {}
+    for dirpath, _, filenames in os.walk(gen_dir):
+        for name in filenames:
+            full = os.path.join(dirpath, name)
+            rel = os.path.relpath(full, gen_dir)
+            if rel != MANIFEST_FILE:
+                checksums[rel] = _sha256(full)
+    return dict(sorted(checksums.items()))
+
+
+def write_manifest(gen_dir, model_name, dimension, num_records, **extra):
+    """
+    Record a finished build; this also clears its BUILDING marker
+    """
+    marker = os.path.join(gen_dir, BUILDING_MARKER)
+    if os.path.exists(marker):
+        os.remove(marker)
+    manifest = {
+        'generation': os.path.basename(os.path.normpath(gen_dir)),
+        'model_name': model_name,
+        'dimension': int(dimension),
+        'num_records': int(num_records),
+        'checksums': file_checksums(gen_dir),
+        'created_at': time.time(),
+    }
+    manifest.update(extra)
+    _write_json(os.path.join(gen_dir, MANIFEST_FILE), manifest)
+    return manifest
+
+
+def read_manifest(gen_dir):
+    with open(os.path.join(gen_dir, MANIFEST_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json(path, data):
+    # Write-then-rename so readers never see a half-written file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def current_generation(root):
+    """
+    Id of the promoted generation, or None for a tree without generations
+    """
+    try:
+        with open(os.path.join(root, POINTER_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def resolve_index_path(index_path):
+    """
+    Where index_path really lives: inside the current generation when
+    its directory has a CURRENT pointer, else index_path itself.
+    Returns (path, generation id or None).
+    """
+    root = os.path.dirname(index_path)
+    generation = current_generation(root)
+    if generation is None:
+        return index_path, None
+    return os.path.join(generation_path(root, generation), os.path.basename(index_path)), generation
+
+
+def validate_generation(gen_dir, model=None, index_file="faiss_index.pkl", smoke_queries=None,
+                        recall_sample=None, min_recall=None, k=5):
+    """
+    Check a generation before promotion. Verifies checksums, that
+    vector, metadata and manifest counts agree, that stored embeddings
+    find themselves in the top k (recall), and, given the embedding
+    model, that smoke queries return results. Returns (ok, report).
+    """
+    recall_sample = int(recall_sample or os.getenv("INDEX_RECALL_SAMPLE", "200"))
+    min_recall = float(min_recall or os.getenv("INDEX_MIN_RECALL", "0.95"))
+    report = {'generation': os.path.basename(os.path.normpath(gen_dir)), 'errors': []}
+    errors = report['errors']
+
+    try:
+        manifest = read_manifest(gen_dir)
+    except (OSError, ValueError) as e:
+        errors.append(f"manifest unreadable: {e}")
+        return False, report
+
+    actual = file_checksums(gen_dir)
+    for name, checksum in manifest['checksums'].items():
+        if actual.get(name) != checksum:
+            errors.append(f"checksum mismatch: {name}")
+    if errors:
+        return False, report
+
+    with open(os.path.join(gen_dir, index_file), 'rb') as f:
+        index_data = pickle.load(f)
+    index, metadata = index_data['index'], index_data['metadata']
+    if not index.ntotal == len(metadata) == manifest['num_records']:
+        errors.append(f"record counts differ: index {index.ntotal}, metadata {len(metadata)}, "
+                      f"manifest {manifest['num_records']}")
+    if index.d != manifest['dimension']:
+        errors.append(f"index dimension {index.d} != manifest {manifest['dimension']}")
+
+    # Recall: a stored embedding must retrieve its own record
+    embeddings_file = os.path.join(gen_dir, "kcc_embeddings.pkl")
+    if os.path.exists(embeddings_file) and index.ntotal:
+        with open(embeddings_file, 'rb') as f:
+            records = pickle.load(f)
+        rng = np.random.default_rng(0)
+        sample = rng.choice(len(records), min(recall_sample, len(records)), replace=False)
+        vectors = np.array([records[i]['embedding'] for i in sample], dtype=np.float32)
+        _, found = index.search(vectors, k)
+        recall = float(np.mean([records[i]['id'] in row for i, row in zip(sample, found)]))
+        report['recall'] = recall
+        if recall < min_recall:
+            errors.append(f"recall@{k} {recall:.3f} below {min_recall}")
+
+    if model is not None:
+        for query in smoke_queries or SMOKE_QUERIES:
+            query_vec = np.asarray(model.encode(query), dtype=np.float32)
+            if query_vec.shape[-1] != index.d:
+                errors.append(f"model dimension {query_vec.shape[-1]} != index {index.d}")
+                break
+            _, found = index.search(query_vec.reshape(1, -1), k)
+            if not np.any((found[0] >= 0) & (found[0] < len(metadata))):
+                errors.append(f"no results for smoke query '{query}'")
+        report['smoke_queries'] = len(smoke_queries or SMOKE_QUERIES)
+
+    return not errors, report
+
+
+def promote(root, generation):
+    """
+    Atomically point CURRENT at generation; the previous one is marked retired
+    """
+    gen_dir = generation_path(root, generation)
+    manifest = read_manifest(gen_dir)
+    previous = current_generation(root)
+
+    tmp_path = os.path.join(root, f"{POINTER_FILE}.tmp")
+    with open(tmp_path, 'w', encoding="utf-8") as f:
+        f.write(generation + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(root, POINTER_FILE))
+
+    manifest['promoted_at'] = time.time()
+    manifest.pop('retired_at', None)
+    manifest['previous'] = previous
+    _write_json(os.path.join(gen_dir, MANIFEST_FILE), manifest)
+    if previous and previous != generation and os.path.isdir(generation_path(root, previous)):
+        old_manifest = read_manifest(generation_path(root, previous))
+        old_manifest['retired_at'] = time.time()
+        _write_json(os.path.join(generation_path(root, previous), MANIFEST_FILE), old_manifest)
+    print(f"✅ Promoted index generation {generation}" + (f" (was {previous})" if previous else ""))
+    return previous
+
+
+def list_generations(root):
+    """
+    Manifests of all generations, oldest first
+    """
+    path = generations_path(root)
+    if not os.path.isdir(path):
+        return []
+    manifests = []
+    for name in sorted(os.listdir(path)):
+        gen_dir = os.path.join(path, name)
+        if os.path.exists(os.path.join(gen_dir, BUILDING_MARKER)):
+            manifests.append({'generation': name, 'building': True})
+            continue
+        try:
+            manifests.append(read_manifest(gen_dir))
+        except (OSError, ValueError):
+            manifests.append({'generation': name, 'broken': True})
+    return manifests
+
+
+def collect_garbage(root, grace_seconds=None):
+    """
+    Delete generations that are not current and were retired (or, never
+    promoted, created) more than grace_seconds ago; returns the deleted ids.
+    Builds in progress are kept until their marker is INDEX_BUILD_TIMEOUT old.
+    """
+    grace_seconds = float(grace_seconds if grace_seconds is not None else os.getenv("INDEX_GC_GRACE", "3600"))
+    build_timeout = float(os.getenv("INDEX_BUILD_TIMEOUT", "86400"))
+    current = current_generation(root)
+    now = time.time()
+    deleted = []
+    for manifest in list_generations(root):
+        generation = manifest['generation']
+        if generation == current:
+            continue
+        gen_dir = generation_path(root, generation)
+        if manifest.get('building'):
+            if now - os.path.getmtime(os.path.join(gen_dir, BUILDING_MARKER)) > build_timeout:
+                shutil.rmtree(gen_dir, ignore_errors=True)
+                deleted.append(generation)
+            continue
+        since = manifest.get('retired_at') or manifest.get('created_at') or os.path.getmtime(gen_dir)
+        if now - since > grace_seconds:
+            shutil.rmtree(gen_dir, ignore_errors=True)
+            deleted.append(generation)
+    if deleted:
+        print(f"🧹 Removed {len(deleted)} old index generation(s): {', '.join(deleted)}")
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage blue/green index generations")
+    parser.add_argument("--root", default="embeddings")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    validate = sub.add_parser("validate")
+    validate.add_argument("generation")
+    promote_cmd = sub.add_parser("promote")
+    promote_cmd.add_argument("generation")
+    promote_cmd.add_argument("--skip-validation", action="store_true")
+    sub.add_parser("rollback", help="re-promote the previous generation")
+    gc = sub.add_parser("gc")
+    gc.add_argument("--grace", type=float, default=None, help="seconds a retired generation is kept")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        current = current_generation(args.root)
+        for manifest in list_generations(args.root):
+            marker = "*" if manifest['generation'] == current else " "
+            if manifest.get('building'):
+                print(f"{marker} {manifest['generation']:<20} (building)")
+                continue
+            print(f"{marker} {manifest['generation']:<20} {manifest.get('num_records', '?'):>8} records  "
+                  f"{manifest.get('model_name', '?')}")
+    elif args.command == "validate":
+        ok, report = validate_generation(generation_path(args.root, args.generation))
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        raise SystemExit(0 if ok else 1)
+    elif args.command == "promote":
+        if not args.skip_validation:
+            ok, report = validate_generation(generation_path(args.root, args.generation))
+            if not ok:
+                print(f"❌ Not promoting {args.generation}: {'; '.join(report['errors'])}")
+                raise SystemExit(1)
+        promote(args.root, args.generation)
+    elif args.command == "rollback":
+        current = current_generation(args.root)
+        previous = read_manifest(generation_path(args.root, current)).get('previous') if current else None
+        if not previous or not os.path.isdir(generation_path(args.root, previous)):
+            print("❌ No previous generation to roll back to")
+            raise SystemExit(1)
+        promote(args.root, previous)
+    elif args.command == "gc":
+        collect_garbage(args.root, args.grace)
+
+
+if __name__ == "__main__":
+    main()
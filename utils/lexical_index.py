@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+BM25 Lexical Index for KrishiSahay
+Compact inverted index for exact-term matching (pesticide names, product
+codes, doses) that the dense embeddings blur
+"""
+
+import pickle
+import re
+from typing import List, Tuple
+
+import numpy as np
+
+# Devanagari/Indic letters with their vowel signs (excluding the danda
+# punctuation), or Latin words and numbers such as "17.8"
+TOKEN_PATTERN = re.compile(r"[\u0900-\u0963\u0966-\u0DFF]+|[a-z0-9]+(?:\.[0-9]+)?")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split Devanagari and Latin text into lowercase terms
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab = {}
+        # CSR layout: postings of term t live in indptr[t]:indptr[t+1]
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.zeros(0, dtype=np.int32)
+        self.term_freqs = np.zeros(0, dtype=np.uint16)
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.avg_doc_len = 0.0
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.doc_len)
+
+    def build(self, texts: List[str]) -> "BM25Index":
+        """
+        Build the inverted index from a list of documents
+        """
+        postings = {}
+        doc_len = np.zeros(len(texts), dtype=np.float32)
+
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_len[doc_id] = len(tokens)
+            counts = {}
+            for tok in tokens:
+                counts[tok] = counts.get(tok, 0) + 1
+            for tok, tf in counts.items():
+                postings.setdefault(tok, []).append((doc_id, tf))
+
+        terms = sorted(postings)
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        lengths = np.array([len(postings[t]) for t in terms], dtype=np.int64)
+        self.indptr = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        self.doc_ids = np.array([d for t in terms for d, _ in postings[t]], dtype=np.int32)
+        self.term_freqs = np.array([min(tf, 65535) for t in terms for _, tf in postings[t]], dtype=np.uint16)
+
+        n = len(texts)
+        self.idf = np.log(1 + (n - lengths + 0.5) / (lengths + 0.5)).astype(np.float32)
+        self.doc_len = doc_len
+        self.avg_doc_len = float(doc_len.mean()) if n else 0.0
+        return self
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
+        """
+        Return (doc_id, bm25_score) pairs for the best matching documents
+        """
+        term_ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not term_ids or not self.num_docs:
+            return []
+
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len / max(self.avg_doc_len, 1e-6))
+        for t in term_ids:
+            start, end = self.indptr[t], self.indptr[t + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.term_freqs[start:end].astype(np.float32)
+            # doc ids are unique within one posting list, so fancy-index add is safe
+            scores[docs] += self.idf[t] * tf * (self.k1 + 1) / (tf + norm[docs])
+
+        top_k = min(top_k, int(np.count_nonzero(scores)))
+        if top_k == 0:
+            return []
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def save(self, output_file: str):
+        with open(output_file, 'wb') as f:
+            pickle.dump({
+                'k1': self.k1,
+                'b': self.b,
+                'vocab': self.vocab,
+                'indptr': self.indptr,
+                'doc_ids': self.doc_ids,
+                'term_freqs': self.term_freqs,
+                'idf': self.idf,
+                'doc_len': self.doc_len,
+                'avg_doc_len': self.avg_doc_len
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, index_file: str) -> "BM25Index":
+        with open(index_file, 'rb') as f:
+            data = pickle.load(f)
+        index = cls(k1=data['k1'], b=data['b'])
+        for key in ('vocab', 'indptr', 'doc_ids', 'term_freqs', 'idf', 'doc_len', 'avg_doc_len'):
+            setattr(index, key, data[key])
+        return index
+
+
+def reciprocal_rank_fusion(ranked_lists: List[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Fuse several ranked id lists; each id scores sum(1 / (k + rank))
+    """
+    fused = {}
+    for ranking in ranked_lists:
+        for rank, doc_id in enumerate(ranking, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
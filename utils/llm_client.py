@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Resilient LLM Client Layer for KrishiSahay
+Shared by the Gemini and Watsonx integrations: per-call deadlines,
+bounded retries with jittered backoff, optional hedged requests and a
+circuit breaker so a slow upstream never pins request threads
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class LLMUnavailableError(Exception):
+    """Raised when the provider failed, timed out or the circuit is open."""
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, str(default)))
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        """
+        Open after failure_threshold consecutive failures; allow one trial
+        call after reset_timeout seconds
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def is_open(self) -> bool:
+        """True while calls are being short-circuited (read-only check)."""
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+def is_retryable(exc) -> bool:
+    """
+    Client errors (4xx other than 408/429) will not succeed on retry
+    """
+    response = getattr(exc, 'response', None)
+    status = getattr(response, 'status_code', None) or getattr(exc, 'code', None)
+    if isinstance(status, int) and 400 <= status < 500 and status not in (408, 429):
+        return False
+    return True
+
+
+class ResilientCaller:
+    # Hedged and abandoned attempts run here; shared so threads stay bounded
+    _executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_CLIENT_THREADS", "16")))
+
+    def __init__(self, name, timeout=None, deadline=None, max_retries=None,
+                 backoff_base=None, backoff_max=None, hedge=None, hedge_after=None,
+                 breaker=None):
+        """
+        Settings default to LLM_* environment variables (seconds)
+        """
+        self.name = name
+        self.timeout = timeout if timeout is not None else _env_float("LLM_TIMEOUT", 20)
+        self.deadline = deadline if deadline is not None else _env_float("LLM_DEADLINE", 30)
+        self.max_retries = int(max_retries if max_retries is not None else _env_float("LLM_MAX_RETRIES", 2))
+        self.backoff_base = backoff_base if backoff_base is not None else _env_float("LLM_BACKOFF_BASE", 0.5)
+        self.backoff_max = backoff_max if backoff_max is not None else _env_float("LLM_BACKOFF_MAX", 4)
+        if hedge is None:
+            hedge = os.getenv("LLM_HEDGE", "false").lower() in ("1", "true", "yes")
+        self.hedge = hedge
+        # Fixed hedge delay; when unset the observed p95 latency is used
+        self.hedge_after = hedge_after if hedge_after is not None else (
+            _env_float("LLM_HEDGE_AFTER", 0) or None)
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=int(_env_float("LLM_BREAKER_FAILURES", 5)),
+            reset_timeout=_env_float("LLM_BREAKER_RESET", 30)
+        )
+        self.latencies = deque(maxlen=200)
+        self.stats = {'calls': 0, 'retries': 0, 'hedges': 0, 'timeouts': 0,
+                      'failures': 0, 'short_circuited': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def p95_latency(self):
+        with self._lock:
+            if len(self.latencies) < 20:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def _hedge_delay(self):
+        if not self.hedge:
+            return None
+        return self.hedge_after or self.p95_latency()
+
+    def _attempt(self, fn, args, kwargs, budget):
+        """
+        One attempt (plus an optional hedge) bounded by budget seconds
+        """
+        start_time = time.monotonic()
+        futures = [self._executor.submit(fn, *args, **kwargs)]
+        hedge_delay = self._hedge_delay()
+
+        if hedge_delay is not None and hedge_delay < budget:
+            done, _ = wait(futures, timeout=hedge_delay)
+            if not done:
+                self._count('hedges')
+                futures.append(self._executor.submit(fn, *args, **kwargs))
+
+        last_error = None
+        while futures:
+            remaining = budget - (time.monotonic() - start_time)
+            if remaining <= 0:
+                break
+            done, _ = wait(futures, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                futures.remove(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                with self._lock:
+                    self.latencies.append(time.monotonic() - start_time)
+                return result
+
+        if futures:
+            # Still running: abandon it, the HTTP timeout will reclaim the thread
+            self._count('timeouts')
+            raise TimeoutError(f"{self.name} did not answer within {budget:.1f}s")
+        raise last_error
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Run fn with deadline, retries, hedging and circuit breaking.
+        Raises LLMUnavailableError when no answer could be obtained.
+        """
+        self._count('calls')
+        if not self.breaker.allow():
+            self._count('short_circuited')
+            raise LLMUnavailableError(f"{self.name} circuit open")
+
+        deadline_at = time.monotonic() + self.deadline
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                break
+            if attempt:
+                self._count('retries')
+            try:
+                result = self._attempt(fn, args, kwargs, min(self.timeout, remaining))
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                last_error = e
+                print(f"⚠️ {self.name} attempt {attempt + 1} failed: {e}")
+                if not is_retryable(e) or attempt == self.max_retries:
+                    break
+            # Full-jitter exponential backoff, never past the deadline
+            backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+            if time.monotonic() + backoff >= deadline_at:
+                break
+            time.sleep(backoff)
+
+        self._count('failures')
+        self.breaker.record_failure()
+        raise LLMUnavailableError(f"{self.name} unavailable: {last_error}")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Common LLM provider interface for KrishiSahay
+Every backend (Gemini, Watsonx, ...) exposes the same two calls:
+    generate_response(query, context=None, target_lang='en')
+    generate_with_retrieval(query, results, target_lang='en')
+and their *_with_usage forms, which return (text, usage) so token counts
+stay with the call that produced them.
+"""
+
+import os
+
+from context_builder import ContextBuilder
+
+# Language instruction for the model
+LANG_INSTRUCTIONS = {
+    'en': "Respond in English only.",
+    'hi': "केवल हिंदी में उत्तर दें।",
+    'te': "తెలుగులో మాత్రమే సమాధానం ఇవ్వండి.",
+    'ta': "தமிழில் மட்டும் பதில் அளிக்கவும்.",
+    'kn': "ಕನ್ನಡದಲ್ಲಿ ಮಾತ್ರ ಉತ್ತರಿಸಿ.",
+    'ml': "മലയാളത്തിൽ മാത്രം ഉത്തരം നൽകുക.",
+    'bn': "শুধুমাত্র বাংলায় উত্তর দিন।",
+    'mr': "फक्त मराठीत उत्तर द्या.",
+    'gu': "માત્ર ગુજરાતીમાં જવાબ આપો.",
+    'pa': "ਕੇਵਲ ਪੰਜਾਬੀ ਵਿੱਚ ਉੱਤਰ ਦਿਓ।",
+    'or': "କେବଳ ଓଡ଼ିଆରେ ଉତ୍ତର ଦିଅନ୍ତୁ।",
+    'as': "কেৱল অসমীয়াত উত্তৰ দিয়ক।"
+}
+
+
+def lang_instruction(target_lang):
+    return LANG_INSTRUCTIONS.get(target_lang, LANG_INSTRUCTIONS['en'])
+
+
+class LLMProvider:
+    name = "base"
+
+    def __init__(self, offline_engine=None):
+        """
+        offline_engine: optional RAGEngine whose get_offline_answer is served
+        when the provider is failing or its circuit breaker is open.
+        """
+        self.context_builder = ContextBuilder()
+        self.offline_engine = offline_engine
+        # The router sets this so failures propagate and it can fail over
+        self.raise_errors = False
+        self.use_mock = True
+        self.caller = None
+        # Configured price per 1k tokens, used by the router
+        self.cost_per_1k_tokens = float(os.getenv(f"LLM_COST_{self.name.upper()}", "0"))
+
+    @property
+    def available(self):
+        """True when the provider can serve real (non-mock) answers."""
+        return not self.use_mock
+
+    def generate_response(self, query, context=None, target_lang='en'):
+        return self.generate_response_with_usage(query, context, target_lang)[0]
+
+    def generate_response_with_usage(self, query, context=None, target_lang='en'):
+        """
+        Returns (text, usage); usage holds this call's token counts and latency
+        """
+        raise NotImplementedError
+
+    def generate_with_retrieval(self, query, results, target_lang='en'):
+        """Use retrieved results as context and respond in target language."""
+        return self.generate_with_usage(query, results, target_lang)[0]
+
+    def generate_with_usage(self, query, results, target_lang='en'):
+        """
+        generate_with_retrieval returning (text, usage). The provider is
+        shared by concurrent requests, so usage is never kept on it.
+        """
+        if not results:
+            return self.generate_response_with_usage(query, target_lang=target_lang)
+        built = self.context_builder.build(query, results)
+        response, usage = self.generate_response_with_usage(query, built['context'], target_lang)
+        return response, dict(usage,
+                              context_tokens=built['tokens'],
+                              context_passages=built['passages'],
+                              dropped_duplicates=built['dropped_duplicates'])
+
+    def _offline_response(self, query, context=None):
+        """Answer from the KCC database when the provider is degraded."""
+        if self.offline_engine is not None:
+            try:
+                return self.offline_engine.get_offline_answer(query)
+            except Exception as e:
+                print(f"Offline answer error: {e}")
+        return self._mock_response(query, context)
+
+    def _mock_response(self, query, context=None):
+        raise NotImplementedError
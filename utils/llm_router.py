@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+LLM Provider Router for KrishiSahay
+Picks a backend per request from live latency/error statistics and
+configured cost, failing over to the next provider when one errors.
+
+Configuration (no code changes needed to shift load):
+    LLM_PROVIDERS               comma-separated order, e.g. "gemini,watsonx"
+    LLM_COST_<NAME>             price per 1k tokens for each provider
+    LLM_ROUTER_LATENCY_WEIGHT   score weight per second of latency
+    LLM_ROUTER_COST_WEIGHT      score weight per unit of cost
+    LLM_ROUTER_ERROR_WEIGHT     score weight of the recent error rate
+    LLM_ROUTER_EXPLORE          share of requests sent to a random healthy provider
+
+With a FastPathPolicy, high-confidence KCC matches are answered directly
+without calling any provider (see fast_path.py).
+"""
+
+import importlib
+import os
+import random
+import threading
+import time
+
+# name -> (module, class); providers are imported lazily so a missing SDK
+# only disables that provider
+PROVIDER_REGISTRY = {
+    "gemini": ("gemini_llm", "GeminiLLM"),
+    "watsonx": ("watsonx_llm", "WatsonxLLM"),
+}
+
+
+class ProviderStats:
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.latency = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self.requests += 1
+            if ok:
+                self.latency = latency if self.latency is None else \
+                    self.alpha * latency + (1 - self.alpha) * self.latency
+            else:
+                self.errors += 1
+            self.error_rate = self.alpha * (0.0 if ok else 1.0) + (1 - self.alpha) * self.error_rate
+
+    def snapshot(self):
+        with self._lock:
+            return {'latency_s': self.latency, 'error_rate': self.error_rate,
+                    'requests': self.requests, 'errors': self.errors}
+
+
+class LLMRouter:
+    def __init__(self, offline_engine=None, providers=None, fast_path=None):
+        """
+        providers: optional list of provider instances (otherwise built from LLM_PROVIDERS)
+        fast_path: optional FastPathPolicy consulted before generate_with_retrieval
+        """
+        self.offline_engine = offline_engine
+        self.fast_path = fast_path
+        self.latency_weight = float(os.getenv("LLM_ROUTER_LATENCY_WEIGHT", "1.0"))
+        self.cost_weight = float(os.getenv("LLM_ROUTER_COST_WEIGHT", "1.0"))
+        self.error_weight = float(os.getenv("LLM_ROUTER_ERROR_WEIGHT", "10.0"))
+        self.explore = float(os.getenv("LLM_ROUTER_EXPLORE", "0.05"))
+
+        if providers is None:
+            names = [n.strip() for n in os.getenv("LLM_PROVIDERS", "gemini,watsonx").split(",") if n.strip()]
+            providers = [p for p in (self._load(n) for n in names) if p is not None]
+        if not providers:
+            raise ValueError("No LLM providers could be loaded")
+
+        self.providers = providers
+        for provider in self.providers:
+            provider.raise_errors = True
+        self.stats = {p.name: ProviderStats() for p in self.providers}
+        self.last_provider = None
+        self.last_usage = {}
+        print(f"✅ LLM router ready: {', '.join(p.name + ('' if p.available else ' (mock)') for p in self.providers)}")
+
+    def _load(self, name):
+        if name not in PROVIDER_REGISTRY:
+            print(f"⚠️ Unknown LLM provider '{name}'")
+            return None
+        module_name, class_name = PROVIDER_REGISTRY[name]
+        try:
+            module = importlib.import_module(module_name)
+            return getattr(module, class_name)(offline_engine=self.offline_engine)
+        except Exception as e:
+            print(f"⚠️ LLM provider '{name}' unavailable: {e}")
+            return None
+
+    def _healthy(self, provider):
+        if not provider.available:
+            return False
+        breaker = getattr(provider.caller, 'breaker', None)
+        return breaker is None or not breaker.is_open()
+
+    def _score(self, provider):
+        """
+        Lower is better; providers without latency data yet score as 0 s so they get tried
+        """
+        stats = self.stats[provider.name].snapshot()
+        latency = stats['latency_s'] or 0.0
+        return (self.latency_weight * latency
+                + self.cost_weight * provider.cost_per_1k_tokens
+                + self.error_weight * stats['error_rate'])
+
+    def ranked_providers(self):
+        """
+        Healthy providers ordered by score (with occasional exploration),
+        followed by the rest as a last resort
+        """
+        healthy = sorted((p for p in self.providers if self._healthy(p)), key=self._score)
+        if len(healthy) > 1 and random.random() < self.explore:
+            pick = random.randrange(1, len(healthy))
+            healthy.insert(0, healthy.pop(pick))
+        others = [p for p in self.providers if p not in healthy and p.available]
+        return healthy + others
+
+    def _route(self, method, query, *args, **kwargs):
+        """
+        Call the best provider's *_with_usage method, failing over; returns
+        (response, usage) with the answering provider's name (or None) in usage
+        """
+        for provider in self.ranked_providers():
+            start_time = time.perf_counter()
+            try:
+                response, usage = getattr(provider, method)(query, *args, **kwargs)
+            except Exception as e:
+                self.stats[provider.name].record(time.perf_counter() - start_time, ok=False)
+                print(f"⚠️ {provider.name} failed ({e}); failing over")
+                continue
+            self.stats[provider.name].record(time.perf_counter() - start_time, ok=True)
+            usage = dict(usage, provider=provider.name)
+            self.last_provider = provider.name
+            self.last_usage = usage
+            return response, usage
+
+        # Every provider failed or none is configured: offline answer, else mock
+        self.last_provider = None
+        self.last_usage = {'provider': None}
+        return self.providers[0]._offline_response(query), {'provider': None}
+
+    def generate_response(self, query, context=None, target_lang='en'):
+        return self._route('generate_response_with_usage', query, context, target_lang)[0]
+
+    def generate_with_retrieval(self, query, results, target_lang='en'):
+        return self.generate_with_usage(query, results, target_lang)[0]
+
+    def generate_with_provider(self, query, results, target_lang='en'):
+        """
+        generate_with_retrieval plus the provider that answered, as
+        (text, provider): "kcc" for the fast path, None for the offline
+        fallback. Unlike last_provider this is safe with concurrent callers.
+        """
+        answer, usage = self.generate_with_usage(query, results, target_lang)
+        return answer, usage['provider']
+
+    def generate_with_usage(self, query, results, target_lang='en'):
+        """
+        generate_with_retrieval returning (text, usage): this call's token
+        counts and latency, with the answering provider under 'provider'.
+        Unlike last_usage this is safe with concurrent callers.
+        """
+        if self.fast_path is not None:
+            start_time = time.perf_counter()
+            answer = self.fast_path.answer(query, results, target_lang)
+            if answer is not None:
+                usage = {'provider': "kcc", 'latency_ms': 1000 * (time.perf_counter() - start_time)}
+                self.last_provider = "kcc"
+                self.last_usage = usage
+                return answer, usage
+        return self._route('generate_with_usage', query, results, target_lang)
+
+    def get_stats(self):
+        stats = {p.name: dict(self.stats[p.name].snapshot(),
+                              available=p.available,
+                              healthy=self._healthy(p),
+                              cost_per_1k_tokens=p.cost_per_1k_tokens)
+                 for p in self.providers}
+        if self.fast_path is not None:
+            stats['kcc_fast_path'] = self.fast_path.get_stats()
+        return stats
@@ -0,0 +1,38 @@
+"""
+States, districts and crops supported by KrishiSahay
+Shared by the Streamlit app, the weather prefetch job and farmer imports
+"""
+
+INDIAN_STATES = [
+    "Andhra Pradesh", "Telangana", "Tamil Nadu", "Karnataka", "Kerala",
+    "Maharashtra", "Gujarat", "Uttar Pradesh", "Madhya Pradesh", "Bihar",
+    "West Bengal", "Punjab", "Haryana", "Rajasthan", "Delhi", "Odisha",
+    "Assam", "Jharkhand", "Chhattisgarh", "Himachal Pradesh"
+]
+
+STATE_DISTRICTS = {
+    "Andhra Pradesh": ["Visakhapatnam", "Vijayawada", "Guntur", "Nellore", "Kurnool"],
+    "Telangana": ["Hyderabad", "Warangal", "Nizamabad", "Karimnagar", "Khammam"],
+    "Tamil Nadu": ["Chennai", "Coimbatore", "Madurai", "Tiruchirappalli", "Salem"],
+    "Karnataka": ["Bengaluru", "Mysuru", "Hubballi", "Mangaluru", "Belagavi"],
+    "Kerala": ["Thiruvananthapuram", "Kochi", "Kozhikode", "Thrissur", "Kollam"],
+    "Maharashtra": ["Mumbai", "Pune", "Nagpur", "Nashik", "Aurangabad"],
+    "Gujarat": ["Ahmedabad", "Surat", "Vadodara", "Rajkot", "Bhavnagar"],
+    "Uttar Pradesh": ["Lucknow", "Kanpur", "Agra", "Varanasi", "Meerut"],
+    "Madhya Pradesh": ["Bhopal", "Indore", "Jabalpur", "Gwalior", "Ujjain"],
+    "Bihar": ["Patna", "Gaya", "Bhagalpur", "Muzaffarpur", "Darbhanga"],
+    "West Bengal": ["Kolkata", "Howrah", "Darjeeling", "Siliguri", "Durgapur"],
+    "Punjab": ["Ludhiana", "Amritsar", "Jalandhar", "Patiala", "Bathinda"],
+    "Haryana": ["Gurugram", "Faridabad", "Panipat", "Ambala", "Karnal"],
+    "Rajasthan": ["Jaipur", "Jodhpur", "Udaipur", "Kota", "Bikaner"],
+    "Delhi": ["New Delhi", "North Delhi", "South Delhi", "East Delhi", "West Delhi"],
+    "Odisha": ["Bhubaneswar", "Cuttack", "Rourkela", "Puri", "Sambalpur"],
+    "Assam": ["Guwahati", "Dibrugarh", "Silchar", "Jorhat", "Tezpur"]
+}
+
+CROPS = ["Wheat", "Rice", "Cotton", "Sugarcane", "Mustard", "Potato", "Maize", "Moong"]
+
+
+def all_districts():
+    """(state, district) pairs for every supported district"""
+    return [(state, district) for state, districts in STATE_DISTRICTS.items() for district in districts]
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Deterministic Mock Weather for KrishiSahay
+Reproducible mock readings for any (location, date), identical across
+worker processes and independent of the global `random` state.
+
+Each cell is seeded with a stable hash of "<location>_<YYYYMMDD>" (not
+Python's per-process salted hash()), and values are drawn from a
+counter-based SplitMix64 stream, so a single reading and a whole
+districts × days grid produce the same numbers.
+"""
+
+import hashlib
+
+import numpy as np
+
+FORECAST_STEPS = 4
+# Draw slots: temp, humidity, condition, wind, rain, then 4 per forecast step
+DRAWS = 5 + 4 * FORECAST_STEPS
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def stable_seed(location, date_str):
+    """64-bit seed that is the same in every process and on every host"""
+    digest = hashlib.blake2b(f"{location}_{date_str}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _splitmix64(x):
+    x = x + _GOLDEN
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def uniform_draws(seeds, n_draws=DRAWS):
+    """(N,) uint64 seeds -> (N, n_draws) floats in [0, 1)"""
+    counters = np.arange(n_draws, dtype=np.uint64) * _GOLDEN
+    with np.errstate(over="ignore"):
+        bits = _splitmix64(seeds[:, None] + counters[None, :])
+    return (bits >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def _randint(u, low, high):
+    """Inclusive integer range, like random.randint"""
+    return (low + np.floor(u * (high - low + 1))).astype(np.int64)
+
+
+def mock_weather_grid(locations, dates, climates, default_climate):
+    """
+    Vectorised mock readings for every location × date.
+    dates are 'YYYYMMDD' strings; climates maps location -> climate dict.
+    Returns arrays shaped (L, D) for current values and (L, D, FORECAST_STEPS)
+    for the forecast; conditions are given as indexes into each location's list.
+    """
+    L, D = len(locations), len(dates)
+    seeds = np.array([stable_seed(loc, d) for loc in locations for d in dates], dtype=np.uint64)
+    u = uniform_draws(seeds).reshape(L, D, DRAWS)
+
+    loc_climates = [climates.get(loc, default_climate) for loc in locations]
+    t_lo = np.array([c["temp_range"][0] for c in loc_climates])[:, None]
+    t_hi = np.array([c["temp_range"][1] for c in loc_climates])[:, None]
+    h_lo = np.array([c["humidity_range"][0] for c in loc_climates])[:, None]
+    h_hi = np.array([c["humidity_range"][1] for c in loc_climates])[:, None]
+    n_cond = np.array([len(c["conditions"]) for c in loc_climates])[:, None]
+    rainy = np.array([["rain" in cond for cond in c["conditions"]] +
+                      [False] * (int(n_cond.max()) - len(c["conditions"]))
+                      for c in loc_climates])
+
+    temp = _randint(u[..., 0], t_lo, t_hi)
+    humidity = _randint(u[..., 1], h_lo, h_hi)
+    condition = np.floor(u[..., 2] * n_cond).astype(np.int64)
+    wind = _randint(u[..., 3], 5, 25)
+    is_rain = np.take_along_axis(rainy, condition, axis=1)
+    rain = np.where(is_rain, _randint(u[..., 4], 0, 5), 0)
+
+    steps = u[..., 5:].reshape(L, D, FORECAST_STEPS, 4)
+    return {
+        "temp": temp,
+        "humidity": humidity,
+        "condition": condition,
+        "wind_speed": wind,
+        "rain": rain,
+        "forecast_temp": temp[..., None] + _randint(steps[..., 0], -2, 2),
+        "forecast_humidity": humidity[..., None] + _randint(steps[..., 1], -5, 5),
+        "forecast_condition": np.floor(steps[..., 2] * n_cond[..., None]).astype(np.int64),
+        "forecast_rain": np.where(is_rain[..., None], _randint(steps[..., 3], 0, 3), 0),
+    }
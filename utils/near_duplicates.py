@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Near-Duplicate Collapse for KrishiSahay
+KCC logs repeat the same answer many times, differing only in
+whitespace, punctuation or a trailing phrase. At index build time such
+records are clustered and collapsed into one canonical record carrying a
+duplicate count, so searches never spend candidates on copies.
+
+Two records are duplicates when their question + answer text has an
+estimated Jaccard similarity of at least DEDUP_JACCARD over word 3-gram
+shingles (MinHash with LSH banding), or their embeddings lie within
+DEDUP_MAX_DISTANCE (squared L2) of each other - and, in both cases, they
+are for the same crop and mention the same numbers and units, so answers
+that differ only in dose are kept apart. Each duplicate must be similar
+to its canonical record itself, not via a chain of other records.
+
+Usage:
+    python utils/near_duplicates.py data/kcc_qa_pairs.json     # report only
+"""
+
+import hashlib
+import os
+import re
+from typing import List, Tuple
+
+import numpy as np
+
+from answer_store import normalize_question
+from lexical_index import tokenize
+from vector_index import NumpyFlatIndex
+
+_PRIME = (1 << 31) - 1
+
+# A number (any script's digits) and the unit or word right after it
+_QUANTITY = re.compile(r"(?<!\w)(\d+(?:[.,]\d+)*)\s*(%|[^\s\d.,;:!?()।॥\-]+)?")
+
+
+def shingles(text: str, size: int = 3) -> set:
+    """
+    Word n-gram shingles; short texts fall back to their words
+    """
+    tokens = tokenize(text)
+    if len(tokens) < size:
+        return set(tokens) or {normalize_question(text)}
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def _hash32(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def minhash_signatures(texts: List[str], num_perm: int = 128, seed: int = 0) -> np.ndarray:
+    """
+    MinHash signature per text under num_perm universal hash permutations
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint64)
+    for row, text in enumerate(texts):
+        hashes = np.array([_hash32(s) % _PRIME for s in shingles(text)], dtype=np.uint64)
+        signatures[row] = ((np.outer(hashes, a) + b) % _PRIME).min(axis=0)
+    return signatures
+
+
+def minhash_pairs(signatures: np.ndarray, threshold: float, bands: int = 32) -> set:
+    """
+    Pairs whose estimated Jaccard is at least threshold. LSH banding
+    proposes candidates, so not every pair is compared.
+    """
+    # Identical signatures (answers repeated verbatim, often thousands of
+    # times) pair with their first copy, keeping the LSH buckets small
+    first_copy = {}
+    exact_pairs = set()
+    for doc, key in enumerate(map(bytes, signatures)):
+        if key in first_copy:
+            exact_pairs.add((first_copy[key], doc))
+        else:
+            first_copy[key] = doc
+    distinct = np.array(sorted(first_copy.values()), dtype=np.int64)
+
+    rows = signatures.shape[1] // bands
+    candidates = set()
+    for band in range(bands):
+        buckets = {}
+        for doc, key in zip(distinct, map(bytes, signatures[distinct, band * rows:(band + 1) * rows])):
+            buckets.setdefault(key, []).append(int(doc))
+        for members in buckets.values():
+            for pos, i in enumerate(members):
+                for j in members[pos + 1:]:
+                    candidates.add((i, j))
+    return exact_pairs | {(i, j) for i, j in candidates
+                          if np.mean(signatures[i] == signatures[j]) >= threshold}
+
+
+def embedding_pairs(embeddings: np.ndarray, max_distance: float, k: int = 10,
+                    batch_size: int = 1024) -> set:
+    """
+    Pairs among each record's k nearest neighbours within max_distance
+    """
+    index = NumpyFlatIndex(embeddings.shape[1])
+    index.add(embeddings)
+    k = min(k, len(embeddings))
+    pairs = set()
+    for start in range(0, len(embeddings), batch_size):
+        distances, neighbours = index.search(embeddings[start:start + batch_size], k)
+        for row, (dists, ids) in enumerate(zip(distances, neighbours)):
+            i = start + row
+            for dist, j in zip(dists, ids):
+                if 0 <= j != i and dist <= max_distance:
+                    pairs.add((min(i, int(j)), max(i, int(j))))
+    return pairs
+
+
+def quantities(text: str) -> Tuple:
+    """
+    Every number in text with the word after it ("300 ml" -> ("300", "ml")),
+    as a sorted tuple; records whose doses or dates differ never merge
+    """
+    found = []
+    for number, unit in _QUANTITY.findall(text or ""):
+        try:
+            number = f"{float(number.replace(',', '')):g}"
+        except ValueError:
+            pass
+        found.append((number, unit.lower()))
+    return tuple(sorted(found))
+
+
+def _record_key(record) -> str:
+    return f"{record.get('question', '')} {record['answer']}"
+
+
+def cluster_duplicates(records: List[dict], embeddings=None, jaccard=None, max_distance=None) -> np.ndarray:
+    """
+    Canonical record index for every record (records with no duplicate are
+    their own). Records are dicts with 'question', 'answer' and 'crop'.
+    Canonical records are taken longest answer first, and a record joins a
+    canonical only if it is directly similar to it, has the same crop and
+    the same quantities; similarity never chains through third records.
+    """
+    jaccard = float(jaccard or os.getenv("DEDUP_JACCARD", "0.8"))
+    max_distance = float(max_distance or os.getenv("DEDUP_MAX_DISTANCE", "0.02"))
+
+    signatures = minhash_signatures([_record_key(r) for r in records])
+    pairs = minhash_pairs(signatures, jaccard)
+    if embeddings is not None and len(embeddings):
+        pairs |= embedding_pairs(np.asarray(embeddings, dtype=np.float32), max_distance)
+
+    neighbours = {}
+    for i, j in pairs:
+        neighbours.setdefault(i, set()).add(j)
+        neighbours.setdefault(j, set()).add(i)
+
+    crops = [normalize_question(r.get('crop') or 'unknown') for r in records]
+    amounts = [quantities(r['answer']) for r in records]
+    order = sorted(range(len(records)), key=lambda i: (-len(normalize_question(records[i]['answer'])), i))
+
+    # Verbatim copies only pair with their first copy (see minhash_pairs);
+    # they are exactly as similar to a canonical as that copy is
+    copies = {}
+    for i, j in pairs:
+        if np.array_equal(signatures[i], signatures[j]):
+            copies.setdefault(i, []).append(j)
+
+    labels = np.full(len(records), -1, dtype=np.int64)
+    for canonical in order:
+        if labels[canonical] != -1:
+            continue
+        labels[canonical] = canonical
+        for j in neighbours.get(canonical, ()):
+            for member in [j] + copies.get(j, []):
+                if labels[member] == -1 and crops[member] == crops[canonical] \
+                        and amounts[member] == amounts[canonical]:
+                    labels[member] = canonical
+    return labels
+
+
+def collapse_near_duplicates(records: List[dict], embeddings=None, **kwargs) -> Tuple[List[int], List[int]]:
+    """
+    Indices of the canonical records, in corpus order, and how many records
+    each one stands for. The canonical record has the longest answer, since
+    variants usually only drop a trailing phrase.
+    """
+    labels = cluster_duplicates(records, embeddings, **kwargs)
+    counts = np.bincount(labels, minlength=len(records))
+    keep = [i for i in range(len(records)) if labels[i] == i]
+    return keep, [int(counts[i]) for i in keep]
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "data/kcc_qa_pairs.json"
+    with open(path, encoding="utf-8") as f:
+        qa_data = json.load(f)
+    keep, counts = collapse_near_duplicates(qa_data)
+    print(f"📊 {len(qa_data)} records -> {len(keep)} after collapsing near-duplicates (text only)")
+    for i, count in sorted(zip(keep, counts), key=lambda pair: -pair[1])[:10]:
+        if count > 1:
+            print(f"   ×{count}  {qa_data[i]['answer'][:70]}")
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Query Log for KrishiSahay
+Records what farmers ask, which KCC entries were retrieved and how long
+each stage took, without slowing the request path: `log()` only appends
+to an in-memory ring buffer, and a background thread flushes it to
+SQLite in batches. When the buffer is full the oldest records are dropped
+(and counted) rather than blocking.
+
+Usage:
+    python utils/query_log.py report [--days 7] [--top 20]
+    python utils/query_log.py export top_questions.txt [--top 100]   # for answer_pregen.py
+"""
+
+import argparse
+import atexit
+import json
+import os
+import sqlite3
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+# Per-stage timings recorded for every query (milliseconds)
+STAGES = ("lookup_ms", "search_ms", "llm_ms", "total_ms")
+
+# LLM token counts of the call that answered (None for precomputed/KCC answers)
+TOKENS = ("prompt_tokens", "output_tokens")
+
+COLUMNS = ("ts", "query", "query_key", "lang", "district", "crop", "source", "provider",
+           "coalesced", "retrieved_ids", "scores") + STAGES + TOKENS
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class QueryLogger:
+    def __init__(self, path=None, buffer_size=None, batch_size=None, flush_interval=None):
+        self.path = path or os.getenv("QUERY_LOG_PATH", "cache/query_log.sqlite")
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.buffer = deque(maxlen=int(buffer_size or os.getenv("QUERY_LOG_BUFFER", "10000")))
+        self.batch_size = int(batch_size or os.getenv("QUERY_LOG_BATCH", "500"))
+        self.flush_interval = float(flush_interval or os.getenv("QUERY_LOG_FLUSH_SECONDS", "2"))
+        self.dropped = 0
+        self.written = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+
+        conn = self._connect()
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS queries (
+                ts TEXT NOT NULL,
+                query TEXT NOT NULL,
+                query_key TEXT NOT NULL,
+                lang TEXT,
+                district TEXT,
+                crop TEXT,
+                source TEXT,
+                provider TEXT,
+                coalesced INTEGER DEFAULT 0,
+                retrieved_ids TEXT,
+                scores TEXT,
+                {', '.join(f'{stage} REAL' for stage in STAGES)},
+                {', '.join(f'{column} INTEGER' for column in TOKENS)}
+            )
+        """)
+        # Logs created before token counts were recorded
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(queries)")}
+        for column in TOKENS:
+            if column not in existing:
+                conn.execute(f"ALTER TABLE queries ADD COLUMN {column} INTEGER")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_queries_ts ON queries (ts)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_queries_key ON queries (query_key, lang)")
+        conn.commit()
+        conn.close()
+
+        self._thread = threading.Thread(target=self._run, name="query-log-flush", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def log(self, query, query_key=None, **fields):
+        """
+        Queue one record; never blocks on I/O.
+        fields: lang, district, crop, source, provider, coalesced,
+        retrieved_ids, scores, the STAGES timings and TOKENS counts
+        """
+        record = dict(fields, query=query, query_key=query_key or query.strip().lower(),
+                      ts=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(record)
+        if len(self.buffer) >= self.batch_size:
+            self._wake.set()
+
+    def _run(self):
+        conn = self._connect()
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush(conn)
+        self.flush(conn)
+        conn.close()
+
+    def flush(self, conn=None):
+        """
+        Write everything buffered so far in batches
+        """
+        with self._flush_lock:
+            own = conn is None
+            conn = conn or self._connect()
+            try:
+                while self.buffer:
+                    batch = []
+                    while self.buffer and len(batch) < self.batch_size:
+                        batch.append(self.buffer.popleft())
+                    conn.executemany(
+                        f"INSERT INTO queries ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                        [self._row(r) for r in batch]
+                    )
+                    conn.commit()
+                    self.written += len(batch)
+            except sqlite3.Error as e:
+                print(f"⚠️ Query log flush failed: {e}")
+            finally:
+                if own:
+                    conn.close()
+
+    @staticmethod
+    def _row(record):
+        row = []
+        for column in COLUMNS:
+            value = record.get(column)
+            if column in ("retrieved_ids", "scores") and value is not None:
+                value = json.dumps(value)
+            elif column == "coalesced":
+                value = int(bool(value))
+            row.append(value)
+        return row
+
+    def close(self):
+        if not self._stop.is_set():
+            self._stop.set()
+            self._wake.set()
+            self._thread.join(timeout=5)
+
+    def get_stats(self):
+        return {'buffered': len(self.buffer), 'written': self.written, 'dropped': self.dropped}
+
+
+def report(path, days=7, top=20):
+    """
+    Top queries, cache-miss hot spots and per-stage latency percentiles
+    """
+    conn = sqlite3.connect(path)
+    since = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+    total = conn.execute("SELECT COUNT(*) FROM queries WHERE ts >= ?", (since,)).fetchone()[0]
+    print(f"📊 {total} queries in the last {days} days ({path})")
+    if not total:
+        return
+
+    print(f"\n🔥 Top {top} queries")
+    for query, lang, count in conn.execute("""
+        SELECT MIN(query), lang, COUNT(*) AS n FROM queries WHERE ts >= ?
+        GROUP BY query_key, lang ORDER BY n DESC LIMIT ?
+    """, (since, top)):
+        print(f"  {count:6d}  [{lang}] {query[:70]}")
+
+    print(f"\n🧊 Cache-miss hot spots (answered by the LLM, not precomputed or KCC fast path)")
+    for query, lang, count, llm_ms in conn.execute("""
+        SELECT MIN(query), lang, COUNT(*) AS n, AVG(llm_ms) FROM queries
+        WHERE ts >= ? AND source = 'llm' AND coalesced = 0
+        GROUP BY query_key, lang ORDER BY n DESC LIMIT ?
+    """, (since, top)):
+        print(f"  {count:6d}  [{lang}] {query[:60]}  (LLM avg {llm_ms or 0:.0f} ms)")
+
+    print("\n📦 Answer sources")
+    for source, count in conn.execute("""
+        SELECT source, COUNT(*) FROM queries WHERE ts >= ? GROUP BY source ORDER BY 2 DESC
+    """, (since,)):
+        print(f"  {source or '-':12s} {count:6d} ({100 * count / total:.1f}%)")
+
+    print("\n⏱️ Latency per stage (ms)      p50      p95      p99")
+    for stage in STAGES:
+        values = sorted(v for (v,) in conn.execute(
+            f"SELECT {stage} FROM queries WHERE ts >= ? AND {stage} IS NOT NULL AND coalesced = 0", (since,)))
+        if values:
+            p50, p95, p99 = (percentile(values, q) for q in (0.5, 0.95, 0.99))
+            print(f"  {stage:24s} {p50:8.1f} {p95:8.1f} {p99:8.1f}   (n={len(values)})")
+    conn.close()
+
+
+def export_top_questions(path, output, top=100, days=30):
+    """
+    Write the most asked (question, language) pairs as lang<TAB>question
+    lines, for answer_pregen.py --questions
+    """
+    conn = sqlite3.connect(path)
+    since = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+    rows = conn.execute("""
+        SELECT MIN(query), lang, COUNT(*) AS n FROM queries WHERE ts >= ?
+        GROUP BY query_key, lang ORDER BY n DESC LIMIT ?
+    """, (since, top)).fetchall()
+    conn.close()
+    with open(output, "w", encoding="utf-8") as f:
+        for query, lang, _ in rows:
+            f.write(f"{lang or 'en'}\t{' '.join(query.split())}\n")
+    print(f"✅ Wrote {len(rows)} questions to {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query log analytics")
+    parser.add_argument("--path", default=os.getenv("QUERY_LOG_PATH", "cache/query_log.sqlite"))
+    sub = parser.add_subparsers(dest="command", required=True)
+    report_parser = sub.add_parser("report", help="top queries, cache misses, stage latencies")
+    report_parser.add_argument("--days", type=int, default=7)
+    report_parser.add_argument("--top", type=int, default=20)
+    export_parser = sub.add_parser("export", help="write top questions for answer_pregen.py")
+    export_parser.add_argument("output")
+    export_parser.add_argument("--top", type=int, default=100)
+    export_parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    if args.command == "report":
+        report(args.path, args.days, args.top)
+    else:
+        export_top_questions(args.path, args.output, args.top, args.days)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,62 +9,392 @@ import numpy as np
 from sentence_transformers import SentenceTransformer
 import os
 import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
 
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from vector_index import NumpyFlatIndex, index_from_embeddings
+from index_generations import current_generation, generation_path, read_manifest, resolve_index_path
+
+class _IndexState:
+    """
+    One loaded index generation. Searches take a reference to the state
+    once, so a hot swap never mixes one generation's index with another's
+    metadata, and in-flight queries finish on the generation they started on.
+    """
+
+    def __init__(self, index, metadata, lexical_index=None, generation=None, deduplicated=False):
+        self.index = index
+        self.metadata = metadata
+        self.lexical_index = lexical_index
+        self.generation = generation
+        # Near-duplicates collapsed at build time (manifest); otherwise
+        # searches over-fetch and drop repeated answers themselves
+        self.deduplicated = deduplicated
+        self.fetch_factor = 1 if deduplicated else 2
+
+
 class RAGEngine:
-    def __init__(self, index_path="embeddings/faiss_index.pkl", model_name="all-MiniLM-L6-v2"):
+    def __init__(self, index_path="embeddings/faiss_index.pkl", model_name="all-MiniLM-L6-v2",
+                 use_reranker=None, rerank_candidates=None, use_hybrid=None):
         """
-        Initialize the RAG engine with FAISS index and embedding model
+        Initialize the RAG engine with FAISS index and embedding model.
+        The optional cross-encoder re-ranker is controlled by RERANK_ENABLED
+        and RERANK_CANDIDATES unless passed explicitly. Hybrid BM25 + dense
+        retrieval is used whenever bm25_index.pkl sits next to the FAISS
+        index, unless HYBRID_SEARCH=false. Without FAISS installed the
+        NumPy index (vector_index.py) is used automatically. VECTOR_SHARDS
+        points at a sharded index manifest (sharded_index.py) instead.
+        When the index directory has promoted generations
+        (index_generations.py), the current one is loaded and a newly
+        promoted one is swapped in while serving, checked at most every
+        INDEX_RELOAD_INTERVAL seconds (0 disables).
         """
         print("🌾 Initializing RAG Engine...")
+        self.index_path = index_path
+        self.model_name = model_name
+        if use_hybrid is None:
+            use_hybrid = os.getenv("HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+        self.use_hybrid = use_hybrid
+        self.rrf_k = int(os.getenv("RRF_K", "60"))
+
+        # Load FAISS index, metadata and BM25 index
+        self._state = self._load_state()
+        self._reload_interval = float(os.getenv("INDEX_RELOAD_INTERVAL", "10"))
+        self._last_reload_check = time.monotonic()
+        self._reload_lock = threading.Lock()
         
-        # Load FAISS index and metadata
+        # Load embedding model
+        print("🔄 Loading embedding model...")
+        self.embedding_model = SentenceTransformer(model_name)
+        print(f"✅ Model loaded: {model_name}")
+
+        # Optional re-ranking stage
+        if use_reranker is None:
+            use_reranker = os.getenv("RERANK_ENABLED", "false").lower() in ("1", "true", "yes")
+        self.rerank_candidates = int(rerank_candidates or os.getenv("RERANK_CANDIDATES", "20"))
+        self.reranker = None
+        if use_reranker:
+            try:
+                from reranker import CrossEncoderReranker
+                self.reranker = CrossEncoderReranker()
+            except Exception as e:
+                print(f"⚠️ Re-ranker unavailable ({e}). Using FAISS order.")
+        self.rerank_enabled = self.reranker is not None
+
+        # Lexical (BM25) search runs in parallel with FAISS
+        self._executor = ThreadPoolExecutor(max_workers=2)
+        self.last_search_stats = {}
+
+    @property
+    def index(self):
+        return self._state.index
+
+    @property
+    def metadata(self):
+        return self._state.metadata
+
+    @property
+    def lexical_index(self):
+        return self._state.lexical_index
+
+    @property
+    def generation(self):
+        return self._state.generation
+
+    def _load_state(self, generation=None):
+        """
+        Load the index, metadata and BM25 index of a generation (default:
+        the current one, or index_path itself in a tree without generations)
+        """
+        shard_manifest = os.getenv("VECTOR_SHARDS")
+        if shard_manifest:
+            # Scatter-gather over shards (in-process, or servers in SHARD_URLS)
+            from sharded_index import load_sharded_index
+            index, metadata = load_sharded_index(shard_manifest)
+            print(f"✅ Loaded {len(index.shards)} index shards with {len(metadata)} vectors")
+            index_path, generation = resolve_index_path(self.index_path)
+            return _IndexState(index, metadata, self._load_lexical(index_path), generation)
+
+        manifest = {}
+        if generation is None:
+            index_path, generation = resolve_index_path(self.index_path)
+            if generation is not None:
+                manifest = read_manifest(os.path.dirname(index_path))
+        else:
+            root = os.path.dirname(self.index_path)
+            index_path = os.path.join(generation_path(root, generation), os.path.basename(self.index_path))
+            manifest = read_manifest(os.path.dirname(index_path))
+            if manifest.get('model_name', self.model_name) != self.model_name:
+                raise ValueError(f"generation {generation} was built with {manifest['model_name']}, "
+                                 f"not {self.model_name}")
+        # Legacy indexes and ones built with DEDUP_ENABLED=false still hold copies
+        deduplicated = bool(manifest.get('deduplicated', False))
         try:
             with open(index_path, 'rb') as f:
                 index_data = pickle.load(f)
-            
-            self.index = index_data['index']
-            self.metadata = index_data['metadata']
-            print(f"✅ Loaded FAISS index with {len(self.metadata)} vectors")
+        
+            index = index_data['index']
+            metadata = index_data['metadata']
+            print(f"✅ Loaded FAISS index with {len(metadata)} vectors")
         except FileNotFoundError:
             print(f"❌ Index not found at {index_path}")
             print("Please run embedding generator first")
             raise
-        
-        # Load embedding model
-        print("🔄 Loading embedding model...")
-        self.embedding_model = SentenceTransformer(model_name)
-        print(f"✅ Model loaded: {model_name}")
-        
-    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        except ImportError as e:
+            # A FAISS index pickle on a host without FAISS: search the saved
+            # embeddings with the built-in NumPy index instead
+            print(f"⚠️ Cannot load FAISS index ({e}). Using the built-in NumPy index.")
+            embeddings_path = os.path.join(os.path.dirname(index_path), "kcc_embeddings.pkl")
+            index, metadata = index_from_embeddings(embeddings_path)
+            print(f"✅ Loaded NumPy index with {len(metadata)} vectors")
+
+        if os.getenv("VECTOR_BACKEND", "auto").lower() == "numpy" and not isinstance(index, NumpyFlatIndex):
+            vectors = np.stack([index.reconstruct(i) for i in range(index.ntotal)])
+            index = NumpyFlatIndex(vectors.shape[1])
+            index.add(vectors)
+            print("✅ Using the built-in NumPy index (VECTOR_BACKEND=numpy)")
+
+        if generation:
+            print(f"✅ Index generation {generation}")
+        return _IndexState(index, metadata, self._load_lexical(index_path), generation, deduplicated)
+
+    def _load_lexical(self, index_path):
         """
-        Search for most similar Q&A pairs
+        The BM25 index next to index_path, if hybrid search is on and it exists
+        """
+        bm25_path = os.path.join(os.path.dirname(index_path), "bm25_index.pkl")
+        if not (self.use_hybrid and os.path.exists(bm25_path)):
+            return None
+        lexical_index = BM25Index.load(bm25_path)
+        print(f"✅ Loaded BM25 index with {len(lexical_index.vocab)} terms")
+        return lexical_index
+
+    def reload(self, generation=None):
+        """
+        Load a generation (default: the one CURRENT points at) and swap it
+        in. Searches already running finish on the old generation.
+        """
+        state = self._load_state(generation)
+        previous, self._state = self._state.generation, state
+        print(f"🔄 Swapped index generation {previous} -> {state.generation}")
+        return state.generation
+
+    def _check_for_new_generation(self):
+        """
+        Start a background reload when CURRENT names another generation
+        """
+        if self._reload_interval <= 0 or os.getenv("VECTOR_SHARDS"):
+            return
+        now = time.monotonic()
+        if now - self._last_reload_check < self._reload_interval:
+            return
+        self._last_reload_check = now
+        current = current_generation(os.path.dirname(self.index_path))
+        if current is None or current == self._state.generation:
+            return
+        if not self._reload_lock.acquire(blocking=False):
+            return  # another thread is already loading it
+
+        def load():
+            try:
+                self.reload(current)
+            except Exception as e:
+                print(f"⚠️ Could not swap in index generation {current}: {e}")
+            finally:
+                self._reload_lock.release()
+
+        threading.Thread(target=load, daemon=True).start()
+
+    def search(self, query: str, top_k: int = 5, rerank: bool = None) -> List[Dict[str, Any]]:
+        """
+        Search for most similar Q&A pairs.
+        With re-ranking on, a wider candidate set is fetched from FAISS and
+        the cross-encoder keeps the best top_k above its score threshold.
+        """
+        results, self.last_search_stats = self.search_with_stats(query, top_k, rerank)
+        return results
+
+    def search_with_stats(self, query: str, top_k: int = 5, rerank: bool = None):
+        """
+        search() returning (results, stats) for this call; last_search_stats
+        may already belong to another thread's query
+        """
+        rerank = self.rerank_enabled if rerank is None else (rerank and self.reranker is not None)
+        fetch_k = max(self.rerank_candidates, top_k) if rerank else top_k
+
+        self._check_for_new_generation()
+        state = self._state
+        start_time = time.perf_counter()
+        results = self._retrieve(state, query, fetch_k)
+        search_ms = (time.perf_counter() - start_time) * 1000
+
+        rerank_ms = 0.0
+        candidates = len(results)
+        if rerank:
+            results, rerank_ms = self.reranker.rerank_timed(query, results, top_k)
+
+        stats = {
+            'hybrid': state.lexical_index is not None,
+            'generation': state.generation,
+            'reranked': rerank,
+            'candidates': candidates,
+            'returned': len(results),
+            'search_ms': search_ms,
+            'rerank_ms': rerank_ms
+        }
+        return results, stats
+
+    def _retrieve(self, state, query: str, top_k: int) -> List[Dict[str, Any]]:
+        """
+        Dense search, fused with BM25 via reciprocal-rank fusion when available
+        """
+        if state.lexical_index is None:
+            return self._dense_search(state, query, top_k)[1]
+
+        if hasattr(state.index, 'search_with_candidates'):
+            # Sharded index: the lexical hits' distances come back with the
+            # dense search, within its deadline, instead of a reconstruct each
+            lexical_hits = state.lexical_index.search(query, top_k * state.fetch_factor)
+            query_vec = self.embedding_model.encode(query).astype('float32')
+            distances, indices, found = state.index.search_with_candidates(
+                np.array([query_vec]), top_k * state.fetch_factor, [[int(doc_id) for doc_id, _ in lexical_hits]])
+            dense_results = self._collect_dense(state, distances[0], indices[0], top_k)
+            return self._fuse(state, query_vec, dense_results, lexical_hits, top_k, found[0])
+
+        dense_future = self._executor.submit(self._dense_search, state, query, top_k)
+        lexical_hits = state.lexical_index.search(query, top_k * state.fetch_factor)
+        query_vec, dense_results = dense_future.result()
+        return self._fuse(state, query_vec, dense_results, lexical_hits, top_k)
+
+    def _fuse(self, state, query_vec, dense_results, lexical_hits, top_k: int,
+              candidate_distances=None) -> List[Dict[str, Any]]:
+        """
+        Reciprocal-rank fusion of dense and BM25 hits, deduplicated by answer
+        text unless the index was deduplicated at build time.
+        candidate_distances ({id: distance}) replaces reconstructing
+        lexical-only hits.
+        """
+        by_id = {r['id']: r for r in dense_results}
+        fused = reciprocal_rank_fusion(
+            [[r['id'] for r in dense_results], [doc_id for doc_id, _ in lexical_hits]],
+            k=self.rrf_k
+        )
+        lexical_scores = dict(lexical_hits)
+
+        seen_answers = None if state.deduplicated else set()
+        results = []
+        for idx, rrf_score in fused:
+            if idx >= len(state.metadata):
+                continue
+            if seen_answers is not None:
+                answer = state.metadata[idx]['answer'].strip()
+                if answer in seen_answers:
+                    continue
+                seen_answers.add(answer)
+
+            result = by_id.get(idx)
+            if result is None:
+                # Lexical-only hit: measure its dense distance for a comparable score
+                if candidate_distances is not None:
+                    distance = candidate_distances.get(idx)
+                    if distance is None:
+                        continue  # its shard missed the deadline
+                else:
+                    vec = state.index.reconstruct(int(idx))
+                    distance = float(np.sum((query_vec - vec) ** 2))
+                result = {
+                    'id': idx,
+                    'metadata': state.metadata[idx],
+                    'distance': distance,
+                    'similarity_score': 1 / (1 + distance)
+                }
+            result['bm25_score'] = lexical_scores.get(idx, 0.0)
+            result['rrf_score'] = rrf_score
+            results.append(result)
+
+            if len(results) >= top_k:
+                break
+
+        return results
+
+    def _dense_search(self, state, query: str, top_k: int):
+        """
+        Nearest neighbours from FAISS, deduplicated by answer text unless
+        near-duplicates were collapsed when the index was built.
+        Returns the query vector along with the results.
         """
         # Generate query embedding
         query_vec = self.embedding_model.encode(query).astype('float32')
         
         # Search in FAISS
-        distances, indices = self.index.search(np.array([query_vec]), top_k * 2)
-        
-        # Deduplicate answers
-        seen_answers = set()
+        distances, indices = state.index.search(np.array([query_vec]), top_k * state.fetch_factor)
+        return query_vec, self._collect_dense(state, distances[0], indices[0], top_k)
+
+    def _collect_dense(self, state, distances, indices, top_k: int) -> List[Dict[str, Any]]:
+        """
+        Turn one row of FAISS output into results, deduplicated by answer
+        text unless the index was deduplicated at build time
+        """
+        seen_answers = None if state.deduplicated else set()
         results = []
         
-        for idx in indices[0]:
-            if idx < len(self.metadata):
-                answer = self.metadata[idx]['answer'].strip()
-                if answer not in seen_answers:
+        for pos, idx in enumerate(indices):
+            if 0 <= idx < len(state.metadata):
+                if seen_answers is not None:
+                    answer = state.metadata[idx]['answer'].strip()
+                    if answer in seen_answers:
+                        continue
                     seen_answers.add(answer)
-                    results.append({
-                        'metadata': self.metadata[idx],
-                        'distance': float(distances[0][len(results)]),
-                        'similarity_score': 1 / (1 + float(distances[0][len(results)]))
-                    })
+                distance = float(distances[pos])
+                results.append({
+                    'id': int(idx),
+                    'metadata': state.metadata[idx],
+                    'distance': distance,
+                    'similarity_score': 1 / (1 + distance)
+                })
             
             if len(results) >= top_k:
                 break
         
         return results
+
+    def search_batch(self, queries: List[str], top_k: int = 5, rerank: bool = None,
+                     batch_size: int = 64) -> List[List[Dict[str, Any]]]:
+        """
+        Search many queries at once: one batched embedding pass and one FAISS
+        search for all of them, then per-query BM25 fusion and re-ranking as in search()
+        """
+        if not queries:
+            return []
+        rerank = self.rerank_enabled if rerank is None else (rerank and self.reranker is not None)
+        fetch_k = max(self.rerank_candidates, top_k) if rerank else top_k
+
+        self._check_for_new_generation()
+        state = self._state
+        query_vecs = self.embedding_model.encode(list(queries), batch_size=batch_size).astype('float32')
+        lexical = None
+        if state.lexical_index is not None:
+            lexical = [state.lexical_index.search(query, fetch_k * state.fetch_factor) for query in queries]
+        found = None
+        if lexical is not None and hasattr(state.index, 'search_with_candidates'):
+            distances, indices, found = state.index.search_with_candidates(
+                query_vecs, fetch_k * state.fetch_factor, [[int(doc_id) for doc_id, _ in hits] for hits in lexical])
+        else:
+            distances, indices = state.index.search(query_vecs, fetch_k * state.fetch_factor)
+
+        batch_results = []
+        for i, query in enumerate(queries):
+            results = self._collect_dense(state, distances[i], indices[i], fetch_k)
+            if lexical is not None:
+                results = self._fuse(state, query_vecs[i], results, lexical[i], fetch_k,
+                                     found[i] if found is not None else None)
+            if rerank:
+                results = self.reranker.rerank(query, results, top_k)
+            batch_results.append(results)
+        return batch_results
     
     def format_context(self, results: List[Dict[str, Any]]) -> str:
         """
@@ -153,6 +483,8 @@ if __name__ == "__main__":
         for i, result in enumerate(results, 1):
             print(f"\n  {i}. [{result['similarity_score']:.2f}] {result['metadata']['question'][:60]}...")
             print(f"     Crop: {result['metadata']['crop']}")
+        stats = engine.last_search_stats
+        print(f"  Candidates: {stats['candidates']} | Re-rank: {stats['rerank_ms']:.1f} ms")
         
         # Show offline answer format
         print("\n  📋 Offline answer preview:")
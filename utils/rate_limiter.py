@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Rate Limiter for KrishiSahay
+Token bucket shared by the background jobs that call rate-limited APIs
+(weather prefetch, answer pre-generation).
+"""
+
+import threading
+import time
+
+
+class RateLimiter:
+    def __init__(self, rate_per_sec):
+        """
+        Token bucket allowing rate_per_sec calls per second (burst of one second)
+        """
+        self.rate = rate_per_sec
+        self.tokens = rate_per_sec
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
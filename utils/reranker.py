@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Cross-Encoder Re-ranker for KrishiSahay
+Re-scores FAISS candidates with a small CPU cross-encoder so that only
+the strongest matches reach the LLM prompt
+"""
+
+import os
+import time
+from typing import List, Dict, Any
+
+from sentence_transformers import CrossEncoder
+
+DEFAULT_RERANK_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+
+class CrossEncoderReranker:
+    def __init__(self, model_name=None, min_score=None, max_chars=None):
+        """
+        Load the cross-encoder model (multilingual, runs on CPU)
+        """
+        self.model_name = model_name or os.getenv("RERANK_MODEL", DEFAULT_RERANK_MODEL)
+        self.min_score = float(min_score if min_score is not None else os.getenv("RERANK_MIN_SCORE", "0.0"))
+        # Passages are truncated so one batched call stays cheap on CPU
+        self.max_chars = int(max_chars if max_chars is not None else os.getenv("RERANK_MAX_CHARS", "512"))
+
+        print(f"🔄 Loading re-ranking model: {self.model_name}...")
+        self.model = CrossEncoder(self.model_name, device="cpu")
+        print(f"✅ Re-ranker loaded: {self.model_name}")
+
+    def _passage(self, meta: Dict[str, Any]) -> str:
+        return f"{meta['question']} {meta['answer']}"[:self.max_chars]
+
+    def rerank(self, query: str, results: List[Dict[str, Any]], top_k: int = 3) -> List[Dict[str, Any]]:
+        """
+        Re-score candidates in a single batch and keep the top_k above min_score
+        """
+        return self.rerank_timed(query, results, top_k)[0]
+
+    def rerank_timed(self, query: str, results: List[Dict[str, Any]], top_k: int = 3):
+        """
+        rerank() plus the scoring latency of this call in ms, as (results, latency_ms).
+        The best candidate is always kept: mmarco logits are often negative
+        even for relevant passages, and an empty context is worse than a weak one.
+        """
+        if not results:
+            return [], 0.0
+
+        start_time = time.perf_counter()
+        pairs = [(query, self._passage(r['metadata'])) for r in results]
+        scores = self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+        latency_ms = (time.perf_counter() - start_time) * 1000
+
+        for result, score in zip(results, scores):
+            result['rerank_score'] = float(score)
+
+        ranked = sorted(results, key=lambda r: r['rerank_score'], reverse=True)
+        kept = ranked[:1] + [r for r in ranked[1:] if r['rerank_score'] >= self.min_score]
+        return kept[:top_k], latency_ms
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Retrieval Client for KrishiSahay
+Drop-in stand-in for RAGEngine that forwards to retrieval_server.py, so
+app workers hold no model or index. Keep-alive connections are kept per
+thread.
+
+get_retriever() returns a RetrievalClient when RETRIEVAL_URL is set
+(http://host:port or unix:///path.sock) and an in-process RAGEngine
+otherwise.
+"""
+
+import http.client
+import json
+import os
+import socket
+import threading
+from urllib.parse import urlparse
+
+
+class RetrievalError(RuntimeError):
+    pass
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class RetrievalClient:
+    def __init__(self, url=None, timeout=None):
+        self.url = url or os.getenv("RETRIEVAL_URL", "http://127.0.0.1:8765")
+        self.timeout = float(timeout or os.getenv("RETRIEVAL_TIMEOUT", "10"))
+        self._local = threading.local()
+        # (generation, metadata) from the last /metadata call
+        self._metadata = None
+        self.last_search_stats = {}
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            parsed = urlparse(self.url)
+            if parsed.scheme == "unix":
+                conn = _UnixHTTPConnection(parsed.path, self.timeout)
+            else:
+                conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _request(self, method, path, body=None, timeout=None):
+        """
+        timeout (seconds) overrides the client timeout for this call only
+        """
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        # One retry on a fresh connection, for keep-alive sockets the server closed
+        for attempt in range(2):
+            conn = self._connection()
+            conn.timeout = self.timeout if timeout is None else timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(conn.timeout)
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                response = conn.getresponse()
+                payload = json.loads(response.read() or b"{}")
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                conn.close()
+                self._local.conn = None
+                # A timeout is the server being slow, not a stale socket: don't retry
+                if attempt == 1 or isinstance(e, TimeoutError):
+                    raise RetrievalError(f"Retrieval server unreachable at {self.url}: {e}") from e
+                continue
+            if response.status != 200:
+                raise RetrievalError(f"{path}: {response.status} {payload.get('error', '')}")
+            return payload
+
+    def search(self, query, top_k=5, rerank=None):
+        results, self.last_search_stats = self.search_with_stats(query, top_k, rerank)
+        return results
+
+    def search_with_stats(self, query, top_k=5, rerank=None):
+        payload = self._request("POST", "/search", {"query": query, "top_k": top_k, "rerank": rerank})
+        return payload["results"], payload.get("stats", {})
+
+    def search_batch(self, queries, top_k=5, rerank=None):
+        return self._request("POST", "/search_batch",
+                             {"queries": list(queries), "top_k": top_k, "rerank": rerank})["results"]
+
+    def hybrid_search(self, query, crop_filter=None, category_filter=None, top_k=5):
+        return self._request("POST", "/hybrid_search", {"query": query, "crop": crop_filter,
+                                                        "category": category_filter, "top_k": top_k})["results"]
+
+    def get_offline_answer(self, query, top_k=3):
+        return self._request("POST", "/offline_answer", {"query": query, "top_k": top_k})["answer"]
+
+    @property
+    def generation(self):
+        return self.health().get("generation")
+
+    @property
+    def metadata(self):
+        # Cached per index generation; the server hot-swaps to new ones
+        cached = self._metadata
+        if cached is None or cached[0] != self.generation:
+            payload = self._request("GET", "/metadata")
+            cached = self._metadata = (payload.get("generation"), payload["metadata"])
+        return cached[1]
+
+    def health(self):
+        return self._request("GET", "/health")
+
+
+def get_retriever():
+    """
+    RetrievalClient if RETRIEVAL_URL is set, else an in-process RAGEngine
+    """
+    if os.getenv("RETRIEVAL_URL"):
+        client = RetrievalClient()
+        print(f"✅ Using retrieval server at {client.url}")
+        return client
+    from rag_engine import RAGEngine
+    return RAGEngine()
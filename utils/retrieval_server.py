@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Retrieval Server for KrishiSahay
+One process per host owns the embedding model and the index and serves
+retrieval over HTTP (TCP or a local Unix socket), so Streamlit and Flask
+workers use the thin RetrievalClient instead of each loading a
+transformer model.
+
+Endpoints (JSON):
+    GET  /health
+    GET  /metadata
+    POST /search           {"query", "top_k", "rerank"}
+    POST /search_batch     {"queries", "top_k", "rerank"}
+    POST /hybrid_search    {"query", "crop", "category", "top_k"}
+    POST /offline_answer   {"query", "top_k"}
+
+Usage:
+    python utils/retrieval_server.py --port 8765
+    python utils/retrieval_server.py --socket /tmp/krishisahay-retrieval.sock
+
+and point the apps at it with RETRIEVAL_URL=http://127.0.0.1:8765 or
+RETRIEVAL_URL=unix:///tmp/krishisahay-retrieval.sock
+"""
+
+import argparse
+import json
+import os
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def _to_json(value):
+    # NumPy scalars/arrays inside results (scores, vectors)
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Not JSON serialisable: {type(value)}")
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ("local", 0)
+
+
+class RetrievalServer:
+    def __init__(self, engine, host="127.0.0.1", port=8765, socket_path=None):
+        self.engine = engine
+        self.started_at = time.time()
+        self.requests = 0
+        self._lock = threading.Lock()
+        handler = self._handler()
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            self.httpd = ThreadingUnixHTTPServer(socket_path, handler)
+            self.address = f"unix://{socket_path}"
+        else:
+            self.httpd = ThreadingHTTPServer((host, port), handler)
+            self.httpd.daemon_threads = True
+            self.address = "http://%s:%d" % self.httpd.server_address[:2]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def dispatch(self, path, body):
+        engine = self.engine
+        top_k = int(body.get("top_k", 5))
+        if path == "/search":
+            results, stats = engine.search_with_stats(body["query"], top_k=top_k, rerank=body.get("rerank"))
+            return {"results": results, "stats": stats}
+        if path == "/search_batch":
+            return {"results": engine.search_batch(body["queries"], top_k=top_k, rerank=body.get("rerank"))}
+        if path == "/hybrid_search":
+            return {"results": engine.hybrid_search(body["query"], crop_filter=body.get("crop"),
+                                                    category_filter=body.get("category"), top_k=top_k)}
+        if path == "/offline_answer":
+            return {"answer": engine.get_offline_answer(body["query"], top_k=int(body.get("top_k", 3)))}
+        return None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive for the pooled client
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body):
+                data = json.dumps(body, ensure_ascii=False, default=_to_json).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client gave up (e.g. a shard call past its deadline)
+
+            def do_GET(self):
+                if self.path == "/health":
+                    return self._send(200, {"status": "ok",
+                                            "vectors": server.engine.index.ntotal,
+                                            "generation": getattr(server.engine, "generation", None),
+                                            "requests": server.requests,
+                                            "uptime_s": time.time() - server.started_at})
+                if self.path == "/metadata":
+                    # Generation read first: across a hot swap the label is at
+                    # worst older than the metadata, so clients refetch
+                    generation = getattr(server.engine, "generation", None)
+                    return self._send(200, {"metadata": server.engine.metadata, "generation": generation})
+                self._send(404, {"error": f"unknown path {self.path}"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    return self._send(400, {"error": "invalid JSON"})
+                with server._lock:
+                    server.requests += 1
+                try:
+                    response = server.dispatch(self.path, body)
+                except KeyError as e:
+                    return self._send(400, {"error": f"missing field {e}"})
+                except Exception as e:
+                    print(f"❌ {self.path}: {e}")
+                    return self._send(500, {"error": str(e)})
+                if response is None:
+                    return self._send(404, {"error": f"unknown path {self.path}"})
+                self._send(200, response)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve KCC retrieval to the app front-ends")
+    parser.add_argument("--host", default=os.getenv("RETRIEVAL_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("RETRIEVAL_PORT", "8765")))
+    parser.add_argument("--socket", default=None, help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--index", default="embeddings/faiss_index.pkl")
+    args = parser.parse_args()
+
+    from rag_engine import RAGEngine
+    engine = RAGEngine(index_path=args.index)
+    # Warm the model so the first farmer's query doesn't pay for it
+    engine.search("warmup", top_k=1)
+
+    server = RetrievalServer(engine, args.host, args.port, args.socket)
+    print(f"✅ Retrieval server listening on {server.address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Sharded Vector Index for KrishiSahay
+The corpus is partitioned into N shards, by document hash or by a
+metadata field such as language or crop, each with its own flat L2
+index. Every shard can be served by a separate process or node.
+ShardedIndex is the coordinator: it has the FAISS index interface
+RAGEngine uses, queries all shards in parallel and merges their top-k by
+distance, deduplicating ids. Shards that miss the deadline
+(SHARD_DEADLINE seconds) are skipped, so one slow shard degrades recall
+instead of latency. Each shard has its own workers with at most
+SHARD_MAX_INFLIGHT calls outstanding, so a stuck shard cannot hold up
+the others, and remote calls time out at the deadline.
+
+Usage:
+    python utils/sharded_index.py build --shards 4 --by hash
+    python utils/sharded_index.py serve --shard 0 --port 8801
+    python utils/sharded_index.py check            # multi-process test on this box
+
+RAGEngine uses the shards when VECTOR_SHARDS points at a manifest.json,
+querying shard servers listed in SHARD_URLS or, without it, shards loaded
+in-process.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import subprocess
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+
+from retrieval_client import RetrievalClient
+from retrieval_server import RetrievalServer
+from vector_index import build_flat_index
+
+# Metadata fields that can decide a document's shard
+SHARD_FIELDS = ("language", "crop", "category")
+
+
+def _stable_hash(value):
+    return int.from_bytes(hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def assign_shards(metadata, n_shards, by="hash"):
+    """
+    Shard number per document: by="hash" spreads documents evenly,
+    by=<field> keeps documents with the same field value together
+    """
+    if by == "hash":
+        return np.array([_stable_hash(i) % n_shards for i in range(len(metadata))], dtype=np.int32)
+    if by not in SHARD_FIELDS:
+        raise ValueError(f"Unknown shard key '{by}' (use hash or one of {', '.join(SHARD_FIELDS)})")
+    return np.array([_stable_hash(meta.get(by, "")) % n_shards for meta in metadata], dtype=np.int32)
+
+
+def build_shards(embeddings, metadata, n_shards, output_dir, by="hash"):
+    """
+    Write shard_<i>.pkl files, the global metadata, the owner of every
+    document and manifest.json to output_dir; returns the manifest path
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    owners = assign_shards(metadata, n_shards, by)
+
+    shard_files = []
+    for shard in range(n_shards):
+        ids = np.flatnonzero(owners == shard).astype(np.int64)
+        index, backend = build_flat_index(embeddings[ids], os.path.join(output_dir, f"shard_{shard}.vectors.npy"))
+        shard_file = f"shard_{shard}.pkl"
+        with open(os.path.join(output_dir, shard_file), 'wb') as f:
+            pickle.dump({'index': index, 'ids': ids, 'shard': shard, 'backend': backend}, f)
+        shard_files.append(shard_file)
+        print(f"   Shard {shard}: {len(ids)} vectors ({backend})")
+
+    np.save(os.path.join(output_dir, "owners.npy"), owners)
+    with open(os.path.join(output_dir, "metadata.pkl"), 'wb') as f:
+        pickle.dump(metadata, f)
+    manifest = {
+        'shards': shard_files,
+        'by': by,
+        'num_vectors': len(metadata),
+        'dimension': int(embeddings.shape[1]),
+        'owners': "owners.npy",
+        'metadata': "metadata.pkl",
+        'created_at': time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+    manifest_path = os.path.join(output_dir, "manifest.json")
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"✅ {n_shards} shards by {by} written to {output_dir}")
+    return manifest_path
+
+
+class LocalShard:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        self.index = data['index']
+        self.ids = data['ids']
+        self.shard = data['shard']
+
+    def knn(self, vectors, k, candidates=None, deadline_at=None):
+        """
+        Top-k of this shard with global document ids (-1 for padding), and
+        per query row a {global id: distance} dict for the candidate ids
+        (one list per row) that this shard owns
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        extra = [self._candidate_distances(vec, ids) for vec, ids in zip(vectors, candidates or [[]] * len(vectors))]
+        if len(self.ids) == 0:
+            return (np.full((len(vectors), k), np.inf, dtype=np.float32),
+                    np.full((len(vectors), k), -1, dtype=np.int64), extra)
+        distances, local = self.index.search(vectors, k)
+        return distances, np.where(local >= 0, self.ids[np.maximum(local, 0)], -1), extra
+
+    def _candidate_distances(self, vector, global_ids):
+        distances = {}
+        for global_id in global_ids:
+            pos = int(np.searchsorted(self.ids, global_id))
+            if pos < len(self.ids) and self.ids[pos] == global_id:
+                distances[int(global_id)] = float(np.sum((vector - self.index.reconstruct(pos)) ** 2))
+        return distances
+
+    def reconstruct(self, global_id):
+        return self.index.reconstruct(int(np.searchsorted(self.ids, global_id)))
+
+
+class RemoteShard(RetrievalClient):
+    """A shard served by another process or node (ShardServer)"""
+
+    def knn(self, vectors, k, candidates=None, deadline_at=None):
+        # Give up when the coordinator stops waiting, not after RETRIEVAL_TIMEOUT
+        timeout = None if deadline_at is None else max(0.01, deadline_at - time.monotonic())
+        payload = self._request("POST", "/knn", {"vectors": np.asarray(vectors).tolist(), "k": k,
+                                                 "candidates": candidates}, timeout=timeout)
+        extra = [{int(doc_id): distance for doc_id, distance in row} for row in payload["extra"]]
+        return (np.array(payload["distances"], dtype=np.float32).reshape(-1, k),
+                np.array(payload["ids"], dtype=np.int64).reshape(-1, k), extra)
+
+    def reconstruct(self, global_id):
+        return np.array(self._request("POST", "/reconstruct", {"id": int(global_id)})["vector"], dtype=np.float32)
+
+
+class ShardServer(RetrievalServer):
+    """Serves one LocalShard: /knn with query vectors, /reconstruct by global id"""
+
+    def __init__(self, shard, host="127.0.0.1", port=0, socket_path=None, delay=0.0):
+        super().__init__(shard, host, port, socket_path)
+        self.delay = delay  # simulated slowness, for deadline tests
+
+    def dispatch(self, path, body):
+        if self.delay:
+            time.sleep(self.delay)
+        if path == "/knn":
+            distances, ids, extra = self.engine.knn(np.array(body["vectors"], dtype=np.float32), int(body["k"]),
+                                                    body.get("candidates"))
+            return {"distances": distances, "ids": ids, "extra": [list(row.items()) for row in extra]}
+        if path == "/reconstruct":
+            return {"vector": self.engine.reconstruct(int(body["id"]))}
+        return None
+
+
+class ShardedIndex:
+    def __init__(self, shards, dimension, owners, deadline=None, max_inflight=None):
+        self.shards = shards
+        self.d = dimension
+        self.owners = owners
+        self.deadline = float(deadline or os.getenv("SHARD_DEADLINE", "2.0"))
+        # Per-shard workers: a slow shard only ever ties up its own
+        self.max_inflight = int(max_inflight or os.getenv("SHARD_MAX_INFLIGHT", "4"))
+        self._executors = [ThreadPoolExecutor(max_workers=self.max_inflight) for _ in shards]
+        self._inflight = [threading.BoundedSemaphore(self.max_inflight) for _ in shards]
+        self.last_search_stats = {}
+
+    @property
+    def ntotal(self):
+        return len(self.owners)
+
+    def _call_shard(self, shard_no, *args):
+        try:
+            return self.shards[shard_no].knn(*args)
+        finally:
+            self._inflight[shard_no].release()
+
+    def search(self, x, k):
+        """
+        Scatter the queries to every shard, gather what arrives before the
+        deadline and merge into (distances, ids) like IndexFlatL2.search
+        """
+        distances, indices, _ = self.search_with_candidates(x, k)
+        return distances, indices
+
+    def search_with_candidates(self, x, k, candidates=None):
+        """
+        search() that also returns, per query row, a {id: distance} dict for
+        the given candidate ids (one list per row) in the same round trip.
+        Candidates owned by a shard that missed the deadline are absent.
+        """
+        x = np.asarray(x, dtype=np.float32).reshape(-1, self.d)
+        start_time = time.perf_counter()
+        deadline_at = time.monotonic() + self.deadline
+        futures, shard_order, busy = [], [], 0
+        for shard_no in range(len(self.shards)):
+            if not self._inflight[shard_no].acquire(blocking=False):
+                busy += 1  # still stuck on earlier queries; don't queue behind them
+                continue
+            try:
+                futures.append(self._executors[shard_no].submit(self._call_shard, shard_no, x, k,
+                                                                candidates, deadline_at))
+                shard_order.append(shard_no)
+            except Exception:
+                self._inflight[shard_no].release()
+                raise
+        done, late = wait(futures, timeout=self.deadline)
+
+        parts, failed = [], 0
+        for future in done:
+            try:
+                parts.append(future.result())
+            except Exception as e:
+                failed += 1
+                print(f"⚠️ Shard search failed: {e}")
+        for future, shard_no in zip(futures, shard_order):
+            if future in late and future.cancel():
+                self._inflight[shard_no].release()  # never started, so _call_shard won't release
+
+        candidate_distances = [{} for _ in range(len(x))]
+        for _, _, extra in parts:
+            for row, found in zip(candidate_distances, extra):
+                row.update(found)
+
+        distances = np.full((len(x), k), np.inf, dtype=np.float32)
+        indices = np.full((len(x), k), -1, dtype=np.int64)
+        if parts:
+            all_d = np.concatenate([d for d, _, _ in parts], axis=1)
+            all_i = np.concatenate([i for _, i, _ in parts], axis=1)
+            order = np.argsort(all_d, axis=1, kind='stable')
+            for row in range(len(x)):
+                seen = set()
+                out = 0
+                for col in order[row]:
+                    doc_id = int(all_i[row, col])
+                    if doc_id < 0 or doc_id in seen:
+                        continue
+                    seen.add(doc_id)
+                    distances[row, out] = all_d[row, col]
+                    indices[row, out] = doc_id
+                    out += 1
+                    if out == k:
+                        break
+
+        self.last_search_stats = {
+            'shards': len(self.shards), 'answered': len(parts), 'late': len(late) + busy, 'failed': failed,
+            'partial': len(parts) < len(self.shards), 'ms': 1000 * (time.perf_counter() - start_time)
+        }
+        if late or busy:
+            print(f"⚠️ {len(late) + busy} shard(s) missed the {self.deadline}s deadline; results are partial")
+        return distances, indices, candidate_distances
+
+    def reconstruct(self, i):
+        return self.shards[int(self.owners[i])].reconstruct(int(i))
+
+
+def load_sharded_index(manifest_path, urls=None, deadline=None):
+    """
+    (ShardedIndex, metadata) from a manifest; urls (or SHARD_URLS, comma
+    separated, one per shard in order) selects remote shard servers
+    """
+    base = os.path.dirname(manifest_path)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if urls is None:
+        urls = [u.strip() for u in os.getenv("SHARD_URLS", "").split(",") if u.strip()]
+    if urls:
+        if len(urls) != len(manifest['shards']):
+            raise ValueError(f"{len(urls)} shard URLs for {len(manifest['shards'])} shards")
+        shards = [RemoteShard(url) for url in urls]
+    else:
+        shards = [LocalShard(os.path.join(base, name)) for name in manifest['shards']]
+    owners = np.load(os.path.join(base, manifest['owners']))
+    with open(os.path.join(base, manifest['metadata']), 'rb') as f:
+        metadata = pickle.load(f)
+    return ShardedIndex(shards, manifest['dimension'], owners, deadline), metadata
+
+
+def _check(args):
+    """
+    Start one server process per shard, compare scatter-gather against a
+    brute-force search, then slow one shard down past the deadline
+    """
+    from vector_index import index_from_embeddings
+
+    with open(args.manifest) as f:
+        n_shards = len(json.load(f)['shards'])
+    reference, _ = index_from_embeddings(args.embeddings)
+
+    def start_servers(slow_shard=None):
+        procs, urls = [], []
+        for shard in range(n_shards):
+            port = args.base_port + shard
+            cmd = [sys.executable, os.path.abspath(__file__), "serve", "--manifest", args.manifest,
+                   "--shard", str(shard), "--port", str(port)]
+            if shard == slow_shard:
+                cmd += ["--delay", str(args.deadline * 3)]
+            procs.append(subprocess.Popen(cmd, stdout=subprocess.DEVNULL))
+            urls.append(f"http://127.0.0.1:{port}")
+        for url in urls:
+            for _ in range(100):
+                try:
+                    RetrievalClient(url, timeout=1).health()
+                    break
+                except Exception:
+                    time.sleep(0.1)
+        return procs, urls
+
+    def stop_servers(procs):
+        for proc in procs:
+            proc.terminate()
+            proc.wait()
+
+    rng = np.random.default_rng(0)
+    queries = np.stack([reference.reconstruct(int(i)) for i in rng.integers(0, reference.ntotal, 20)])
+    queries += 0.01 * rng.standard_normal(queries.shape).astype(np.float32)
+    k = min(5, reference.ntotal)
+    expected_d, expected_i = reference.search(queries, k)
+
+    checks = []
+    procs, urls = start_servers()
+    try:
+        index, _ = load_sharded_index(args.manifest, urls, deadline=args.deadline)
+        got_d, got_i = index.search(queries, k)
+        checks.append(("scatter-gather matches brute force", np.array_equal(got_i, expected_i)
+                       and np.allclose(got_d, expected_d, atol=1e-4)))
+        candidates = [[int(expected_i[0, -1]), 3]]
+        _, _, found = index.search_with_candidates(queries[:1], k, candidates)
+        exact = {i: float(np.sum((queries[0] - reference.reconstruct(i)) ** 2)) for i in candidates[0]}
+        checks.append(("candidate distances in the same round trip",
+                       found[0].keys() == exact.keys()
+                       and all(abs(found[0][i] - exact[i]) < 1e-4 for i in exact)))
+        checks.append(("reconstruct routes to owner", np.allclose(index.reconstruct(3), reference.reconstruct(3))))
+    finally:
+        stop_servers(procs)
+
+    procs, urls = start_servers(slow_shard=0)
+    try:
+        index, _ = load_sharded_index(args.manifest, urls, deadline=args.deadline)
+        start = time.perf_counter()
+        index.search(queries, k)
+        elapsed = time.perf_counter() - start
+        stats = index.last_search_stats
+        checks.append(("slow shard skipped at deadline",
+                       stats['answered'] == n_shards - 1 and elapsed < args.deadline + 0.5))
+        # More queries than the slow shard's in-flight cap: the healthy shards must keep answering
+        answered = []
+        for _ in range(index.max_inflight + 2):
+            index.search(queries[:1], k)
+            answered.append(index.last_search_stats['answered'])
+        checks.append(("healthy shards unaffected by a stuck one", min(answered) == n_shards - 1))
+    finally:
+        stop_servers(procs)
+
+    for name, ok in checks:
+        print(f"{'✅' if ok else '❌'} {name}")
+    return all(ok for _, ok in checks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, serve and check a sharded vector index")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="partition kcc_embeddings.pkl into shards")
+    build.add_argument("--shards", type=int, default=4)
+    build.add_argument("--by", default="hash", help="hash, language, crop or category")
+    build.add_argument("--embeddings", default="embeddings/kcc_embeddings.pkl")
+    build.add_argument("--out", default="embeddings/shards")
+
+    serve = sub.add_parser("serve", help="serve one shard")
+    serve.add_argument("--manifest", default="embeddings/shards/manifest.json")
+    serve.add_argument("--shard", type=int, required=True)
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8801)
+    serve.add_argument("--socket", default=None)
+    serve.add_argument("--delay", type=float, default=0.0, help="simulate a slow shard")
+
+    check = sub.add_parser("check", help="multi-process scatter-gather test")
+    check.add_argument("--manifest", default="embeddings/shards/manifest.json")
+    check.add_argument("--embeddings", default="embeddings/kcc_embeddings.pkl")
+    check.add_argument("--base-port", type=int, default=8801)
+    check.add_argument("--deadline", type=float, default=0.5)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        with open(args.embeddings, 'rb') as f:
+            records = pickle.load(f)
+        embeddings = np.stack([np.asarray(r['embedding'], dtype=np.float32) for r in records])
+        build_shards(embeddings, [r['metadata'] for r in records], args.shards, args.out, args.by)
+    elif args.command == "serve":
+        with open(args.manifest) as f:
+            shard_file = json.load(f)['shards'][args.shard]
+        shard = LocalShard(os.path.join(os.path.dirname(args.manifest), shard_file))
+        server = ShardServer(shard, args.host, args.port, args.socket, delay=args.delay)
+        print(f"✅ Shard {args.shard} ({shard.index.ntotal} vectors) listening on {server.address}")
+        server.serve_forever()
+    else:
+        sys.exit(0 if _check(args) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Single-flight Request Coalescing for KrishiSahay
+Concurrent calls with the same key share one in-flight computation: the
+first caller runs it, later callers wait and receive the same result (or
+exception). During an outbreak, hundreds of identical questions then cost
+one embedding, one search and one LLM call.
+"""
+
+import threading
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'interrupted', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.interrupted = False
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'executed': 0, 'coalesced': 0, 'max_waiters': 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) unless a call with this key is already in
+        flight, in which case wait for and return its result
+        """
+        return self.do_shared(key, fn, *args, **kwargs)[0]
+
+    def do_shared(self, key, fn, *args, **kwargs):
+        """
+        Like do(), but returns (result, shared): shared is True when this
+        caller received another caller's result
+        """
+        with self._lock:
+            self.stats['calls'] += 1
+        waited = False
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self.stats['executed'] += 1
+                    if waited:
+                        self.stats['coalesced'] -= 1
+                else:
+                    call.waiters += 1
+                    if not waited:
+                        self.stats['coalesced'] += 1
+                    self.stats['max_waiters'] = max(self.stats['max_waiters'], call.waiters)
+            if leader:
+                break
+            call.done.wait()
+            waited = True
+            if call.interrupted:
+                # The leader never finished; run (or join) the call afresh
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result, False
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException:
+            # e.g. a Streamlit rerun stopped the leader's script; that is
+            # not the waiters' exception, and they have no result yet
+            call.interrupted = True
+            raise
+        finally:
+            # Later arrivals start a fresh call rather than reuse this result
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['in_flight'] = len(self._calls)
+        stats['coalesced_rate'] = stats['coalesced'] / stats['calls'] if stats['calls'] else 0.0
+        return stats
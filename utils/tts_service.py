@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Text-to-Speech Service for KrishiSahay
+Synthesised answers are cached on disk by (text hash, language) with a
+size-bounded least-recently-used eviction, so a repeat Listen is served
+from a file instead of another synthesis.
+
+Speech comes from pluggable backends (TTS_BACKEND):
+    pyttsx3  offline, local espeak-ng / SAPI5 / NSSpeech voices (WAV)
+    gtts     Google Translate TTS, needs network (MP3)
+    auto     offline first, falling back to gTTS when no local voice
+             speaks the language or synthesis fails (default)
+
+Answers are split into sentences and synthesised sentence by sentence,
+so playback can start as soon as the first sentence is ready; the
+sentence files are then joined into one file for the whole answer. Answers
+can be pre-synthesised in the background as soon as they are generated;
+a Listen click that races the background job waits for it rather than
+synthesising the same sentence twice.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+# gTTS language codes for the app's UI languages
+LANG_MAP = {
+    'en': 'en', 'hi': 'hi', 'te': 'te', 'ta': 'ta', 'kn': 'kn',
+    'ml': 'ml', 'bn': 'bn', 'mr': 'mr', 'gu': 'gu',
+    'pa': 'pa', 'or': 'or', 'as': 'as'
+}
+
+MIME_TYPES = {'mp3': 'audio/mp3', 'wav': 'audio/wav'}
+
+# Sentence ends in Latin and Indic scripts (danda, double danda)
+SENTENCE_END = re.compile(r"(?<=[.!?।॥])\s+|\n+")
+
+
+def split_sentences(text, min_chars=40):
+    """
+    Split text into sentences, merging very short ones into the next
+    so each segment is worth a synthesis call
+    """
+    segments, buffer = [], ""
+    for part in SENTENCE_END.split(text.strip()):
+        part = part.strip()
+        if not part:
+            continue
+        buffer = f"{buffer} {part}".strip()
+        if len(buffer) >= min_chars:
+            segments.append(buffer)
+            buffer = ""
+    if buffer:
+        segments.append(buffer)
+    return segments
+
+
+def mime_type(path):
+    return MIME_TYPES.get(path.rsplit(".", 1)[-1], 'audio/mpeg')
+
+
+def concat_audio(paths, output, ext):
+    """
+    Write the audio files in paths (all of format ext) back to back into output
+    """
+    if ext == "wav":
+        with wave.open(output, "wb") as out:
+            params = None
+            for path in paths:
+                with wave.open(path, "rb") as part:
+                    if params is None:
+                        params = part.getparams()[:3]
+                        out.setparams(part.getparams())
+                    elif part.getparams()[:3] != params:
+                        raise ValueError("WAV segments differ in channels, sample width or rate")
+                    out.writeframes(part.readframes(part.getnframes()))
+    else:
+        # MP3 is a stream of self-contained frames; files play back to back
+        with open(output, "wb") as out:
+            for path in paths:
+                with open(path, "rb") as part:
+                    shutil.copyfileobj(part, out)
+
+
+class TTSBackend:
+    """Base class: synthesise text in lang into an audio file at path"""
+    name = "base"
+    ext = "mp3"
+
+    def supports(self, lang):
+        return True
+
+    def synthesize(self, text, lang, path):
+        raise NotImplementedError
+
+
+class GTTSBackend(TTSBackend):
+    name = "gtts"
+    ext = "mp3"
+
+    def synthesize(self, text, lang, path):
+        from gtts import gTTS
+        gTTS(text=text, lang=LANG_MAP.get(lang, 'hi'), slow=False).save(path)
+
+
+class Pyttsx3Backend(TTSBackend):
+    name = "pyttsx3"
+    ext = "wav"
+
+    def __init__(self, rate=None):
+        self.rate = int(rate or os.getenv("TTS_RATE", "160"))
+        self._engine = None
+        self._voices = None
+        self._unavailable = False
+        # pyttsx3 engines are not thread-safe; one utterance at a time
+        self._lock = threading.Lock()
+
+    def _get_engine(self):
+        if self._engine is None:
+            import pyttsx3
+            self._engine = pyttsx3.init()
+            self._engine.setProperty('rate', self.rate)
+            self._voices = self._engine.getProperty('voices')
+        return self._engine
+
+    def _voice_for(self, lang):
+        for voice in self._voices or []:
+            languages = [l.decode(errors="ignore") if isinstance(l, bytes) else str(l)
+                         for l in (voice.languages or [])]
+            if any(l.strip("\x05").split("-")[0].split("_")[0] == lang for l in languages):
+                return voice.id
+            if voice.id.rsplit("/", 1)[-1].split("-")[0] == lang:
+                return voice.id
+        return None
+
+    def supports(self, lang):
+        if self._unavailable:
+            return False
+        try:
+            with self._lock:
+                self._get_engine()
+                return self._voice_for(lang) is not None
+        except Exception:
+            # No pyttsx3 / speech engine on this host; stop trying
+            self._unavailable = True
+            return False
+
+    def synthesize(self, text, lang, path):
+        with self._lock:
+            engine = self._get_engine()
+            voice = self._voice_for(lang)
+            if voice is None:
+                raise ValueError(f"No local voice for '{lang}'")
+            engine.setProperty('voice', voice)
+            engine.save_to_file(text, path)
+            engine.runAndWait()
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            raise RuntimeError("pyttsx3 produced no audio")
+
+
+BACKENDS = {
+    "gtts": GTTSBackend,
+    "pyttsx3": Pyttsx3Backend,
+}
+
+
+def create_backends(spec=None):
+    """
+    TTS_BACKEND "auto" -> [pyttsx3, gtts]; a single name -> [that backend]
+    """
+    spec = (spec or os.getenv("TTS_BACKEND", "auto")).lower()
+    names = ["pyttsx3", "gtts"] if spec == "auto" else [spec]
+    return [BACKENDS[name]() for name in names]
+
+
+class TTSCache:
+    def __init__(self, cache_dir=None, max_bytes=None):
+        """
+        Audio files in cache_dir, evicting least recently played files
+        once their total size exceeds max_bytes
+        """
+        self.cache_dir = cache_dir or os.getenv("TTS_CACHE_DIR", "cache/tts")
+        self.max_bytes = int(max_bytes or float(os.getenv("TTS_CACHE_MAX_MB", "200")) * 1024 * 1024)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text, lang):
+        return hashlib.sha256(f"{lang}\0{text.strip()}".encode("utf-8")).hexdigest()[:32]
+
+    def path_for(self, key, ext="mp3"):
+        return os.path.join(self.cache_dir, f"{key}.{ext}")
+
+    def get(self, key, exts=tuple(MIME_TYPES)):
+        """
+        Path of the cached audio in any format (marked as recently used) or None
+        """
+        for ext in exts:
+            path = self.path_for(key, ext)
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                continue
+            return path
+        return None
+
+    def put(self, key, write_fn, ext="mp3"):
+        """
+        write_fn(tmp_path) writes the audio; it is moved into place atomically
+        """
+        path = self.path_for(key, ext)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp.{ext}"
+        try:
+            write_fn(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict()
+        return path
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if ".tmp." in name:
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                    total -= size
+                except FileNotFoundError:
+                    pass
+
+
+class TTSService:
+    def __init__(self, cache=None, backends=None, max_workers=None):
+        self.cache = cache or TTSCache()
+        self.backends = backends or create_backends()
+        self._executor = ThreadPoolExecutor(max_workers=int(max_workers or os.getenv("TTS_WORKERS", "2")))
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'synthesised': 0, 'waited': 0, 'fallbacks': 0,
+                      'synth_ms_total': 0.0, 'first_audio_ms': None}
+
+    def _synthesize(self, key, text, lang):
+        """
+        Try each backend in order; returns the cached path
+        """
+        errors = []
+        for i, backend in enumerate(self.backends):
+            if not backend.supports(lang):
+                continue
+            start_time = time.perf_counter()
+            try:
+                path = self.cache.put(key, lambda tmp: backend.synthesize(text, lang, tmp), ext=backend.ext)
+            except Exception as e:
+                errors.append(f"{backend.name}: {e}")
+                continue
+            with self._lock:
+                self.stats['synthesised'] += 1
+                self.stats['synth_ms_total'] += 1000 * (time.perf_counter() - start_time)
+                if i > 0:
+                    self.stats['fallbacks'] += 1
+            return path
+        raise RuntimeError(f"No TTS backend could speak '{lang}': {'; '.join(errors) or 'unsupported'}")
+
+    def _get_or_start(self, text, lang):
+        """
+        Cached path, or the future of the (possibly already running) synthesis
+        """
+        key = self.cache.key(text, lang)
+        path = self.cache.get(key)
+        if path:
+            return path, None
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._executor.submit(self._synthesize, key, text, lang)
+                self._inflight[key] = future
+                future.add_done_callback(lambda _, k=key: self._done(k))
+                return None, future
+            self.stats['waited'] += 1
+            return None, future
+
+    def _done(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def presynthesize(self, text, lang):
+        """
+        Start synthesising every sentence in the background; returns immediately
+        """
+        for segment in split_sentences(text or ""):
+            self._get_or_start(segment, lang)
+
+    def get_audio_path(self, text, lang, timeout=60):
+        """
+        Path to audio of text in lang, synthesising (or waiting for the
+        background job) on a cache miss
+        """
+        path, future = self._get_or_start(text, lang)
+        if path:
+            with self._lock:
+                self.stats['hits'] += 1
+            return path
+        return future.result(timeout=timeout)
+
+    def stream(self, text, lang, timeout=60):
+        """
+        Yield audio paths sentence by sentence, in order; later sentences
+        are synthesised while the first ones are played
+        """
+        start_time = time.perf_counter()
+        pending = [self._get_or_start(segment, lang) for segment in split_sentences(text or "")]
+        for i, (path, future) in enumerate(pending):
+            if path:
+                with self._lock:
+                    self.stats['hits'] += 1
+            else:
+                path = future.result(timeout=timeout)
+            if i == 0:
+                with self._lock:
+                    self.stats['first_audio_ms'] = 1000 * (time.perf_counter() - start_time)
+            yield path
+
+    def join(self, text, lang, paths, timeout=60):
+        """
+        One audio file for the whole answer from the sentence files that
+        stream() yielded, cached under the answer's own key. Segments that
+        cannot be joined (a backend fallback mixed formats) are replaced by
+        one synthesis of the whole text.
+        """
+        if len(paths) == 1:
+            return paths[0]
+        key = self.cache.key(text, lang)
+        path = self.cache.get(key)
+        if path:
+            return path
+        exts = {p.rsplit(".", 1)[-1] for p in paths}
+        if len(exts) == 1:
+            ext = exts.pop()
+            try:
+                return self.cache.put(key, lambda tmp: concat_audio(paths, tmp, ext), ext=ext)
+            except (ValueError, wave.Error) as e:
+                print(f"⚠️ Could not join audio segments: {e}")
+        return self.get_audio_path(text, lang, timeout=timeout)
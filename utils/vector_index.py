@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+NumPy Vector Index for KrishiSahay
+Exact L2 nearest-neighbour search with the same interface as FAISS
+IndexFlatL2 (d, ntotal, add, search, reconstruct), used when FAISS is not
+installed (e.g. network-isolated hosts where it cannot be pip-installed).
+
+- Search is a blocked matrix multiply, ||q||² - 2·q·x + ||x||², with
+  argpartition top-k per block, so memory stays bounded for large corpora.
+- Vectors can be stored as float32 or float16 (half the memory; distances
+  are still computed in float32, so each search pays for the conversion
+  and float16 pays off mainly with batched queries).
+- Vectors can live in a memory-mapped .npy file, so the pickled index only
+  carries the file path and pages are loaded by the OS on demand.
+
+Benchmark against FAISS IndexFlatL2 (when installed):
+    python utils/vector_index.py --bench
+"""
+
+import os
+import pickle
+
+import numpy as np
+
+BLOCK_SIZE = int(os.getenv("VECTOR_BLOCK_SIZE", "65536"))
+
+
+class NumpyFlatIndex:
+    def __init__(self, d, dtype="float32", block_size=None):
+        self.d = d
+        self.dtype = np.dtype(dtype)
+        self.block_size = int(block_size or BLOCK_SIZE)
+        self.vectors = np.empty((0, d), dtype=self.dtype)
+        self.norms = np.empty(0, dtype=np.float32)
+        self.path = None
+
+    @property
+    def ntotal(self):
+        return len(self.vectors)
+
+    def _compute_norms(self):
+        norms = np.empty(self.ntotal, dtype=np.float32)
+        for start in range(0, self.ntotal, self.block_size):
+            block = np.asarray(self.vectors[start:start + self.block_size], dtype=np.float32)
+            norms[start:start + len(block)] = np.einsum('ij,ij->i', block, block)
+        self.norms = norms
+
+    def add(self, x):
+        x = np.asarray(x, dtype=np.float32).reshape(-1, self.d)
+        self.vectors = np.concatenate([np.asarray(self.vectors), x.astype(self.dtype)])
+        self.path = None
+        self._compute_norms()
+
+    def reconstruct(self, i):
+        return np.asarray(self.vectors[i], dtype=np.float32)
+
+    def search(self, x, k):
+        """
+        FAISS-compatible: returns (distances, indices), each (n, k); squared
+        L2 distances ascending, padded with inf / -1 when k > ntotal
+        """
+        x = np.asarray(x, dtype=np.float32).reshape(-1, self.d)
+        n = len(x)
+        distances = np.full((n, k), np.inf, dtype=np.float32)
+        indices = np.full((n, k), -1, dtype=np.int64)
+        k_eff = min(k, self.ntotal)
+        if n == 0 or k_eff == 0:
+            return distances, indices
+
+        q_norms = np.einsum('ij,ij->i', x, x)[:, None]
+        best_d = np.empty((n, 0), dtype=np.float32)
+        best_i = np.empty((n, 0), dtype=np.int64)
+        for start in range(0, self.ntotal, self.block_size):
+            block = np.asarray(self.vectors[start:start + self.block_size], dtype=np.float32)
+            d = q_norms - 2.0 * (x @ block.T) + self.norms[start:start + len(block)][None, :]
+            kk = min(k_eff, d.shape[1])
+            part = np.argpartition(d, kk - 1, axis=1)[:, :kk]
+            best_d = np.concatenate([best_d, np.take_along_axis(d, part, axis=1)], axis=1)
+            best_i = np.concatenate([best_i, part + start], axis=1)
+            if best_d.shape[1] > k_eff:
+                keep = np.argpartition(best_d, k_eff - 1, axis=1)[:, :k_eff]
+                best_d = np.take_along_axis(best_d, keep, axis=1)
+                best_i = np.take_along_axis(best_i, keep, axis=1)
+
+        order = np.argsort(best_d, axis=1, kind='stable')
+        distances[:, :k_eff] = np.maximum(np.take_along_axis(best_d, order, axis=1), 0.0)
+        indices[:, :k_eff] = np.take_along_axis(best_i, order, axis=1)
+        return distances, indices
+
+    def save(self, path):
+        """
+        Write vectors to a .npy file and memory-map them from there
+        """
+        np.save(path, np.asarray(self.vectors))
+        self.vectors = np.load(path, mmap_mode='r')
+        self.path = path
+
+    @classmethod
+    def load(cls, path, mmap=True, block_size=None):
+        vectors = np.load(path, mmap_mode='r' if mmap else None)
+        index = cls(vectors.shape[1], dtype=vectors.dtype, block_size=block_size)
+        index.vectors = vectors
+        index.path = path if mmap else None
+        index._compute_norms()
+        return index
+
+    def __getstate__(self):
+        state = {'d': self.d, 'dtype': self.dtype.str, 'block_size': self.block_size, 'path': self.path}
+        if self.path is None:
+            state['vectors'] = np.asarray(self.vectors)
+        return state
+
+    def __setstate__(self, state):
+        self.d = state['d']
+        self.dtype = np.dtype(state['dtype'])
+        self.block_size = state['block_size']
+        self.path = state['path']
+        if self.path is not None:
+            self.vectors = np.load(self.path, mmap_mode='r')
+        else:
+            self.vectors = state['vectors']
+        self._compute_norms()
+
+
+def build_flat_index(embeddings, vectors_file=None):
+    """
+    Exact L2 index over embeddings: FAISS IndexFlatL2 when installed, else a
+    NumpyFlatIndex (memory-mapped from vectors_file when given).
+    VECTOR_BACKEND=faiss|numpy forces a backend; VECTOR_DTYPE sets the NumPy
+    storage type. Returns (index, backend name).
+    """
+    backend = os.getenv("VECTOR_BACKEND", "auto").lower()
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if backend != "numpy":
+        try:
+            import faiss
+        except ImportError:
+            if backend == "faiss":
+                raise
+            print("⚠️ FAISS not installed. Using the built-in NumPy index.")
+        else:
+            index = faiss.IndexFlatL2(embeddings.shape[1])
+            index.add(embeddings)
+            return index, "faiss"
+
+    index = NumpyFlatIndex(embeddings.shape[1], dtype=os.getenv("VECTOR_DTYPE", "float32"))
+    index.add(embeddings)
+    if vectors_file:
+        index.save(vectors_file)
+    return index, "numpy"
+
+
+def index_from_embeddings(embeddings_file, dtype="float32"):
+    """
+    Build a NumpyFlatIndex and metadata from kcc_embeddings.pkl, for hosts
+    that cannot unpickle a FAISS index
+    """
+    with open(embeddings_file, 'rb') as f:
+        records = pickle.load(f)
+    vectors = np.stack([np.asarray(r['embedding'], dtype=np.float32) for r in records])
+    index = NumpyFlatIndex(vectors.shape[1], dtype=dtype)
+    index.add(vectors)
+    return index, [r['metadata'] for r in records]
+
+
+def _benchmark():
+    import time
+
+    try:
+        import faiss
+    except ImportError:
+        faiss = None
+        print("⚠️ FAISS not installed; benchmarking the NumPy index against itself (float32 = exact)")
+
+    rng = np.random.default_rng(0)
+    d, k, n_queries = 384, 10, 200
+    print(f"{'vectors':>9} {'backend':>16} {'build ms':>9} {'ms/query':>9} {'batch ms/q':>11} {'recall@10':>10}")
+    for n in (1_000, 10_000, 100_000):
+        data = rng.standard_normal((n, d)).astype(np.float32)
+        data /= np.linalg.norm(data, axis=1, keepdims=True)
+        queries = data[rng.choice(n, n_queries, replace=False)] + 0.05 * rng.standard_normal((n_queries, d)).astype(np.float32)
+
+        backends = []
+        if faiss is not None:
+            backends.append(("faiss IndexFlatL2", lambda: faiss.IndexFlatL2(d)))
+        backends.append(("numpy float32", lambda: NumpyFlatIndex(d, "float32")))
+        backends.append(("numpy float16", lambda: NumpyFlatIndex(d, "float16")))
+
+        reference = None
+        for name, make in backends:
+            start = time.perf_counter()
+            index = make()
+            index.add(data)
+            build_ms = 1000 * (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for q in queries[:50]:
+                index.search(q[None, :], k)
+            single_ms = 1000 * (time.perf_counter() - start) / 50
+
+            start = time.perf_counter()
+            _, found = index.search(queries, k)
+            batch_ms = 1000 * (time.perf_counter() - start) / n_queries
+
+            if reference is None:
+                reference = found
+            recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(found, reference)])
+            print(f"{n:>9} {name:>16} {build_ms:>9.1f} {single_ms:>9.3f} {batch_ms:>11.3f} {recall:>10.3f}")
+
+
+if __name__ == "__main__":
+    import sys
+    if "--bench" in sys.argv:
+        _benchmark()
+    else:
+        print(__doc__)
@@ -3,35 +3,102 @@ IBM Watsonx LLM Integration for KrishiSahay
 """
 
 import os
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 import json
 
+from context_builder import estimate_tokens
+from llm_client import ResilientCaller, LLMUnavailableError
+from llm_provider import LLMProvider, lang_instruction
+
 # Load environment variables
 load_dotenv()
 
-class WatsonxLLM:
-    def __init__(self):
+IAM_URL = os.getenv("WATSONX_IAM_URL", "https://iam.cloud.ibm.com/identity/token")
+CHAT_URL = os.getenv("WATSONX_URL", "https://eu-de.ml.cloud.ibm.com/ml/v1/text/chat?version=2023-05-29")
+
+class WatsonxLLM(LLMProvider):
+    name = "watsonx"
+
+    def __init__(self, offline_engine=None):
         """
-        Initialize Watsonx LLM with API credentials
+        Initialize Watsonx LLM with API credentials.
+        offline_engine: optional RAGEngine served when Watsonx is degraded.
         """
+        super().__init__(offline_engine)
+        self.caller = ResilientCaller("Watsonx")
         self.api_key = os.getenv("WATSONX_API_KEY")
         self.project_id = os.getenv("WATSONX_PROJECT_ID")
         self.model_id = os.getenv("MODEL_ID", "ibm/granite-3-8b-instruct")
         self.iam_token = None
         self.token_expiry = None
+        # Refresh this many seconds before the token lapses
+        self.refresh_margin = float(os.getenv("WATSONX_TOKEN_REFRESH_MARGIN", "300"))
+        self._token_lock = threading.Lock()
+        self._refresh_timer = None
         
-        if not self.api_key or not self.project_id:
+        # Pooled keep-alive connections for IAM and inference calls
+        pool_size = int(os.getenv("WATSONX_POOL_SIZE", "10"))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        
+        self.use_mock = not self.api_key or not self.project_id
+        if self.use_mock:
             print("⚠️  Warning: Watsonx credentials not found in .env file")
-            print("Please create a .env file with your credentials for online mode")    
-    def get_iam_token(self):
+            print("Please create a .env file with your credentials for online mode")
+
+    def _token_valid(self, margin=0.0):
+        return self.iam_token is not None and self.token_expiry is not None \
+            and time.time() < self.token_expiry - margin
+
+    def get_iam_token(self, stale_token=None):
         """
-        Get IAM token for Watsonx authentication
+        Return a cached IAM token, fetching a new one only when it has expired
+        (or equals stale_token, i.e. was just rejected). Concurrent callers
+        share one fetch (single-flight).
         """
         if not self.api_key:
             return None
-            
-        iam_url = "https://iam.cloud.ibm.com/identity/token"
+        if self._token_valid() and self.iam_token != stale_token:
+            return self.iam_token
+        
+        with self._token_lock:
+            # Another thread may have refreshed while we waited
+            if self._token_valid() and self.iam_token != stale_token:
+                return self.iam_token
+            return self._fetch_iam_token()
+
+    def _schedule_refresh(self):
+        """
+        Refresh the token in the background before it lapses
+        """
+        if self._refresh_timer is not None:
+            self._refresh_timer.cancel()
+        delay = max(self.token_expiry - self.refresh_margin - time.time(), 1.0)
+        self._refresh_timer = threading.Timer(delay, self._background_refresh)
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+    def _background_refresh(self):
+        with self._token_lock:
+            if self._token_valid(margin=self.refresh_margin):
+                return
+            if self._fetch_iam_token() is None and self._token_valid():
+                # Keep serving the current token and try again shortly
+                self._refresh_timer = threading.Timer(30.0, self._background_refresh)
+                self._refresh_timer.daemon = True
+                self._refresh_timer.start()
+
+    def _fetch_iam_token(self):
+        """
+        Call IAM (caller must hold _token_lock)
+        """
+        iam_url = IAM_URL
         iam_data = {
             "apikey": self.api_key,
             "grant_type": "urn:ibm:params:oauth:grant-type:apikey"
@@ -39,29 +106,49 @@ class WatsonxLLM:
         iam_headers = {"Content-Type": "application/x-www-form-urlencoded"}
         
         try:
-            response = requests.post(iam_url, data=iam_data, headers=iam_headers)
+            response = self.session.post(iam_url, data=iam_data, headers=iam_headers,
+                                         timeout=self.caller.timeout)
             response.raise_for_status()
-            self.iam_token = response.json()["access_token"]
+            token_data = response.json()
+            self.iam_token = token_data["access_token"]
+            # IAM returns both a lifetime and an absolute expiry; tokens last one hour
+            if "expiration" in token_data:
+                self.token_expiry = float(token_data["expiration"])
+            else:
+                self.token_expiry = time.time() + float(token_data.get("expires_in", 3600))
+            self._schedule_refresh()
             return self.iam_token
         except Exception as e:
             print(f"Error getting IAM token: {e}")
             return None
     
-    def generate_response(self, query: str, context: str = None, language: str = "hi") -> str:
+    def generate_response(self, query: str, context: str = None, target_lang: str = "hi") -> str:
         """
         Generate response using Watsonx Granite LLM
         """
-        if not self.api_key or not self.project_id:
-            return self._get_mock_response(query, context)
+        return self.generate_response_with_usage(query, context, target_lang)[0]
+
+    def generate_response_with_usage(self, query: str, context: str = None, target_lang: str = "hi") -> tuple:
+        """
+        Generate response using Watsonx Granite LLM; returns (text, usage)
+        """
+        if self.use_mock:
+            return self._mock_response(query, context), {}
+        
+        # Cached IAM token (refreshed in the background before expiry)
+        if not self.get_iam_token():
+            if self.raise_errors:
+                raise LLMUnavailableError("Watsonx authentication failed")
+            return "Failed to authenticate with Watsonx. Using offline mode.", {}
         
-        # Get IAM token if not available
-        if not self.iam_token:
-            self.get_iam_token()
-            if not self.iam_token:
-                return "Failed to authenticate with Watsonx. Using offline mode."
+        # Hindi keeps the original Hinglish style; other languages get an explicit instruction
+        if target_lang == "hi":
+            reply_instruction = "Respond in Hinglish (mix of Hindi and English) for better understanding."
+        else:
+            reply_instruction = lang_instruction(target_lang)
         
         # Prepare system prompt based on language
-        if language == "hi":
+        if target_lang == "hi":
             system_prompt = """आप कृषि सहायक हैं जो भारतीय किसानों को कृषि संबंधी सलाह देते हैं।
 आपका नाम KrishiSahay है। आप हिंदी और अंग्रेजी में जवाब दे सकते हैं।
 हमेशा विनम्र और मददगार बनें। अगर कुछ पता नहीं है तो ईमानदारी से कहें।
@@ -81,17 +168,14 @@ Farmer's Question: {query}
 
 Please provide a helpful, accurate response. If the context is relevant, use it. 
 If not, use your general knowledge but be honest about it. 
-Respond in Hinglish (mix of Hindi and English) for better understanding."""
-        else:
+{reply_instruction}"""
+        elif target_lang == "hi":
             user_message = query
+        else:
+            user_message = f"{query}\n\n{reply_instruction}"
         
         # Watsonx API endpoint
-        api_url = "https://eu-de.ml.cloud.ibm.com/ml/v1/text/chat?version=2023-05-29"
-        
-        headers = {
-            "Authorization": f"Bearer {self.iam_token}",
-            "Content-Type": "application/json"
-        }
+        api_url = CHAT_URL
         
         payload = {
             "model_id": self.model_id,
@@ -108,18 +192,42 @@ Respond in Hinglish (mix of Hindi and English) for better understanding."""
             }
         }
         
+        usage = {'prompt_tokens_estimate': estimate_tokens(system_prompt + user_message)}
         try:
-            response = requests.post(api_url, headers=headers, json=payload)
-            response.raise_for_status()
-            
-            result = response.json()
-            return result.get('choices', [{}])[0].get('message', {}).get('content', 'No response generated')
+            start_time = time.perf_counter()
+            result = self.caller.call(self._post_chat, api_url, payload)
+            usage['latency_ms'] = (time.perf_counter() - start_time) * 1000
+            reported = result.get('usage') or {}
+            if reported:
+                usage['prompt_tokens'] = reported.get('prompt_tokens')
+                usage['output_tokens'] = reported.get('completion_tokens')
+            return result.get('choices', [{}])[0].get('message', {}).get('content', 'No response generated'), usage
             
         except Exception as e:
             print(f"Error calling Watsonx API: {e}")
-            return self._get_mock_response(query, context)
-    
-    def _get_mock_response(self, query: str, context: str = None) -> str:
+            if self.raise_errors:
+                raise
+            return self._offline_response(query, context), usage
+
+    def _post_chat(self, api_url, payload):
+        """
+        Single chat request over the pooled session, bounded by the
+        per-attempt timeout. A 401 forces one token refresh.
+        """
+        token = self.get_iam_token()
+        for attempt in range(2):
+            headers = {
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json"
+            }
+            response = self.session.post(api_url, headers=headers, json=payload, timeout=self.caller.timeout)
+            if response.status_code != 401:
+                break
+            token = self.get_iam_token(stale_token=token)
+        response.raise_for_status()
+        return response.json()
+
+    def _mock_response(self, query: str, context: str = None) -> str:
         """
         Return a mock response for testing when Watsonx is not available
         """
@@ -152,19 +260,12 @@ Respond in Hinglish (mix of Hindi and English) for better understanding."""
 
 धन्यवाद! - आपके KrishiSahay"""
     
-    def generate_with_retrieval(self, query: str, retrieved_results: list) -> str:
+    def generate_with_retrieval(self, query: str, retrieved_results: list, target_lang: str = "hi") -> str:
         """
         Generate response using retrieved context
         """
-        # Format context
-        context = "Kisan Call Centre Database:\n\n"
-        for i, result in enumerate(retrieved_results, 1):
-            meta = result['metadata']
-            context += f"{i}. प्रश्न: {meta['question']}\n"
-            context += f"   उत्तर: {meta['answer']}\n"
-            context += f"   (फसल: {meta['crop']})\n\n"
-        
-        return self.generate_response(query, context)
+        return super().generate_with_retrieval(query, retrieved_results, target_lang)
+
 # Test the LLM
 if __name__ == "__main__":
     print("=" * 60)
@@ -6,18 +6,33 @@ Uses OpenWeatherMap API if key is present, otherwise realistic mock data.
 """
 
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-import random
 from dotenv import load_dotenv
 
+from alert_rules import AlertEngine
+from mock_weather import mock_weather_grid, FORECAST_STEPS
+from weather_cache import WeatherCache
+
 load_dotenv()
 
 class WeatherAgent:
     def __init__(self):
         self.api_key = os.getenv("WEATHER_API_KEY", "")
-        self.base_url = "http://api.openweathermap.org/data/2.5"
+        self.base_url = os.getenv("WEATHER_API_URL", "http://api.openweathermap.org/data/2.5")
+        
+        # Pooled keep-alive session; current + forecast calls run concurrently
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=int(os.getenv("WEATHER_POOL_SIZE", "10"))))
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=int(os.getenv("WEATHER_POOL_SIZE", "10"))))
+        self._fetch_executor = ThreadPoolExecutor(max_workers=4)
+        self._refresh_executor = ThreadPoolExecutor(max_workers=2)
+        self.cache = WeatherCache() if self.api_key else None
+        self.alert_engine = AlertEngine()
         
         # Realistic base weather for Indian districts (mock mode)
         self.location_climate = {
@@ -36,15 +51,44 @@ class WeatherAgent:
 
     def get_weather(self, location):
         """Return weather data – real API if key present, else realistic mock."""
-        if self.api_key:
-            try:
-                return self._get_real_weather(location)
-            except Exception as e:
-                print(f"Real weather API failed: {e}. Falling back to mock.")
-                return self._get_mock_weather(location)
-        else:
+        if not self.api_key:
             return self._get_mock_weather(location)
 
+        data, age = self.cache.get(location)
+        if self.cache.is_fresh(age):
+            return data
+        if self.cache.is_usable(age):
+            # Stale-while-revalidate: answer now, refresh once in the background
+            if self.cache.try_lease(location):
+                self._refresh_executor.submit(self._refresh, location)
+            return data
+
+        if not self.cache.try_lease(location):
+            # Another session/process is fetching this district; wait for its result
+            deadline = time.time() + self.cache.lease_seconds
+            while time.time() < deadline:
+                time.sleep(0.2)
+                data, age = self.cache.get(location)
+                if self.cache.is_fresh(age):
+                    return data
+        return self._refresh(location) or self._get_mock_weather(location)
+
+    def _refresh(self, location):
+        """Fetch from the API into the shared cache (caller holds the lease)."""
+        try:
+            data = self._get_real_weather(location)
+            self.cache.set(location, data)
+            return data
+        except Exception as e:
+            print(f"Real weather API failed: {e}. Falling back to mock.")
+            self.cache.release_lease(location)
+            return None
+
+    def _get_json(self, url, params):
+        resp = self.session.get(url, params=params, timeout=10)
+        resp.raise_for_status()
+        return resp.json()
+
     def _get_real_weather(self, location):
         """Fetch real weather data from OpenWeatherMap."""
         # Current weather
@@ -54,9 +98,6 @@ class WeatherAgent:
             "appid": self.api_key,
             "units": "metric"
         }
-        current_resp = requests.get(current_url, params=current_params, timeout=10)
-        current_resp.raise_for_status()
-        current_data = current_resp.json()
 
         # 5-day forecast (3-hour intervals) – we'll take next 4 entries (~12 hours)
         forecast_url = f"{self.base_url}/forecast"
@@ -66,9 +107,11 @@ class WeatherAgent:
             "units": "metric",
             "cnt": 8   # 8 intervals = 24 hours
         }
-        forecast_resp = requests.get(forecast_url, params=forecast_params, timeout=10)
-        forecast_resp.raise_for_status()
-        forecast_data = forecast_resp.json()
+
+        # Both requests in flight at once over the pooled session
+        forecast_future = self._fetch_executor.submit(self._get_json, forecast_url, forecast_params)
+        current_data = self._get_json(current_url, current_params)
+        forecast_data = forecast_future.result()
 
         # Parse current
         weather = current_data["weather"][0]["description"]
@@ -98,132 +141,51 @@ class WeatherAgent:
                 "rain": rain
             },
             "forecast": forecast,
+            "fetched_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "is_mock": False
         }
 
     def _get_mock_weather(self, location):
         """Return location‑specific mock weather, consistent for each call."""
-        # Use climate data for the given location or default
-        climate = self.location_climate.get(location, self.default_climate)
-        
-        # Generate values within the typical range (deterministic based on location + today's date)
-        seed = hash(f"{location}_{datetime.now().strftime('%Y%m%d')}")
-        random.seed(seed)
-        
-        temp = random.randint(*climate["temp_range"])
-        humidity = random.randint(*climate["humidity_range"])
-        condition = random.choice(climate["conditions"])
-        wind_speed = random.randint(5, 25)
-        rain = random.randint(0, 5) if "rain" in condition else 0
+        # Deterministic per location + today's date, in every worker process
+        now = datetime.now()
+        grid = self.get_mock_weather_grid([location], [now.strftime('%Y%m%d')])
+        conditions = self.location_climate.get(location, self.default_climate)["conditions"]
         
         # Forecast for next few hours (slight variations)
         forecast = []
-        for i in range(1, 5):
-            hour_delta = i * 3
+        for i in range(FORECAST_STEPS):
+            hour_delta = (i + 1) * 3
             forecast.append({
-                "time": (datetime.now() + timedelta(hours=hour_delta)).strftime("%Y-%m-%d %H:%M:%S"),
-                "temp": temp + random.randint(-2, 2),
-                "humidity": humidity + random.randint(-5, 5),
-                "description": random.choice(climate["conditions"]),
-                "rain": random.randint(0, 3) if "rain" in condition else 0
+                "time": (now + timedelta(hours=hour_delta)).strftime("%Y-%m-%d %H:%M:%S"),
+                "temp": int(grid["forecast_temp"][0, 0, i]),
+                "humidity": int(grid["forecast_humidity"][0, 0, i]),
+                "description": conditions[grid["forecast_condition"][0, 0, i]],
+                "rain": int(grid["forecast_rain"][0, 0, i])
             })
         
         return {
             "location": location,
             "current": {
-                "temp": temp,
-                "humidity": humidity,
-                "description": condition,
-                "wind_speed": wind_speed,
-                "rain": rain
+                "temp": int(grid["temp"][0, 0]),
+                "humidity": int(grid["humidity"][0, 0]),
+                "description": conditions[grid["condition"][0, 0]],
+                "wind_speed": int(grid["wind_speed"][0, 0]),
+                "rain": int(grid["rain"][0, 0])
             },
             "forecast": forecast,
             "is_mock": True
         }
 
-    def generate_alerts(self, weather_data, crop=None):
-        """Generate proactive alerts based on weather data."""
-        alerts = []
-        current = weather_data.get("current", {})
-        
-        # Rain alert
-        if current.get("rain", 0) > 0:
-            alerts.append({
-                "type": "rain",
-                "severity": "info",
-                "icon": "🌧️",
-                "title": "बारिश की सूचना",
-                "message": f"अभी बारिश हो रही है ({current['rain']} mm/h)।",
-                "advice": "अगर छिड़काव नहीं किया है, तो बारिश रुकने तक प्रतीक्षा करें।"
-            })
-        
-        # Forecast rain
-        for f in weather_data.get("forecast", []):
-            if f.get("rain", 0) > 0:
-                alerts.append({
-                    "type": "forecast_rain",
-                    "severity": "warning",
-                    "icon": "⚠️",
-                    "title": "बारिश की संभावना",
-                    "message": f"अगले कुछ घंटों में बारिश हो सकती है।",
-                    "advice": "कीटनाशक या उर्वरक का छिड़काव टालें।"
-                })
-                break
-        
-        # Temperature alerts
-        temp = current.get("temp", 25)
-        if temp > 35:
-            alerts.append({
-                "type": "heat",
-                "severity": "warning",
-                "icon": "🔥",
-                "title": "भीषण गर्मी",
-                "message": f"तापमान बहुत अधिक है ({temp}°C)।",
-                "advice": "फसलों में पानी की कमी हो सकती है। सिंचाई करें।"
-            })
-        elif temp < 10:
-            alerts.append({
-                "type": "cold",
-                "severity": "warning",
-                "icon": "❄️",
-                "title": "कड़ाके की ठंड",
-                "message": f"तापमान कम है ({temp}°C)। पाले का खतरा।",
-                "advice": "रात में हल्का पानी का छिड़काव करें या फसलों को ढकें।"
-            })
-        
-        # Humidity alerts
-        humidity = current.get("humidity", 50)
-        if humidity > 85:
-            alerts.append({
-                "type": "high_humidity",
-                "severity": "info",
-                "icon": "💧",
-                "title": "उच्च नमी",
-                "message": f"नमी बहुत अधिक है ({humidity}%)।",
-                "advice": "फफूंद रोगों का खतरा बढ़ सकता है। फसलों की नियमित जांच करें।"
-            })
-        
-        # Crop‑specific alerts (example)
-        if crop:
-            crop_lower = crop.lower()
-            if "गेहूं" in crop_lower or "wheat" in crop_lower:
-                if temp > 32:
-                    alerts.append({
-                        "type": "crop_heat_stress",
-                        "severity": "warning",
-                        "icon": "🌾",
-                        "title": "गेहूं के लिए सावधानी",
-                        "message": "अधिक तापमान गेहूं के दाने भरने को प्रभावित कर सकता है।",
-                        "advice": "हल्की सिंचाई करें।"
-                    })
-            elif "सरसों" in crop_lower or "mustard" in crop_lower:
-                if humidity > 70:
-                    alerts.append({
-                        "type": "crop_pest_risk",
-                        "severity": "info",
-                        "icon": "🌿",
-                        "title": "सरसों में कीट का खतरा",
-                        "message": "अधिक नमी से कीटों का खतरा बढ़ सकता है।",
-                        "advice": "माहू कीट की नियमित जांच करें।"
-                    })
-        return alerts
\ No newline at end of file
+    def get_mock_weather_grid(self, locations, dates):
+        """Mock readings for locations × dates ('YYYYMMDD') in one vectorised call (load-test fixtures)."""
+        return mock_weather_grid(locations, dates, self.location_climate, self.default_climate)
+
+    def generate_alerts(self, weather_data, crop=None, stage=None):
+        """Generate proactive alerts based on weather data (see alert_rules.ALERT_RULES)."""
+        return self.alert_engine.alerts_for([weather_data], [crop], [stage])[(0, crop)]
+
+    def generate_alerts_bulk(self, weather_list, crops, stages=None):
+        """Alerts for every location × crop in one vectorised pass: {(location, crop): alerts}."""
+        results = self.alert_engine.alerts_for(weather_list, crops, stages)
+        return {(weather_list[l].get("location"), crop): alerts for (l, crop), alerts in results.items()}
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Shared Weather Cache for KrishiSahay
+Per-location TTL cache in SQLite, shared by every Streamlit session and
+worker process on the host. Entries past their TTL are still served
+(stale-while-revalidate) while exactly one process refreshes them, using
+a short lease row so districts are fetched at most once per interval.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class WeatherCache:
+    def __init__(self, path=None, ttl=None, stale_ttl=None, lease_seconds=30):
+        self.path = path or os.getenv("WEATHER_CACHE_PATH", "cache/weather_cache.sqlite")
+        # Fresh for ttl seconds, then served stale for up to stale_ttl more
+        self.ttl = float(ttl if ttl is not None else os.getenv("WEATHER_CACHE_TTL", "600"))
+        self.stale_ttl = float(stale_ttl if stale_ttl is not None else os.getenv("WEATHER_STALE_TTL", "3600"))
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS weather (
+                location TEXT PRIMARY KEY,
+                data TEXT,
+                fetched_at REAL NOT NULL DEFAULT 0,
+                refreshing_until REAL NOT NULL DEFAULT 0
+            )
+        """)
+        conn.commit()
+
+    def _conn(self):
+        # sqlite3 connections are per thread; WAL lets readers and one writer overlap
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, location):
+        """
+        Return (data, age_seconds) or (None, None)
+        """
+        row = self._conn().execute(
+            "SELECT data, fetched_at FROM weather WHERE location = ?", (location,)
+        ).fetchone()
+        if row is None or row[0] is None:
+            return None, None
+        return json.loads(row[0]), time.time() - row[1]
+
+    def is_fresh(self, age):
+        return age is not None and age < self.ttl
+
+    def is_usable(self, age):
+        return age is not None and age < self.ttl + self.stale_ttl
+
+    def set(self, location, data):
+        conn = self._conn()
+        conn.execute("""
+            INSERT INTO weather (location, data, fetched_at, refreshing_until)
+            VALUES (?, ?, ?, 0)
+            ON CONFLICT(location) DO UPDATE SET
+                data = excluded.data,
+                fetched_at = excluded.fetched_at,
+                refreshing_until = 0
+        """, (location, json.dumps(data, ensure_ascii=False), time.time()))
+        conn.commit()
+
+    def try_lease(self, location):
+        """
+        Claim the right to refresh location; False if another process holds it
+        """
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR IGNORE INTO weather (location, data, fetched_at, refreshing_until) VALUES (?, NULL, 0, 0)",
+            (location,)
+        )
+        cur = conn.execute(
+            "UPDATE weather SET refreshing_until = ? WHERE location = ? AND refreshing_until < ?",
+            (now + self.lease_seconds, location, now)
+        )
+        conn.commit()
+        return cur.rowcount == 1
+
+    def release_lease(self, location):
+        conn = self._conn()
+        conn.execute("UPDATE weather SET refreshing_until = 0 WHERE location = ?", (location,))
+        conn.commit()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Weather Prefetch Job for KrishiSahay
+Fetches weather for every district in STATE_DISTRICTS with bounded
+concurrency and a request rate limit, evaluates the alert rules for every
+supported crop and stores the results so the dashboard reads
+precomputed alerts instantly.
+
+Usage:
+    python utils/weather_prefetch.py                  # one run
+    python utils/weather_prefetch.py --interval 1800  # run every 30 minutes
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from locations import CROPS, all_districts
+from rate_limiter import RateLimiter
+from weather_agent import WeatherAgent
+
+
+class AlertStore:
+    def __init__(self, path=None, max_age=None):
+        self.path = path or os.getenv("ALERT_STORE_PATH", "cache/alerts.sqlite")
+        # Older records mean the prefetch job has stopped (seconds)
+        self.max_age = float(max_age or os.getenv("ALERT_MAX_AGE", "10800"))
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS alerts (
+                district TEXT NOT NULL,
+                crop TEXT NOT NULL,
+                weather TEXT NOT NULL,
+                alerts TEXT NOT NULL,
+                computed_at TEXT NOT NULL,
+                PRIMARY KEY (district, crop)
+            )
+        """)
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def save_many(self, rows):
+        """
+        rows: iterable of (district, crop, weather_data, alerts)
+        """
+        computed_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn = self._conn()
+        conn.executemany("""
+            INSERT OR REPLACE INTO alerts (district, crop, weather, alerts, computed_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(d, c, json.dumps(w, ensure_ascii=False), json.dumps(a, ensure_ascii=False), computed_at)
+              for d, c, w, a in rows])
+        conn.commit()
+
+    def get(self, district, crop):
+        """
+        Return {'weather', 'alerts', 'computed_at'} or None
+        """
+        row = self._conn().execute(
+            "SELECT weather, alerts, computed_at FROM alerts WHERE district = ? AND crop = ?",
+            (district, crop)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'weather': json.loads(row[0]), 'alerts': json.loads(row[1]), 'computed_at': row[2]}
+
+    def is_stale(self, record):
+        """
+        True when a record from get() is older than max_age
+        """
+        computed_at = datetime.strptime(record['computed_at'], "%Y-%m-%d %H:%M:%S")
+        return (datetime.now() - computed_at).total_seconds() > self.max_age
+
+
+class WeatherPrefetchJob:
+    def __init__(self, agent=None, store=None, max_workers=None, rate_per_sec=None, crops=None):
+        self.agent = agent or WeatherAgent()
+        self.store = store or AlertStore()
+        self.max_workers = int(max_workers or os.getenv("PREFETCH_WORKERS", "8"))
+        # OpenWeatherMap free tier allows 60 calls/min; each district costs two
+        self.limiter = RateLimiter(float(rate_per_sec or os.getenv("PREFETCH_RATE", "0.5")))
+        self.crops = crops or CROPS
+
+    def _fetch(self, district):
+        self.limiter.acquire()
+        weather = self.agent.get_weather(district)
+        if self.agent.api_key and weather.get('is_mock'):
+            # get_weather falls back to mock data when the API fails; storing
+            # it would show made-up weather as current on the dashboard
+            raise RuntimeError("weather API failed, got mock data")
+        return weather
+
+    def run(self, districts=None):
+        """
+        Prefetch every district once; returns run statistics
+        """
+        districts = districts or sorted({d for _, d in all_districts()})
+        start_time = time.time()
+        stats = {'districts': len(districts), 'failed': 0, 'alerts': 0}
+
+        print(f"🔄 Prefetching weather for {len(districts)} districts "
+              f"({self.max_workers} workers, {self.limiter.rate}/s)...")
+        weather_by_district = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._fetch, d): d for d in districts}
+            for future in as_completed(futures):
+                try:
+                    weather_by_district[futures[future]] = future.result()
+                except Exception as e:
+                    stats['failed'] += 1
+                    print(f"❌ {futures[future]}: {e}")
+
+        # One vectorised rule evaluation for all districts × crops
+        fetched = list(weather_by_district)
+        weather_list = [dict(weather_by_district[d], location=d) for d in fetched]
+        alerts = self.agent.generate_alerts_bulk(weather_list, self.crops)
+        rows = [(d, crop, weather_by_district[d], alerts[(d, crop)]) for d in fetched for crop in self.crops]
+        self.store.save_many(rows)
+        stats['alerts'] = sum(len(a) for _, _, _, a in rows)
+
+        stats['seconds'] = time.time() - start_time
+        print(f"✅ Stored alerts for {stats['districts'] - stats['failed']} districts × {len(self.crops)} crops "
+              f"({stats['alerts']} alerts) in {stats['seconds']:.1f}s")
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefetch district weather and precompute alerts")
+    parser.add_argument("--interval", type=float, default=0, help="repeat every N seconds (0 = run once)")
+    parser.add_argument("--workers", type=int, default=None, help="concurrent districts")
+    parser.add_argument("--rate", type=float, default=None, help="district fetches per second")
+    args = parser.parse_args()
+
+    job = WeatherPrefetchJob(max_workers=args.workers, rate_per_sec=args.rate)
+    while True:
+        job.run()
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()